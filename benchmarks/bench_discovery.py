@@ -0,0 +1,66 @@
+"""Benchmark Gmail/Calendar client construction.
+
+Compares googleapiclient's default build() (read + parse the discovery
+document on every call) with discovery.build_service(), which parses the
+document once per process and shares it across accounts.
+
+Usage:
+    uv run python benchmarks/bench_discovery.py [--iterations 50]
+"""
+
+import argparse
+import logging
+import statistics
+import time
+
+from googleapiclient.discovery import build
+from oauth2client.client import AccessTokenCredentials
+
+from mcp_gsuite import discovery
+
+
+def _time_calls(fn, iterations: int) -> list[float]:
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def _report(label: str, timings: list[float]):
+    print(f"{label:<34} mean {statistics.mean(timings):8.2f} ms   "
+          f"median {statistics.median(timings):8.2f} ms   max {max(timings):8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+    logging.getLogger("googleapiclient.discovery_cache").setLevel(logging.ERROR)
+
+    credentials = AccessTokenCredentials("benchmark-token", "benchmark")
+
+    for name, version in (discovery.GMAIL_API, discovery.CALENDAR_API):
+        print(f"{name} {version} ({args.iterations} iterations)")
+        before = _time_calls(
+            lambda: build(name, version, credentials=credentials),
+            args.iterations,
+        )
+
+        start = time.perf_counter()
+        discovery.get_discovery_document(name, version)
+        first_load = (time.perf_counter() - start) * 1000
+
+        after = _time_calls(
+            lambda: discovery.build_service(name, version, credentials=credentials),
+            args.iterations,
+        )
+        _report("  build()", before)
+        _report("  discovery.build_service()", after)
+        print(f"  one-time document load: {first_load:.2f} ms, "
+              f"speedup {statistics.mean(before) / statistics.mean(after):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
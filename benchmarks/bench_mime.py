@@ -0,0 +1,190 @@
+"""Benchmark message parsing on deep synthetic MIME trees.
+
+Compares the former parsing code (an if/elif chain per header, a recursive
+body search visiting parts several times and a separate top-level-only
+attachment scan) with the single-pass walker in mcp_gsuite.mime, and
+checks that both pick the same body. Since the former scan missed
+attachments inside nested multiparts, it is also timed with a recursive
+attachment scan added, which finds the same attachments as the walker.
+
+Usage:
+    uv run python benchmarks/bench_mime.py [--iterations 2000] [--depth 16] [--width 3] [--headers 40]
+"""
+
+import argparse
+import base64
+import statistics
+import time
+
+from mcp_gsuite import mime
+
+
+def _encode(text: str) -> str:
+    return base64.urlsafe_b64encode(text.encode()).decode()
+
+
+def build_tree(depth: int, width: int, body_bytes: int, part_id: str = "") -> dict:
+    """A chain of nested multipart/mixed parts, each holding width-1 attachments and the next level;
+    the innermost level is a multipart/alternative with text and HTML bodies."""
+    def child_id(i: int) -> str:
+        return f"{part_id}.{i}" if part_id else str(i)
+
+    if depth == 0:
+        return {"partId": part_id, "mimeType": "multipart/alternative", "filename": "", "body": {"size": 0}, "parts": [
+            {"partId": child_id(0), "mimeType": "text/plain", "filename": "",
+             "body": {"size": body_bytes, "data": _encode("plain " * (body_bytes // 6))}},
+            {"partId": child_id(1), "mimeType": "text/html", "filename": "",
+             "body": {"size": body_bytes, "data": _encode("<p>html</p>" * (body_bytes // 11))}},
+        ]}
+    parts = [{"partId": child_id(i), "mimeType": "application/pdf", "filename": f"doc-{child_id(i)}.pdf",
+              "body": {"size": 1000, "attachmentId": f"att-{child_id(i)}"}}
+             for i in range(max(1, width - 1))]
+    parts.append(build_tree(depth - 1, width, body_bytes, child_id(len(parts))))
+    return {"partId": part_id, "mimeType": "multipart/mixed", "filename": "", "body": {"size": 0}, "parts": parts}
+
+
+def build_message(depth: int, width: int, headers: int, body_bytes: int) -> dict:
+    payload = build_tree(depth, width, body_bytes)
+    names = ["Received", "X-Google-Smtp-Source", "ARC-Seal", "DKIM-Signature", "Subject", "From", "To", "Date",
+             "Message-ID", "References", "In-Reply-To", "Cc", "Delivered-To", "Content-Type"]
+    payload["headers"] = [{"name": names[i % len(names)], "value": f"value {i}"} for i in range(headers)]
+    return {"id": "m1", "threadId": "t1", "labelIds": ["INBOX"], "snippet": "...", "payload": payload}
+
+
+# The former GmailService parsing code, kept for comparison
+
+def legacy_parse(txt: dict) -> tuple[dict, dict]:
+    payload = txt.get('payload', {})
+    metadata = {'id': txt.get('id'), 'threadId': txt.get('threadId')}
+    metadata.update(legacy_headers(txt))
+    body = legacy_extract_body(payload)
+    if body:
+        metadata['body'] = body
+    attachments = {}
+    for part in payload.get("parts", []):
+        if "body" in part and "attachmentId" in part["body"]:
+            attachments[part["partId"]] = {"filename": part["filename"], "mimeType": part["mimeType"],
+                                           "attachmentId": part["body"]["attachmentId"], "partId": part["partId"]}
+    return metadata, attachments
+
+
+def legacy_headers(txt: dict) -> dict:
+    metadata = {}
+    for header in txt.get('payload', {}).get('headers', []):
+        name = header.get('name', '').lower()
+        value = header.get('value', '')
+        if name == 'subject':
+            metadata['subject'] = value
+        elif name == 'from':
+            metadata['from'] = value
+        elif name == 'to':
+            metadata['to'] = value
+        elif name == 'date':
+            metadata['date'] = value
+        elif name == 'cc':
+            metadata['cc'] = value
+        elif name == 'bcc':
+            metadata['bcc'] = value
+        elif name == 'message-id':
+            metadata['message_id'] = value
+        elif name == 'in-reply-to':
+            metadata['in_reply_to'] = value
+        elif name == 'references':
+            metadata['references'] = value
+        elif name == 'delivered-to':
+            metadata['delivered_to'] = value
+    return metadata
+
+
+def legacy_parse_nested_attachments(txt: dict) -> tuple[dict, dict]:
+    metadata, _ = legacy_parse(txt)
+    attachments = {}
+
+    def scan(parts: list):
+        for part in parts:
+            if "body" in part and "attachmentId" in part["body"]:
+                attachments[part["partId"]] = {"filename": part["filename"], "mimeType": part["mimeType"],
+                                               "attachmentId": part["body"]["attachmentId"], "partId": part["partId"]}
+            scan(part.get("parts", []))
+
+    scan(txt.get("payload", {}).get("parts", []))
+    return metadata, attachments
+
+
+def legacy_extract_body(payload: dict) -> str | None:
+    if payload.get('mimeType') in ('text/plain', 'text/html'):
+        data = payload.get('body', {}).get('data')
+        if data:
+            return base64.urlsafe_b64decode(data).decode('utf-8')
+    if payload.get('mimeType', '').startswith('multipart/'):
+        parts = payload.get('parts', [])
+        for part in parts:
+            if part.get('mimeType') == 'text/plain':
+                data = part.get('body', {}).get('data')
+                if data:
+                    return base64.urlsafe_b64decode(data).decode('utf-8')
+        for part in parts:
+            if part.get('mimeType', '').startswith('multipart/'):
+                nested_body = legacy_extract_body(part)
+                if nested_body:
+                    return nested_body
+        if parts and 'body' in parts[0] and 'data' in parts[0]['body']:
+            return base64.urlsafe_b64decode(parts[0]['body']['data']).decode('utf-8')
+    return None
+
+
+def walker_parse(txt: dict) -> tuple[dict, dict]:
+    payload = txt.get('payload', {})
+    walked = mime.walk(payload)
+    metadata = {'id': txt.get('id'), 'threadId': txt.get('threadId'), **walked.headers}
+    body = mime.decode_body(walked.body_part) if walked.body_part is not None else None
+    if body:
+        metadata['body'] = body
+    return metadata, walked.attachments
+
+
+def _time(fn, message: dict, iterations: int) -> list[float]:
+    for _ in range(min(iterations, 100)):
+        fn(message)
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn(message)
+        timings.append((time.perf_counter() - start) * 1e6)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--depth", type=int, default=16, help="Nesting depth of multipart/mixed parts")
+    parser.add_argument("--width", type=int, default=3, help="Parts per multipart (one is an attachment)")
+    parser.add_argument("--headers", type=int, default=40, help="Message headers")
+    parser.add_argument("--body-bytes", type=int, default=4000)
+    args = parser.parse_args()
+
+    for depth in sorted({1, args.depth // 2, args.depth}):
+        message = build_message(depth, args.width, args.headers, args.body_bytes)
+        legacy_metadata, _ = legacy_parse(message)
+        metadata, _ = walker_parse(message)
+        if legacy_metadata.get('body') != metadata.get('body'):
+            print(f"depth {depth}: bodies differ")
+
+        print(f"depth {depth} ({args.width} parts per level, {args.headers} headers, {args.iterations} iterations)")
+        for label, fn in (("former parser", legacy_parse),
+                          ("former + nested attachments", legacy_parse_nested_attachments),
+                          ("mime.walk", walker_parse)):
+            timings = _time(fn, message, args.iterations)
+            print(f"  {label:<28} median {statistics.median(timings):9.1f} us   "
+                  f"mean {statistics.mean(timings):9.1f} us   attachments found {len(fn(message)[1])}")
+
+    # Listing tools only read the headers
+    message = build_message(1, args.width, args.headers, args.body_bytes)
+    before = _time(legacy_headers, message, args.iterations)
+    after = _time(lambda m: mime.parse_headers(m["payload"]["headers"]), message, args.iterations)
+    print(f"headers only ({args.headers} headers)")
+    print(f"  {'if/elif chain':<28} median {statistics.median(before):9.1f} us")
+    print(f"  {'mime.parse_headers':<28} median {statistics.median(after):9.1f} us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Benchmark body normalization: bytes saved and time per message.
+
+Normalizes a corpus of message bodies with mcp_gsuite.normalize (HTML to
+text, quoted reply and signature stripping, whitespace collapsing) and
+reports, per kind of message, the UTF-8 size before and after and the time
+per message, uncached and from the per-message-ID cache.
+
+The default corpus is synthetic but shaped like real mail: HTML
+newsletters, Gmail reply threads (text/plain with '>' quotes), Outlook
+style top-posted replies in HTML, and short notifications with signatures.
+Use --mbox to run it on a real mailbox export instead, e.g. from Google
+Takeout; bodies are picked like the server does (text/plain over text/html).
+
+Usage:
+    uv run python benchmarks/bench_normalize.py [--messages 200] [--thread-depth 6] [--mbox All\\ mail.mbox]
+"""
+
+import argparse
+import base64
+import mailbox
+import random
+import statistics
+import time
+
+from mcp_gsuite import normalize
+
+WORDS = ("project update meeting review budget quarter design launch customer feedback release schedule "
+         "contract draft invoice report deadline agenda team roadmap metrics hiring travel").split()
+
+
+def _sentence(rng: random.Random, words: int = 12) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _paragraph(rng: random.Random, sentences: int = 4) -> str:
+    return " ".join(_sentence(rng) for _ in range(sentences))
+
+
+def newsletter(rng: random.Random) -> tuple[str, bool]:
+    style = "<style>" + "".join(f".c{i}{{color:#{i:06x};padding:{i % 9}px}}" for i in range(200)) + "</style>"
+    rows = "".join(
+        f'<tr><td style="padding:12px;font-family:Arial"><img src="https://news.example.com/img/{i}.png" width="120">'
+        f'</td><td style="padding:12px"><h2 style="font-size:18px">{_sentence(rng, 6)}</h2><p style="color:#333">'
+        f'{_paragraph(rng)}</p><a href="https://news.example.com/r/{rng.getrandbits(64):x}">Read more</a></td></tr>'
+        for i in range(12)
+    )
+    html = (f"<html><head><meta charset='utf-8'>{style}</head><body><table width='600' cellpadding='0'>{rows}</table>"
+            f"<p style='font-size:10px'>Unsubscribe &middot; Preferences</p>"
+            f"<img src='https://news.example.com/open/{rng.getrandbits(64):x}.gif' width='1' height='1'></body></html>")
+    return html, True
+
+
+def gmail_thread(rng: random.Random, depth: int) -> tuple[str, bool]:
+    body = ""
+    for level in range(depth, 0, -1):
+        quoted = "\n".join("> " + line if line else ">" for line in body.split("\n")) if body else ""
+        body = (f"{_paragraph(rng)}\n\n{_paragraph(rng, 2)}\n\n-- \nPerson {level}\nTeam lead, Example Corp\n"
+                f"+1 555 0100\n\nOn Mon, Jun {level} 2024 at 10:{level:02d} AM Person {level + 1} "
+                f"<person{level + 1}@example.com>\nwrote:\n{quoted}\n")
+    return body, False
+
+
+def outlook_reply(rng: random.Random, depth: int) -> tuple[str, bool]:
+    html = ""
+    for level in range(depth, 0, -1):
+        html = (f'<html><body><div style="font-family:Calibri,sans-serif;font-size:11pt"><p>{_paragraph(rng)}</p>'
+                f'<p>Regards,<br>Person {level}</p></div><div id="appendonsend"></div><hr>'
+                f'<div id="divRplyFwdMsg" dir="ltr"><b>From:</b> Person {level + 1}<br><b>Sent:</b> Monday<br>'
+                f'<b>To:</b> Person {level}<br><b>Subject:</b> Re: {_sentence(rng, 4)}</div>{html}</body></html>')
+    return html, True
+
+
+def notification(rng: random.Random) -> tuple[str, bool]:
+    return (f"Hi,\n\n\n{_paragraph(rng, 2)}\n\n\n\n    Details:   {_sentence(rng, 5)}\n\n"
+            f"--\nThe Example Team\nhttps://example.com\n\nSent from my iPhone\n"), False
+
+
+def synthetic_corpus(messages: int, thread_depth: int, seed: int) -> list[tuple[str, str, bool]]:
+    rng = random.Random(seed)
+    kinds = [
+        ("newsletter (html)", lambda: newsletter(rng)),
+        ("gmail thread (text)", lambda: gmail_thread(rng, thread_depth)),
+        ("outlook reply (html)", lambda: outlook_reply(rng, thread_depth)),
+        ("notification (text)", lambda: notification(rng)),
+    ]
+    corpus = []
+    for i in range(messages):
+        kind, make = kinds[i % len(kinds)]
+        corpus.append((kind, *make()))
+    return corpus
+
+
+def mbox_corpus(path: str, messages: int) -> list[tuple[str, str, bool]]:
+    corpus = []
+    for message in mailbox.mbox(path):
+        plain = html = None
+        for part in message.walk():
+            if part.get_content_maintype() == "multipart" or part.get_filename():
+                continue
+            if part.get_content_type() == "text/plain" and plain is None:
+                plain = part
+            elif part.get_content_type() == "text/html" and html is None:
+                html = part
+        part = plain or html
+        if part is None:
+            continue
+        payload = part.get_payload(decode=True) or b""
+        text = payload.decode(part.get_content_charset() or "utf-8", errors="replace")
+        corpus.append(("mbox " + part.get_content_type(), text, part is html))
+        if len(corpus) >= messages:
+            break
+    return corpus
+
+
+def _part(text: str, html: bool) -> dict:
+    return {"mimeType": "text/html" if html else "text/plain",
+            "body": {"data": base64.urlsafe_b64encode(text.encode()).decode()}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--thread-depth", type=int, default=6, help="Replies per synthetic thread")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mbox", type=str, default=None, help="Use the messages of this mbox file instead")
+    args = parser.parse_args()
+
+    corpus = mbox_corpus(args.mbox, args.messages) if args.mbox else \
+        synthetic_corpus(args.messages, args.thread_depth, args.seed)
+
+    by_kind: dict[str, dict] = {}
+    for i, (kind, text, html) in enumerate(corpus):
+        part = _part(text, html)
+        start = time.perf_counter()
+        normalized = normalize.normalized_body("bench", f"m{i}", part)
+        cold = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        normalize.normalized_body("bench", f"m{i}", part)
+        cached = (time.perf_counter() - start) * 1e6
+
+        stats = by_kind.setdefault(kind, {"count": 0, "before": 0, "after": 0, "cold": [], "cached": []})
+        stats["count"] += 1
+        stats["before"] += len(text.encode())
+        stats["after"] += len(normalized.encode())
+        stats["cold"].append(cold)
+        stats["cached"].append(cached)
+
+    print(f"{'kind':<24} {'msgs':>5} {'bytes before':>13} {'bytes after':>12} {'saved':>7} "
+          f"{'ms/msg':>8} {'cached us':>10}")
+    total_before = total_after = 0
+    for kind, stats in by_kind.items():
+        total_before += stats["before"]
+        total_after += stats["after"]
+        saved = 1 - stats["after"] / stats["before"] if stats["before"] else 0.0
+        print(f"{kind:<24} {stats['count']:>5} {stats['before']:>13} {stats['after']:>12} {saved:>6.1%} "
+              f"{statistics.median(stats['cold']):>8.3f} {statistics.median(stats['cached']):>10.1f}")
+    if total_before:
+        print(f"{'total':<24} {len(corpus):>5} {total_before:>13} {total_after:>12} "
+              f"{1 - total_after / total_before:>6.1%}")
+
+
+if __name__ == "__main__":
+    main()
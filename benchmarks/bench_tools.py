@@ -0,0 +1,278 @@
+"""Benchmark every Gmail and Calendar tool handler against the local fake backend.
+
+Starts benchmarks/fake_google.py in a subprocess, points the server modules
+at it with --google-api-root-url and a throwaway account, then calls each
+tool handler repeatedly. Reports latency percentiles, Google API calls per
+tool call and peak Python memory (tracemalloc, measured in a separate pass
+so that tracing does not inflate the latencies). No network is needed.
+
+Usage:
+    uv run python benchmarks/bench_tools.py [--iterations 20] [--latency-ms 20] [--mailbox-size 500]
+        [--mime-shapes plain,nested] [--rate-limit-ratio 0.05] [--tools query_gmail_emails,...] [--json]
+
+Arguments not listed in --help are passed on to the server modules, e.g.
+--http-transport httplib2 or --max-retries 2. The per-account quota limiter
+is effectively disabled unless --gmail-quota-units-per-second or
+--calendar-requests-per-second is given, so that it does not hide the cost
+of the code under test.
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+from datetime import datetime, timedelta, timezone
+
+import fake_google
+
+ACCOUNT = "bench@example.com"
+MEMORY_ITERATIONS = 3
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def _fixtures(fx: dict, tmp_dir: str) -> dict:
+    """Tool arguments per iteration, keyed by tool name."""
+    messages = fx["messages"]
+    top_level_attachments = [a for a in fx["attachments"] if "." not in a["part_id"]]
+    events = fx["events"]
+    drafts = fx["drafts"]
+    threads = fx["threads"]
+
+    def message(i: int) -> str:
+        return messages[i % len(messages)]
+
+    def attachment(i: int) -> dict:
+        return top_level_attachments[i % len(top_level_attachments)]
+
+    def mail_merge(i: int) -> dict:
+        return {"subject_template": f"Update {i} for $name", "body_template": "Hello $name,\n\n" + "News.\n" * 20,
+                "recipients": [{"to": f"person{j}@example.com", "name": f"Person {j}"} for j in range(25)],
+                "mode": "draft"}
+
+    def mail_merge_job(i: int) -> str:
+        from mcp_gsuite import mailmerge
+        args = mail_merge(i)
+        return mailmerge.make_job_id(args["mode"], args["subject_template"], args["body_template"], args["recipients"])
+
+    return {
+        "query_gmail_emails": lambda i: {"query": "in:inbox", "max_results": 50},
+        "get_gmail_email": lambda i: {"email_id": message(i)},
+        "bulk_get_gmail_emails": lambda i: {"email_ids": [message(i * 20 + j) for j in range(20)]},
+        "get_gmail_thread": lambda i: {"thread_id": threads[i % len(threads)], "collapse_quotes": True},
+        "get_gmail_email_body": lambda i: {"email_id": message(i), "offset": 100, "max_chars": 1000},
+        "create_gmail_draft": lambda i: {"to": "someone@example.com", "subject": f"Draft {i}", "body": "Hello\n" * 20},
+        "delete_gmail_draft": lambda i: {"draft_id": drafts[i % len(drafts)]},
+        "reply_gmail_email": lambda i: {"original_message_id": message(i), "reply_body": "Thanks!"},
+        "get_gmail_attachment": lambda i: {
+            "message_id": attachment(i)["message_id"], "attachment_id": attachment(i)["attachment_id"],
+            "mime_type": "application/pdf", "filename": "report.pdf",
+        },
+        "bulk_save_gmail_attachments": lambda i: {"attachments": [
+            {"message_id": attachment(i * 5 + j)["message_id"], "part_id": attachment(i * 5 + j)["part_id"],
+             "save_path": os.path.join(tmp_dir, f"attachment-{j}.bin")}
+            for j in range(5)
+        ]},
+        "send_gmail_email": lambda i: {"to": "someone@example.com", "subject": f"Mail {i}", "body": "Hello\n" * 20},
+        "mail_merge_gmail": mail_merge,
+        "get_mail_merge_status": lambda i: {"job_id": mail_merge_job(i)},
+        "list_gmail_drafts": lambda i: {"max_results": 20},
+        "get_unread_gmail_emails": lambda i: {"max_results": 50},
+        "mark_email_read": lambda i: {"email_id": message(i)},
+        "trash_email": lambda i: {"email_id": messages[-(i % len(messages)) - 1]},
+        "list_labels": lambda i: {},
+        "mailbox_stats": lambda i: {"refresh": i % 2 == 0},
+        "create_label": lambda i: {"name": f"Bench {i}"},
+        "apply_label": lambda i: {"email_id": message(i), "label_name": "Projects"},
+        "remove_label": lambda i: {"email_id": message(i), "label_id": "Label_1"},
+        "archive_email": lambda i: {"email_id": message(i)},
+        "batch_archive_emails": lambda i: {"email_ids": [message(i * 100 + j) for j in range(100)]},
+        "list_archived_emails": lambda i: {"max_results": 50},
+        "restore_email_to_inbox": lambda i: {"email_id": message(i)},
+        "delete_label": lambda i: {"label_id": f"Label_{1000 + i}"},
+        "list_calendars": lambda i: {},
+        "get_calendar_events": lambda i: {"time_min": "2030-01-01T00:00:00Z", "max_results": 100},
+        "create_calendar_event": lambda i: {
+            "summary": f"Event {i}", "start_time": "2030-02-01T10:00:00Z", "end_time": "2030-02-01T11:00:00Z",
+            "attendees": ["a@example.com", "b@example.com"],
+        },
+        "update_calendar_event": lambda i: {"event_id": events[i % len(events)], "summary": f"Updated {i}"},
+        "delete_calendar_event": lambda i: {"event_id": events[-(i % len(events)) - 1]},
+    }
+
+
+def write_account(tmp_dir: str) -> tuple[str, str]:
+    """Write an accounts file and non-expiring credentials for the benchmark account."""
+    from oauth2client.client import OAuth2Credentials
+
+    accounts_file = os.path.join(tmp_dir, "accounts.json")
+    with open(accounts_file, "w") as f:
+        json.dump({"accounts": [{"email": ACCOUNT, "account_type": "personal", "extra_info": "benchmark"}]}, f)
+    credentials = OAuth2Credentials(
+        access_token="bench-token",
+        client_id="bench",
+        client_secret="bench",
+        refresh_token="bench-refresh",
+        token_expiry=datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(days=365),
+        token_uri="https://oauth2.googleapis.com/token",
+        user_agent="bench",
+    )
+    with open(os.path.join(tmp_dir, f".oauth2.{ACCOUNT}.json"), "w") as f:
+        f.write(credentials.to_json())
+    return accounts_file, tmp_dir
+
+
+def start_backend(args: argparse.Namespace) -> tuple[subprocess.Popen, str]:
+    """Start fake_google.py with the options added by fake_google.add_config_arguments(), returning its URL."""
+    command = [sys.executable, os.path.join(os.path.dirname(__file__), "fake_google.py"), "--port", "0",
+               "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+               "--batch-item-latency-ms", str(args.batch_item_latency_ms),
+               "--mailbox-size", str(args.mailbox_size), "--mime-shapes", args.mime_shapes,
+               "--body-bytes", str(args.body_bytes), "--attachment-bytes", str(args.attachment_bytes),
+               "--drafts", str(args.drafts), "--events", str(args.events),
+               "--rate-limit-ratio", str(args.rate_limit_ratio),
+               "--seed", str(args.seed)]
+    if args.retry_after is not None:
+        command += ["--retry-after", str(args.retry_after)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line:
+        raise SystemExit("Fake backend failed to start")
+    return process, line.strip().rsplit(" ", 1)[-1]
+
+
+def get_json(url: str, method: str = "GET") -> dict | None:
+    request = urllib.request.Request(url, method=method)
+    with urllib.request.urlopen(request) as response:
+        body = response.read()
+    return json.loads(body) if body else None
+
+
+def _call(handler, arguments: dict) -> str | None:
+    """Run a tool handler, returning the error message if it failed."""
+    try:
+        handler.run_tool({"__user_id__": ACCOUNT, **arguments})
+        return None
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+
+def bench_tool(handler, make_args, backend_url: str, iterations: int) -> dict:
+    # Warm-up call: discovery documents, connection pool, imports
+    _call(handler, make_args(0))
+
+    get_json(backend_url + "_fake/reset", method="POST")
+    timings = []
+    errors = []
+    for i in range(iterations):
+        arguments = make_args(i + 1)
+        start = time.perf_counter()
+        error = _call(handler, arguments)
+        timings.append((time.perf_counter() - start) * 1000)
+        if error:
+            errors.append(error)
+    stats = get_json(backend_url + "_fake/stats")
+
+    tracemalloc.start()
+    peaks = []
+    for i in range(MEMORY_ITERATIONS):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        _call(handler, make_args(iterations + i + 1))
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+    tracemalloc.stop()
+
+    return {
+        "tool": handler.name,
+        "iterations": iterations,
+        "p50_ms": round(percentile(timings, 50), 2),
+        "p95_ms": round(percentile(timings, 95), 2),
+        "p99_ms": round(percentile(timings, 99), 2),
+        "mean_ms": round(statistics.mean(timings), 2),
+        "max_ms": round(max(timings), 2),
+        "api_calls_per_call": round(stats["api_calls"] / iterations, 2),
+        "http_requests_per_call": round(stats["http_requests"] / iterations, 2),
+        "rate_limited": stats["rate_limited"],
+        "peak_kib": round(max(peaks) / 1024, 1),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "endpoints": stats["endpoints"],
+    }
+
+
+def _print_table(results: list[dict]):
+    header = (f"{'tool':<30} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+              f"{'api/call':>9} {'http/call':>9} {'429s':>5} {'peak KiB':>9} {'errors':>6}")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['tool']:<30} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['max_ms']:>8.2f} "
+              f"{r['api_calls_per_call']:>9.2f} {r['http_requests_per_call']:>9.2f} {r['rate_limited']:>5} "
+              f"{r['peak_kib']:>9.1f} {r['errors']:>6}")
+    for r in results:
+        if r["first_error"]:
+            print(f"\n{r['tool']}: {r['errors']} error(s), first: {r['first_error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--tools", type=str, default=None, help="Comma-separated tool names (default: all)")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    fake_google.add_config_arguments(parser)
+    args, server_args = parser.parse_known_args()
+
+    logging.basicConfig(level=logging.CRITICAL)
+    if "--gmail-quota-units-per-second" not in server_args:
+        server_args += ["--gmail-quota-units-per-second", "1e9"]
+    if "--calendar-requests-per-second" not in server_args:
+        server_args += ["--calendar-requests-per-second", "1e9"]
+
+    backend, backend_url = start_backend(args)
+    try:
+        with tempfile.TemporaryDirectory(prefix="mcp-gsuite-bench-") as tmp_dir:
+            accounts_file, credentials_dir = write_account(tmp_dir)
+            # The server modules read their options from the command line.
+            sys.argv = [sys.argv[0], "--accounts-file", accounts_file, "--credentials-dir", credentials_dir,
+                        "--google-api-root-url", backend_url,
+                        "--adaptive-state-file", os.path.join(tmp_dir, "adaptive.json")] + server_args
+
+            from mcp_gsuite import tools_calendar, tools_gmail
+
+            fixtures = _fixtures(get_json(backend_url + "_fake/fixtures"), tmp_dir)
+            handlers = [cls() for cls in {**tools_gmail.TOOL_HANDLERS, **tools_calendar.TOOL_HANDLERS}.values()]
+            if args.tools:
+                wanted = {name.strip() for name in args.tools.split(",")}
+                handlers = [h for h in handlers if h.name in wanted]
+
+            results = []
+            for handler in handlers:
+                if handler.name not in fixtures:
+                    print(f"No fixture for {handler.name}, skipped", file=sys.stderr)
+                    continue
+                results.append(bench_tool(handler, fixtures[handler.name], backend_url, args.iterations))
+    finally:
+        backend.terminate()
+        backend.wait()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        _print_table(results)
+
+
+if __name__ == "__main__":
+    main()
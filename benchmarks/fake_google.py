@@ -0,0 +1,895 @@
+"""Local stand-in for the Gmail and Calendar REST APIs.
+
+Serves the endpoints called by the tool handlers, including batch requests,
+from a generated in-memory mailbox and calendar, so that benchmarks run
+without network access or a Google account. Latency, mailbox size, MIME
+shapes and injected 429 responses are configurable.
+
+Point the server at it with --google-api-root-url:
+
+    uv run python benchmarks/fake_google.py --port 8089 --mailbox-size 1000
+    uv run mcp-gsuite-enhanced --google-api-root-url http://127.0.0.1:8089/ ...
+
+GET /_fake/stats returns the request counts per endpoint, POST /_fake/reset
+clears them and GET /_fake/fixtures lists IDs that benchmarks can use.
+POST /_fake/deliver adds an unread inbox message, as if new mail arrived;
+like every other change, it is reported by history.list. POST
+/_fake/fail?count=N answers the next N API calls with 500 backendError.
+"""
+
+import argparse
+import base64
+import email
+import email.policy
+import json
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+MIME_SHAPES = ("plain", "html", "alternative", "attachment", "nested")
+
+SYSTEM_LABELS = ("INBOX", "UNREAD", "STARRED", "IMPORTANT", "SENT", "DRAFT", "TRASH", "SPAM",
+                 "CATEGORY_PERSONAL", "CATEGORY_UPDATES")
+
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut "
+         "labore et dolore magna aliqua quarterly report meeting invoice project update schedule").split()
+
+
+@dataclass
+class FakeGoogleConfig:
+    latency_ms: float = 20.0
+    jitter_ms: float = 5.0
+    batch_item_latency_ms: float = 1.0
+    mailbox_size: int = 500
+    mime_shapes: tuple[str, ...] = MIME_SHAPES
+    body_bytes: int = 2000
+    attachment_bytes: int = 50_000
+    messages_per_thread: int = 3
+    unread_ratio: float = 0.3
+    inbox_ratio: float = 0.7
+    drafts: int = 20
+    events: int = 200
+    rate_limit_ratio: float = 0.0
+    retry_after: float | None = None
+    seed: int = 1
+    email_address: str = "bench@example.com"
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, reason: str, message: str, headers: dict | None = None):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+        self.headers = headers or {}
+
+    def body(self) -> dict:
+        return {"error": {"code": self.status, "message": str(self),
+                          "errors": [{"reason": self.reason, "message": str(self)}]}}
+
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+
+def _child(part_id: str, index: int) -> str:
+    return str(index) if part_id == "" else f"{part_id}.{index}"
+
+
+def _text(rng: random.Random, size: int) -> str:
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    lines = [" ".join(words[i:i + 12]) for i in range(0, len(words), 12)]
+    return "\n".join(lines)[:size]
+
+
+class Mailbox():
+    """Generated Gmail mailbox and calendar; every method expects the server lock to be held."""
+
+    def __init__(self, config: FakeGoogleConfig):
+        self.config = config
+        self.history_id = 1000
+        # Changes since startup, oldest first; history.list serves them
+        self.history: list[dict] = []
+        self.labels = {name: {"id": name, "name": name, "type": "system"} for name in SYSTEM_LABELS}
+        self.labels["Label_1"] = {"id": "Label_1", "name": "Projects", "type": "user"}
+        self.next_id = 0
+        self.messages: dict[str, dict] = {}
+        self.order: list[str] = []
+        self.payloads: dict[str, dict] = {}
+        self.attachments: dict[str, int] = {}
+        self.drafts: dict[str, str] = {}
+        self.calendars = [
+            {"kind": "calendar#calendarListEntry", "id": config.email_address, "summary": config.email_address,
+             "primary": True, "timeZone": "UTC", "accessRole": "owner"},
+            {"kind": "calendar#calendarListEntry", "id": "family@group.calendar.google.com", "summary": "Family",
+             "timeZone": "UTC", "accessRole": "owner"},
+            {"kind": "calendar#calendarListEntry", "id": "en.usa#holiday@group.v.calendar.google.com",
+             "summary": "Holidays", "timeZone": "UTC", "accessRole": "reader"},
+        ]
+        self.events: dict[str, dict[str, dict]] = {"primary": {}}
+
+        rng = random.Random(config.seed)
+        for i in range(config.mailbox_size):
+            labels = []
+            if rng.random() < config.inbox_ratio:
+                labels.append("INBOX")
+            if rng.random() < config.unread_ratio:
+                labels.append("UNREAD")
+            if i % 7 == 0:
+                labels.append("Label_1")
+            shape = config.mime_shapes[i % len(config.mime_shapes)]
+            self._add_message(rng, shape, labels, thread_index=i // max(1, config.messages_per_thread))
+        for _ in range(config.drafts):
+            message_id = self._add_message(rng, "plain", ["DRAFT"], thread_index=None)
+            self.drafts[f"r{message_id}"] = message_id
+        for i in range(config.events):
+            event_id = f"evt{i:05d}"
+            day = 1 + i % 28
+            hour = 8 + i % 9
+            self.events["primary"][event_id] = {
+                "kind": "calendar#event",
+                "id": event_id,
+                "status": "confirmed",
+                "summary": f"Meeting {i}",
+                "description": _text(rng, 200),
+                "location": "Room 1",
+                "start": {"dateTime": f"2030-01-{day:02d}T{hour:02d}:00:00Z"},
+                "end": {"dateTime": f"2030-01-{day:02d}T{hour:02d}:30:00Z"},
+                "attendees": [{"email": f"user{j}@example.com", "responseStatus": "accepted"} for j in range(3)],
+                "organizer": {"email": self.config.email_address, "self": True},
+            }
+
+    # Messages
+
+    def _new_id(self) -> str:
+        self.next_id += 1
+        return f"{0x18c0000000 + self.next_id:x}"
+
+    def _headers(self, message_id: str, index: int, content_type: str) -> list[dict]:
+        return [
+            {"name": "Delivered-To", "value": self.config.email_address},
+            {"name": "From", "value": f"Sender {index % 50} <sender{index % 50}@example.com>"},
+            {"name": "To", "value": self.config.email_address},
+            {"name": "Cc", "value": "team@example.com"},
+            {"name": "Subject", "value": f"Status update {index}"},
+            {"name": "Date", "value": time.strftime("%a, %d %b %Y %H:%M:%S +0000", time.gmtime(1.7e9 + index * 60))},
+            {"name": "Message-ID", "value": f"<{message_id}@mail.example.com>"},
+            {"name": "MIME-Version", "value": "1.0"},
+            {"name": "Content-Type", "value": content_type},
+        ]
+
+    def _leaf(self, part_id: str, mime_type: str, data: bytes) -> dict:
+        return {"partId": part_id, "mimeType": mime_type, "filename": "",
+                "headers": [{"name": "Content-Type", "value": f"{mime_type}; charset=\"UTF-8\""}],
+                "body": {"size": len(data), "data": _b64(data)}}
+
+    def _attachment(self, message_id: str, part_id: str, mime_type: str, filename: str, size: int) -> dict:
+        attachment_id = f"att-{message_id}-{part_id}"
+        self.attachments[attachment_id] = size
+        return {"partId": part_id, "mimeType": mime_type, "filename": filename,
+                "headers": [{"name": "Content-Type", "value": f"{mime_type}; name=\"{filename}\""},
+                            {"name": "Content-Disposition", "value": f"attachment; filename=\"{filename}\""}],
+                "body": {"attachmentId": attachment_id, "size": size}}
+
+    def _multipart(self, part_id: str, subtype: str, parts: list[dict]) -> dict:
+        return {"partId": part_id, "mimeType": f"multipart/{subtype}", "filename": "",
+                "headers": [{"name": "Content-Type", "value": f"multipart/{subtype}; boundary=\"b{part_id}\""}],
+                "body": {"size": 0}, "parts": parts}
+
+    def _alternative(self, part_id: str, text: str) -> dict:
+        html = "<html><body>" + "".join(f"<p>{line}</p>" for line in text.splitlines()) + "</body></html>"
+        return self._multipart(part_id, "alternative", [
+            self._leaf(_child(part_id, 0), "text/plain", text.encode()),
+            self._leaf(_child(part_id, 1), "text/html", html.encode()),
+        ])
+
+    def _payload(self, rng: random.Random, message_id: str, shape: str) -> dict:
+        text = _text(rng, self.config.body_bytes)
+        size = self.config.attachment_bytes
+        if shape == "plain":
+            return self._leaf("", "text/plain", text.encode())
+        if shape == "html":
+            html = "<html><body>" + "".join(f"<div>{line}</div>" for line in text.splitlines()) + "</body></html>"
+            return self._leaf("", "text/html", html.encode())
+        if shape == "alternative":
+            return self._alternative("", text)
+        if shape == "attachment":
+            return self._multipart("", "mixed", [
+                self._alternative("0", text),
+                self._attachment(message_id, "1", "application/pdf", "report.pdf", size),
+            ])
+        # nested: related(alternative + inline image) and a forwarded message with its own attachment
+        forwarded = self._multipart("1.0", "mixed", [
+            self._leaf("1.0.0", "text/plain", _text(rng, self.config.body_bytes // 2).encode()),
+            self._attachment(message_id, "1.0.1", "text/csv", "data.csv", size // 2),
+        ])
+        return self._multipart("", "mixed", [
+            self._multipart("0", "related", [
+                self._alternative("0.0", text),
+                self._attachment(message_id, "0.1", "image/png", "logo.png", size // 10),
+            ]),
+            {"partId": "1", "mimeType": "message/rfc822", "filename": "forwarded.eml",
+             "headers": [{"name": "Content-Type", "value": "message/rfc822"}],
+             "body": {"size": 0}, "parts": [forwarded]},
+        ])
+
+    def _add_message(self, rng: random.Random, shape: str, labels: list[str], thread_index: int | None) -> str:
+        message_id = self._new_id()
+        index = len(self.order)
+        payload = self._payload(rng, message_id, shape)
+        content_type = next(h["value"] for h in payload["headers"] if h["name"] == "Content-Type")
+        payload["headers"] = self._headers(message_id, index, content_type)
+        self.payloads[message_id] = payload
+        text = _text(rng, 120)
+        self.messages[message_id] = {
+            "id": message_id,
+            "threadId": f"thr{thread_index:06d}" if thread_index is not None else f"thr-{message_id}",
+            "labelIds": labels,
+            "snippet": text[:100],
+            "historyId": str(self.history_id),
+            "internalDate": str(int((1.7e9 + index * 60) * 1000)),
+            "sizeEstimate": len(json.dumps(payload)),
+        }
+        self.order.append(message_id)
+        return message_id
+
+    def _record(self, message_id: str, change: str, label_ids: list[str] | None = None):
+        message = self.messages[message_id]
+        summary = {"id": message_id, "threadId": message["threadId"], "labelIds": list(message["labelIds"])}
+        record = {"id": str(self.history_id), "messages": [{"id": message_id, "threadId": message["threadId"]}]}
+        if change == "messagesAdded":
+            record[change] = [{"message": summary}]
+        else:
+            record[change] = [{"message": summary, "labelIds": label_ids}]
+        self.history.append(record)
+
+    def deliver(self, rng: random.Random) -> str:
+        """A new unread message in the inbox."""
+        self.history_id += 1
+        message_id = self._add_message(rng, "plain", ["INBOX", "UNREAD"], thread_index=None)
+        self._record(message_id, "messagesAdded")
+        return message_id
+
+    def add_raw_message(self, raw: str, labels: list[str], thread_id: str | None = None) -> str:
+        parsed = email.message_from_bytes(base64.urlsafe_b64decode(raw + "=" * (-len(raw) % 4)),
+                                          policy=email.policy.default)
+        body = parsed.get_body(preferencelist=("plain", "html"))
+        content = body.get_content().encode() if body is not None else b""
+        message_id = self._new_id()
+        payload = self._leaf("", "text/plain", content)
+        payload["headers"] = [{"name": name, "value": str(value)} for name, value in parsed.items()]
+        self.payloads[message_id] = payload
+        self.history_id += 1
+        self.messages[message_id] = {
+            "id": message_id,
+            "threadId": thread_id or f"thr-{message_id}",
+            "labelIds": labels,
+            "snippet": content[:100].decode(errors="ignore"),
+            "historyId": str(self.history_id),
+            "internalDate": str(int(time.time() * 1000)),
+            "sizeEstimate": len(raw),
+        }
+        self.order.append(message_id)
+        self._record(message_id, "messagesAdded")
+        return message_id
+
+    def message(self, message_id: str, fmt: str = "full", metadata_headers: list[str] | None = None) -> dict:
+        if message_id not in self.messages:
+            raise ApiError(404, "notFound", "Requested entity was not found.")
+        resource = dict(self.messages[message_id])
+        resource["labelIds"] = list(resource["labelIds"])
+        if fmt == "minimal":
+            return resource
+        payload = self.payloads[message_id]
+        if fmt == "metadata":
+            wanted = {h.lower() for h in metadata_headers or []}
+            headers = [h for h in payload["headers"] if not wanted or h["name"].lower() in wanted]
+            resource["payload"] = {"partId": "", "mimeType": payload["mimeType"], "filename": "", "headers": headers,
+                                   "body": {"size": 0}}
+            return resource
+        resource["payload"] = payload
+        return resource
+
+    def _matches(self, message: dict, query: str, label_ids: list[str]) -> bool:
+        labels = message["labelIds"]
+        if any(label not in labels for label in label_ids):
+            return False
+        if "TRASH" in labels and "in:trash" not in query:
+            return False
+        for token in query.split():
+            negate = token.startswith("-")
+            token = token.lstrip("-").lower()
+            if token.startswith("is:"):
+                matched = token[3:].upper() in labels
+            elif token.startswith("in:"):
+                matched = token[3:].upper() in labels
+            elif token.startswith("label:"):
+                name = token[6:]
+                matched = any(self.labels.get(label, {}).get("name", "").lower() == name
+                              or label.lower() == name for label in labels)
+            else:
+                continue
+            if matched == negate:
+                return False
+        return True
+
+    def list_messages(self, query: str, label_ids: list[str], max_results: int, page_token: str | None) -> dict:
+        ids = [mid for mid in reversed(self.order)
+               if mid in self.messages and "DRAFT" not in self.messages[mid]["labelIds"]
+               and self._matches(self.messages[mid], query, label_ids)]
+        start = int(page_token or 0)
+        page = ids[start:start + max_results]
+        result = {"messages": [{"id": mid, "threadId": self.messages[mid]["threadId"]} for mid in page],
+                  "resultSizeEstimate": len(ids)}
+        if start + max_results < len(ids):
+            result["nextPageToken"] = str(start + max_results)
+        if not page:
+            del result["messages"]
+        return result
+
+    def modify(self, message_id: str, add: list[str], remove: list[str]) -> dict:
+        if message_id not in self.messages:
+            raise ApiError(404, "notFound", "Requested entity was not found.")
+        message = self.messages[message_id]
+        removed = [label for label in remove if label in message["labelIds"]]
+        added = [label for label in add if label not in message["labelIds"]]
+        labels = [label for label in message["labelIds"] if label not in remove]
+        labels += [label for label in add if label not in labels]
+        message["labelIds"] = labels
+        self.history_id += 1
+        message["historyId"] = str(self.history_id)
+        if added:
+            self._record(message_id, "labelsAdded", added)
+        if removed:
+            self._record(message_id, "labelsRemoved", removed)
+        return {"id": message_id, "threadId": message["threadId"], "labelIds": list(labels)}
+
+    def attachment(self, message_id: str, attachment_id: str) -> dict:
+        size = self.attachments.get(attachment_id)
+        if size is None or message_id not in self.messages:
+            raise ApiError(404, "notFound", "Requested entity was not found.")
+        data = (b"%PDF-1.4\n" + b"0123456789abcdef" * (size // 16 + 1))[:size]
+        return {"size": size, "data": _b64(data)}
+
+    def thread(self, thread_id: str, fmt: str, metadata_headers: list[str] | None) -> dict:
+        messages = [self.message(mid, fmt, metadata_headers) for mid in self.order
+                    if mid in self.messages and self.messages[mid]["threadId"] == thread_id]
+        if not messages:
+            raise ApiError(404, "notFound", "Requested entity was not found.")
+        return {"id": thread_id, "historyId": messages[-1]["historyId"], "messages": messages}
+
+    def label(self, label_id: str) -> dict:
+        if label_id not in self.labels:
+            raise ApiError(404, "notFound", "Requested entity was not found.")
+        labelled = [m for m in self.messages.values() if label_id in m["labelIds"]]
+        return {
+            **self.labels[label_id],
+            "messagesTotal": len(labelled),
+            "messagesUnread": sum(1 for m in labelled if "UNREAD" in m["labelIds"]),
+            "threadsTotal": len({m["threadId"] for m in labelled}),
+            "threadsUnread": len({m["threadId"] for m in labelled if "UNREAD" in m["labelIds"]}),
+        }
+
+    # Calendar
+
+    def calendar_events(self, calendar_id: str) -> dict[str, dict]:
+        if calendar_id == self.config.email_address:
+            calendar_id = "primary"
+        return self.events.setdefault(calendar_id, {})
+
+
+class FakeGoogleServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, config: FakeGoogleConfig):
+        super().__init__(address, _Handler)
+        self.config = config
+        self.lock = threading.Lock()
+        self.mailbox = Mailbox(config)
+        self.rng = random.Random(config.seed)
+        self.counts: Counter = Counter()
+        # API calls still to be answered with an injected 500, see POST /_fake/fail
+        self.fail_next = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/"
+
+    def stats(self) -> dict:
+        with self.lock:
+            endpoints = dict(sorted(self.counts.items()))
+        return {
+            "endpoints": endpoints,
+            "api_calls": sum(v for k, v in endpoints.items() if not k.startswith("_")),
+            "http_requests": endpoints.get("_http", 0),
+            "batches": endpoints.get("_batch", 0),
+            "rate_limited": endpoints.get("_rate_limited", 0),
+        }
+
+    def fixtures(self) -> dict:
+        """IDs of generated messages, attachments, drafts, labels and events."""
+        box = self.mailbox
+        with self.lock:
+            messages = [mid for mid in box.order if mid in box.messages and "DRAFT" not in box.messages[mid]["labelIds"]]
+            attachments = []
+            for attachment_id in box.attachments:
+                _, message_id, part_id = attachment_id.split("-", 2)
+                attachments.append({"message_id": message_id, "part_id": part_id, "attachment_id": attachment_id})
+            return {
+                "email_address": self.config.email_address,
+                "messages": messages,
+                "threads": sorted({box.messages[mid]["threadId"] for mid in messages}),
+                "attachments": attachments,
+                "drafts": list(box.drafts),
+                "labels": [label["id"] for label in box.labels.values() if label["type"] == "user"],
+                "events": list(box.events["primary"]),
+            }
+
+    def reset_stats(self):
+        with self.lock:
+            self.counts.clear()
+
+    def dispatch(self, method: str, target: str, body: bytes) -> tuple[int, dict | None, dict]:
+        """Serve one API call (top-level or batched). Returns (status, json body, headers)."""
+        url = urlsplit(target)
+        query = {k: v if len(v) > 1 else v[0] for k, v in parse_qs(url.query).items()}
+        data = json.loads(body) if body else {}
+        for pattern, route_method, name, handler in ROUTES:
+            match = pattern.fullmatch(url.path)
+            if match and route_method == method:
+                with self.lock:
+                    self.counts[name] += 1
+                    if self.fail_next:
+                        self.fail_next -= 1
+                        self.counts["_failed"] += 1
+                        error = ApiError(500, "backendError", "Backend Error")
+                        return error.status, error.body(), error.headers
+                    if self.config.rate_limit_ratio and self.rng.random() < self.config.rate_limit_ratio:
+                        self.counts["_rate_limited"] += 1
+                        headers = {}
+                        if self.config.retry_after is not None:
+                            headers["Retry-After"] = str(self.config.retry_after)
+                        error = ApiError(429, "rateLimitExceeded", "User-rate limit exceeded.", headers)
+                        return error.status, error.body(), error.headers
+                    try:
+                        status, result = handler(self.mailbox, match, query, data)
+                    except ApiError as e:
+                        return e.status, e.body(), e.headers
+                return status, result, {}
+        error = ApiError(404, "notFound", f"No fake route for {method} {url.path}")
+        return error.status, error.body(), {}
+
+
+# Routes
+
+def _list(value) -> list:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def _messages_list(box, m, q, d):
+    return 200, box.list_messages(q.get("q", ""), _list(q.get("labelIds")), int(q.get("maxResults", 100)),
+                                  q.get("pageToken"))
+
+
+def _messages_get(box, m, q, d):
+    return 200, box.message(m["id"], q.get("format", "full"), _list(q.get("metadataHeaders")))
+
+
+def _messages_modify(box, m, q, d):
+    return 200, box.modify(m["id"], d.get("addLabelIds", []), d.get("removeLabelIds", []))
+
+
+def _messages_batch_modify(box, m, q, d):
+    for message_id in d.get("ids", []):
+        if message_id in box.messages:
+            box.modify(message_id, d.get("addLabelIds", []), d.get("removeLabelIds", []))
+    return 204, None
+
+
+def _messages_trash(box, m, q, d):
+    return 200, box.modify(m["id"], ["TRASH"], ["INBOX"])
+
+
+def _messages_send(box, m, q, d):
+    message_id = box.add_raw_message(d["raw"], ["SENT"], d.get("threadId"))
+    return 200, {"id": message_id, "threadId": box.messages[message_id]["threadId"], "labelIds": ["SENT"]}
+
+
+def _attachments_get(box, m, q, d):
+    return 200, box.attachment(m["id"], m["aid"])
+
+
+def _history_list(box, m, q, d):
+    start = int(q["startHistoryId"])
+    if start < 1000:
+        raise ApiError(404, "notFound", "Requested entity was not found.")
+    max_results = int(q.get("maxResults", 100))
+    offset = int(q.get("pageToken", 0))
+    records = [record for record in box.history if int(record["id"]) > start]
+    result = {"historyId": str(box.history_id)}
+    if records[offset:offset + max_results]:
+        result["history"] = records[offset:offset + max_results]
+    if offset + max_results < len(records):
+        result["nextPageToken"] = str(offset + max_results)
+    return 200, result
+
+
+def _threads_get(box, m, q, d):
+    return 200, box.thread(m["id"], q.get("format", "full"), _list(q.get("metadataHeaders")))
+
+
+def _drafts_list(box, m, q, d):
+    max_results = int(q.get("maxResults", 100))
+    start = int(q.get("pageToken", 0))
+    ids = list(box.drafts)
+    result = {"drafts": [{"id": did, "message": {"id": box.drafts[did],
+                                                 "threadId": box.messages[box.drafts[did]]["threadId"]}}
+                         for did in ids[start:start + max_results]],
+              "resultSizeEstimate": len(ids)}
+    if start + max_results < len(ids):
+        result["nextPageToken"] = str(start + max_results)
+    return 200, result
+
+
+def _drafts_get(box, m, q, d):
+    if m["id"] not in box.drafts:
+        raise ApiError(404, "notFound", "Requested entity was not found.")
+    return 200, {"id": m["id"], "message": box.message(box.drafts[m["id"]], q.get("format", "full"),
+                                                       _list(q.get("metadataHeaders")))}
+
+
+def _drafts_create(box, m, q, d):
+    message = d.get("message", {})
+    message_id = box.add_raw_message(message["raw"], ["DRAFT"], message.get("threadId"))
+    draft_id = f"r{message_id}"
+    box.drafts[draft_id] = message_id
+    return 200, {"id": draft_id, "message": {"id": message_id, "threadId": box.messages[message_id]["threadId"],
+                                             "labelIds": ["DRAFT"]}}
+
+
+def _drafts_delete(box, m, q, d):
+    # Lenient on purpose so that benchmarks can repeat the same call.
+    box.drafts.pop(m["id"], None)
+    return 204, None
+
+
+def _drafts_send(box, m, q, d):
+    draft_id = d.get("id")
+    message_id = box.drafts.pop(draft_id, None)
+    if message_id is None:
+        raise ApiError(404, "notFound", "Requested entity was not found.")
+    box.modify(message_id, ["SENT"], ["DRAFT"])
+    return 200, {"id": message_id, "threadId": box.messages[message_id]["threadId"], "labelIds": ["SENT"]}
+
+
+def _labels_list(box, m, q, d):
+    return 200, {"labels": [dict(label) for label in box.labels.values()]}
+
+
+def _labels_get(box, m, q, d):
+    return 200, box.label(m["id"])
+
+
+def _labels_create(box, m, q, d):
+    if any(label["name"] == d.get("name") for label in box.labels.values()):
+        raise ApiError(409, "duplicate", "Label name exists or conflicts")
+    label_id = f"Label_{len(box.labels) + 1}"
+    box.labels[label_id] = {"id": label_id, "name": d.get("name"), "type": "user",
+                            "labelListVisibility": d.get("labelListVisibility", "labelShow"),
+                            "messageListVisibility": d.get("messageListVisibility", "show")}
+    return 200, dict(box.labels[label_id])
+
+
+def _labels_delete(box, m, q, d):
+    # Lenient on purpose so that benchmarks can repeat the same call.
+    box.labels.pop(m["id"], None)
+    return 204, None
+
+
+def _profile(box, m, q, d):
+    return 200, {"emailAddress": box.config.email_address, "messagesTotal": len(box.messages),
+                 "threadsTotal": len({msg["threadId"] for msg in box.messages.values()}),
+                 "historyId": str(box.history_id)}
+
+
+def _calendar_list(box, m, q, d):
+    return 200, {"kind": "calendar#calendarList", "items": box.calendars}
+
+
+def _events_list(box, m, q, d):
+    events = sorted(box.calendar_events(m["cid"]).values(), key=lambda e: e["start"].get("dateTime", ""))
+    if q.get("showDeleted") != "true":
+        events = [e for e in events if e.get("status") != "cancelled"]
+    if q.get("timeMin"):
+        events = [e for e in events if e["end"].get("dateTime", "") >= q["timeMin"]]
+    if q.get("timeMax"):
+        events = [e for e in events if e["start"].get("dateTime", "") < q["timeMax"]]
+    return 200, {"kind": "calendar#events", "items": events[:int(q.get("maxResults", 250))]}
+
+
+def _event_with_conference(event: dict, q: dict) -> dict:
+    if q.get("conferenceDataVersion") == "1" and "createRequest" in event.get("conferenceData", {}):
+        code = f"abc-{event['id'][-4:]}-xyz"
+        event["hangoutLink"] = f"https://meet.google.com/{code}"
+        event["conferenceData"] = {
+            "conferenceId": code,
+            "conferenceSolution": {"key": {"type": "hangoutsMeet"}, "name": "Google Meet"},
+            "entryPoints": [{"entryPointType": "video", "uri": event["hangoutLink"]}],
+        }
+    return event
+
+
+def _events_insert(box, m, q, d):
+    events = box.calendar_events(m["cid"])
+    event = dict(d, kind="calendar#event", id=f"evt{len(events):05d}n{box.history_id}", status="confirmed")
+    box.history_id += 1
+    events[event["id"]] = _event_with_conference(event, q)
+    return 200, event
+
+
+def _events_get(box, m, q, d):
+    event = box.calendar_events(m["cid"]).get(m["eid"])
+    if event is None:
+        raise ApiError(404, "notFound", "Not Found")
+    return 200, event
+
+
+def _events_update(box, m, q, d):
+    events = box.calendar_events(m["cid"])
+    if m["eid"] not in events:
+        raise ApiError(404, "notFound", "Not Found")
+    event = dict(d, kind="calendar#event", id=m["eid"], status="confirmed")
+    events[m["eid"]] = _event_with_conference(event, q)
+    return 200, event
+
+
+def _events_patch(box, m, q, d):
+    events = box.calendar_events(m["cid"])
+    if m["eid"] not in events:
+        raise ApiError(404, "notFound", "Not Found")
+    events[m["eid"]].update(d)
+    return 200, events[m["eid"]]
+
+
+def _events_delete(box, m, q, d):
+    # Lenient on purpose so that benchmarks can repeat the same call.
+    box.calendar_events(m["cid"]).pop(m["eid"], None)
+    return 204, None
+
+
+_GMAIL = r"/gmail/v1/users/[^/]+"
+_CALENDAR = r"/calendar/v3"
+
+ROUTES = [(re.compile(pattern), method, name, handler) for pattern, method, name, handler in [
+    (_GMAIL + r"/profile", "GET", "gmail.users.getProfile", _profile),
+    (_GMAIL + r"/messages", "GET", "gmail.users.messages.list", _messages_list),
+    (_GMAIL + r"/messages/send", "POST", "gmail.users.messages.send", _messages_send),
+    (_GMAIL + r"/messages/batchModify", "POST", "gmail.users.messages.batchModify", _messages_batch_modify),
+    (_GMAIL + r"/messages/(?P<id>[^/]+)", "GET", "gmail.users.messages.get", _messages_get),
+    (_GMAIL + r"/messages/(?P<id>[^/]+)/modify", "POST", "gmail.users.messages.modify", _messages_modify),
+    (_GMAIL + r"/messages/(?P<id>[^/]+)/trash", "POST", "gmail.users.messages.trash", _messages_trash),
+    (_GMAIL + r"/messages/(?P<id>[^/]+)/attachments/(?P<aid>[^/]+)", "GET",
+     "gmail.users.messages.attachments.get", _attachments_get),
+    (_GMAIL + r"/history", "GET", "gmail.users.history.list", _history_list),
+    (_GMAIL + r"/threads/(?P<id>[^/]+)", "GET", "gmail.users.threads.get", _threads_get),
+    (_GMAIL + r"/drafts", "GET", "gmail.users.drafts.list", _drafts_list),
+    (_GMAIL + r"/drafts", "POST", "gmail.users.drafts.create", _drafts_create),
+    (_GMAIL + r"/drafts/send", "POST", "gmail.users.drafts.send", _drafts_send),
+    (_GMAIL + r"/drafts/(?P<id>[^/]+)", "GET", "gmail.users.drafts.get", _drafts_get),
+    (_GMAIL + r"/drafts/(?P<id>[^/]+)", "DELETE", "gmail.users.drafts.delete", _drafts_delete),
+    (_GMAIL + r"/labels", "GET", "gmail.users.labels.list", _labels_list),
+    (_GMAIL + r"/labels", "POST", "gmail.users.labels.create", _labels_create),
+    (_GMAIL + r"/labels/(?P<id>[^/]+)", "GET", "gmail.users.labels.get", _labels_get),
+    (_GMAIL + r"/labels/(?P<id>[^/]+)", "DELETE", "gmail.users.labels.delete", _labels_delete),
+    (_CALENDAR + r"/users/me/calendarList", "GET", "calendar.calendarList.list", _calendar_list),
+    (_CALENDAR + r"/calendars/(?P<cid>[^/]+)/events", "GET", "calendar.events.list", _events_list),
+    (_CALENDAR + r"/calendars/(?P<cid>[^/]+)/events", "POST", "calendar.events.insert", _events_insert),
+    (_CALENDAR + r"/calendars/(?P<cid>[^/]+)/events/(?P<eid>[^/]+)", "GET", "calendar.events.get", _events_get),
+    (_CALENDAR + r"/calendars/(?P<cid>[^/]+)/events/(?P<eid>[^/]+)", "PUT", "calendar.events.update",
+     _events_update),
+    (_CALENDAR + r"/calendars/(?P<cid>[^/]+)/events/(?P<eid>[^/]+)", "PATCH", "calendar.events.patch",
+     _events_patch),
+    (_CALENDAR + r"/calendars/(?P<cid>[^/]+)/events/(?P<eid>[^/]+)", "DELETE", "calendar.events.delete",
+     _events_delete),
+]]
+
+STATUS_REASONS = {200: "OK", 204: "No Content", 404: "Not Found", 409: "Conflict", 429: "Too Many Requests",
+                  500: "Internal Server Error"}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without this, Nagle's algorithm and
+    # delayed ACKs add ~40 ms to every keep-alive response.
+    disable_nagle_algorithm = True
+    server: FakeGoogleServer
+
+    def _sleep(self, extra_ms: float = 0.0):
+        config = self.server.config
+        delay = config.latency_ms + extra_ms
+        if config.jitter_ms:
+            with self.server.lock:
+                delay += self.server.rng.uniform(-config.jitter_ms, config.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json", headers: dict | None = None):
+        self.send_response(status)
+        if status != 204:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _handle(self, method: str):
+        path = urlsplit(self.path).path
+        body = self._read_body()
+        if path == "/_fake/stats":
+            self._send(200, json.dumps(self.server.stats()).encode())
+            return
+        if path == "/_fake/fixtures":
+            self._send(200, json.dumps(self.server.fixtures()).encode())
+            return
+        if path == "/_fake/deliver":
+            with self.server.lock:
+                message_id = self.server.mailbox.deliver(self.server.rng)
+            self._send(200, json.dumps({"id": message_id}).encode())
+            return
+        if path == "/_fake/fail":
+            count = int(parse_qs(urlsplit(self.path).query).get("count", ["1"])[0])
+            with self.server.lock:
+                self.server.fail_next = count
+            self._send(204, b"")
+            return
+        if path == "/_fake/reset":
+            self.server.reset_stats()
+            self._send(204, b"")
+            return
+
+        with self.server.lock:
+            self.server.counts["_http"] += 1
+        if method == "POST" and path.startswith("/batch"):
+            self._handle_batch(body)
+            return
+
+        self._sleep()
+        status, result, headers = self.server.dispatch(method, self.path, body)
+        self._send(status, json.dumps(result).encode() if result is not None else b"", headers=headers)
+
+    def _handle_batch(self, body: bytes):
+        content_type = self.headers["Content-Type"]
+        message = email.message_from_bytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+        parts = message.get_payload()
+        with self.server.lock:
+            self.server.counts["_batch"] += 1
+        self._sleep(self.server.config.batch_item_latency_ms * len(parts))
+
+        boundary = "batch_fake_google"
+        out = []
+        for part in parts:
+            content_id = (part["Content-ID"] or "").strip("<>")
+            raw = part.get_payload()
+            if isinstance(raw, list):
+                raw = raw[0].as_string()
+            head, _, sub_body = raw.replace("\r\n", "\n").partition("\n\n")
+            request_line = head.split("\n", 1)[0].split()
+            status, result, headers = self.server.dispatch(request_line[0], request_line[1], sub_body.strip().encode())
+            extra = "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+            content = json.dumps(result) if result is not None else ""
+            out.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+                f"HTTP/1.1 {status} {STATUS_REASONS.get(status, 'Error')}\r\n"
+                f"Content-Type: application/json; charset=UTF-8\r\n{extra}Content-Length: {len(content)}\r\n\r\n"
+                f"{content}\r\n"
+            )
+        out.append(f"--{boundary}--\r\n")
+        self._send(200, "".join(out).encode(), f"multipart/mixed; boundary={boundary}")
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_PATCH(self):
+        self._handle("PATCH")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def add_config_arguments(parser: argparse.ArgumentParser):
+    """Command line options of the fake backend, shared with the benchmark runners."""
+    defaults = FakeGoogleConfig()
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms,
+                        help="Latency added to every HTTP request")
+    parser.add_argument("--jitter-ms", type=float, default=defaults.jitter_ms,
+                        help="Random +/- variation of the latency")
+    parser.add_argument("--batch-item-latency-ms", type=float, default=defaults.batch_item_latency_ms,
+                        help="Extra latency per sub-request of a batch")
+    parser.add_argument("--mailbox-size", type=int, default=defaults.mailbox_size)
+    parser.add_argument("--mime-shapes", type=str, default=",".join(defaults.mime_shapes),
+                        help=f"Comma-separated message shapes, cycled through the mailbox: {', '.join(MIME_SHAPES)}")
+    parser.add_argument("--body-bytes", type=int, default=defaults.body_bytes)
+    parser.add_argument("--attachment-bytes", type=int, default=defaults.attachment_bytes)
+    parser.add_argument("--drafts", type=int, default=defaults.drafts, help="Drafts in the mailbox")
+    parser.add_argument("--events", type=int, default=defaults.events, help="Events in the primary calendar")
+    parser.add_argument("--rate-limit-ratio", type=float, default=defaults.rate_limit_ratio,
+                        help="Fraction of API calls answered with 429 rateLimitExceeded")
+    parser.add_argument("--retry-after", type=float, default=None,
+                        help="Retry-After seconds sent with injected 429 responses")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+
+
+def config_from_args(args: argparse.Namespace) -> FakeGoogleConfig:
+    shapes = tuple(s.strip() for s in args.mime_shapes.split(",") if s.strip())
+    unknown = set(shapes) - set(MIME_SHAPES)
+    if unknown or not shapes:
+        raise SystemExit(f"Unknown MIME shapes: {', '.join(sorted(unknown)) or '(none given)'}")
+    return FakeGoogleConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        batch_item_latency_ms=args.batch_item_latency_ms,
+        mailbox_size=args.mailbox_size,
+        mime_shapes=shapes,
+        body_bytes=args.body_bytes,
+        attachment_bytes=args.attachment_bytes,
+        drafts=args.drafts,
+        events=args.events,
+        rate_limit_ratio=args.rate_limit_ratio,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+
+
+def start(config: FakeGoogleConfig, port: int = 0) -> FakeGoogleServer:
+    """Start the fake backend in a background thread."""
+    server = FakeGoogleServer(("127.0.0.1", port), config)
+    threading.Thread(target=server.serve_forever, name="fake-google", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8089, help="Port to listen on (0 picks a free port)")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = FakeGoogleServer(("127.0.0.1", args.port), config_from_args(args))
+    # Printed as the first line so that runners can read the chosen port.
+    print(f"Fake Google APIs listening on {server.url}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
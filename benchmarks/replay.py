@@ -0,0 +1,464 @@
+"""Record MCP sessions and replay them against the stdio server with the fake backend.
+
+record: a transparent stdio proxy. Configure it as the server command of an
+MCP client; it starts the real server, forwards all traffic unchanged and
+writes a redacted copy of the session to a JSON lines file. Tool arguments
+keep their shape but not their content: free text becomes a placeholder of
+the same length, e-mail addresses and Gmail/Calendar IDs are replaced by
+stable pseudonyms, and responses are reduced to their size and error flag.
+
+    uv run python benchmarks/replay.py record --out session.jsonl -- uv run mcp-gsuite-enhanced
+
+replay: starts benchmarks/fake_google.py and the server over stdio, maps the
+pseudonymous IDs onto the fake mailbox and sends the recorded calls, either
+at their recorded pace (scaled by --speed) or as fast as possible
+(--speed 0), with at most --concurrency calls in flight. Each call is first
+replayed alone to get its isolated latency, so that the concurrent pass can
+report how much each call was delayed by others (head-of-line blocking).
+
+    uv run python benchmarks/replay.py replay benchmarks/sessions/sample_session.jsonl --concurrency 8 --speed 0
+
+Arguments not listed in --help are passed on to the server.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import fake_google
+from bench_tools import ACCOUNT, get_json, percentile, start_backend, write_account
+
+EMAIL_PATTERN = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+
+# Tool arguments holding IDs, by the kind of object they refer to
+ID_KINDS = {
+    "email_id": "message",
+    "message_id": "message",
+    "original_message_id": "message",
+    "email_ids": "message",
+    "draft_id": "draft",
+    "event_id": "event",
+    "label_id": "label",
+    "attachment_id": "attachment",
+    "part_id": "part",
+    "thread_id": "thread",
+}
+# Arguments kept verbatim: they carry no personal data and shape the workload
+KEEP_KEYS = {"max_results", "format", "visibility", "send", "send_notifications", "show_deleted",
+             "create_meet_link", "mime_type", "timezone", "time_min", "time_max", "start_time", "end_time",
+             "__calendar_id__", "body_mode", "max_body_chars", "offset"}
+
+
+# Recording
+
+def _pseudonym(kind: str, value: str) -> str:
+    return f"{kind}-{hashlib.sha256(value.encode()).hexdigest()[:12]}"
+
+
+def _redact_value(key: str, value):
+    if isinstance(value, list):
+        return [_redact_value(key, item) for item in value]
+    if isinstance(value, dict):
+        return {k: _redact_value(k, v) for k, v in value.items()}
+    if not isinstance(value, str) or key in KEEP_KEYS:
+        return value
+    if key in ID_KINDS:
+        return _pseudonym(ID_KINDS[key], value)
+    if key == "__user_id__":
+        return "account"
+    if key in ("save_path", "save_to_disk"):
+        return "<path>"
+    if EMAIL_PATTERN.fullmatch(value.strip()):
+        return _pseudonym("email", value) + "@example.com"
+    return f"<text:{len(value)}>"
+
+
+def redact_message(message: dict) -> dict:
+    """Redacted copy of a JSON-RPC message."""
+    if "method" in message:
+        redacted = {"jsonrpc": "2.0", "method": message["method"]}
+        if "id" in message:
+            redacted["id"] = message["id"]
+        params = message.get("params") or {}
+        if message["method"] == "tools/call":
+            redacted["params"] = {"name": params.get("name"),
+                                  "arguments": _redact_value("arguments", params.get("arguments") or {})}
+        elif message["method"] == "initialize":
+            redacted["params"] = {"protocolVersion": params.get("protocolVersion")}
+        return redacted
+    # Responses: only what is needed to compare against the replay
+    return {"jsonrpc": "2.0", "id": message.get("id"), "error": "error" in message
+            or bool((message.get("result") or {}).get("isError")),
+            "bytes": len(json.dumps(message))}
+
+
+def _pump(source, sink, direction: str, log, log_lock: threading.Lock, started: float):
+    for line in iter(source.readline, b""):
+        sink.write(line)
+        sink.flush()
+        try:
+            message = json.loads(line)
+        except ValueError:
+            continue
+        entry = {"t": round(time.monotonic() - started, 6), "direction": direction,
+                 "message": redact_message(message)}
+        with log_lock:
+            log.write(json.dumps(entry) + "\n")
+            log.flush()
+    try:
+        sink.close()
+    except OSError:
+        pass
+
+
+def record(args: argparse.Namespace, command: list[str]) -> int:
+    if not command:
+        raise SystemExit("record needs the server command after --")
+    server = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    started = time.monotonic()
+    log_lock = threading.Lock()
+    with open(args.out, "w") as log:
+        to_server = threading.Thread(target=_pump, daemon=True,
+                                     args=(sys.stdin.buffer, server.stdin, "client", log, log_lock, started))
+        to_client = threading.Thread(target=_pump,
+                                     args=(server.stdout, sys.stdout.buffer, "server", log, log_lock, started))
+        to_server.start()
+        to_client.start()
+        code = server.wait()
+        to_client.join()
+    return code
+
+
+# Replay
+
+class IdMapper():
+    """Maps pseudonymous IDs of a recording onto objects of the fake mailbox, consistently."""
+
+    def __init__(self, fixtures: dict, tmp_dir: str):
+        self.tmp_dir = tmp_dir
+        attachments = [a for a in fixtures["attachments"] if "." not in a["part_id"]]
+        self.pools = {
+            "message": fixtures["messages"],
+            "draft": fixtures["drafts"],
+            "event": fixtures["events"],
+            "label": fixtures["labels"],
+            "thread": fixtures["threads"],
+            "attachment": attachments,
+        }
+        self.assigned: dict[tuple[str, str], object] = {}
+        self.counters: dict[str, int] = {}
+
+    def _take(self, kind: str, pseudonym: str):
+        key = (kind, pseudonym)
+        if key not in self.assigned:
+            pool = self.pools[kind]
+            index = self.counters.get(kind, 0)
+            self.counters[kind] = index + 1
+            self.assigned[key] = pool[index % len(pool)]
+        return self.assigned[key]
+
+    def map_arguments(self, arguments: dict) -> dict:
+        mapped = {}
+        for key, value in arguments.items():
+            if key == "__user_id__":
+                mapped[key] = ACCOUNT
+            elif key == "attachments" and isinstance(value, list):
+                mapped[key] = [self._map_attachment(item, i) for i, item in enumerate(value)]
+            elif key in ("save_path", "save_to_disk"):
+                mapped[key] = os.path.join(self.tmp_dir, "replay-attachment.bin")
+            elif key == "attachment_id":
+                mapped[key] = self._take("attachment", value)["attachment_id"]
+            elif key in ID_KINDS and ID_KINDS[key] in self.pools:
+                kind = ID_KINDS[key]
+                mapped[key] = [self._take(kind, v) for v in value] if isinstance(value, list) else self._take(kind, value)
+            elif isinstance(value, str) and value.startswith("<text:"):
+                length = int(value[6:-1])
+                mapped[key] = ("lorem ipsum " * (length // 12 + 1))[:length]
+            else:
+                mapped[key] = value
+        if "attachment_id" in mapped and "message_id" in arguments:
+            # Keep the pair consistent: the attachment decides the message
+            attachment = self._take("attachment", arguments["attachment_id"])
+            mapped["message_id"] = attachment["message_id"]
+        return mapped
+
+    def _map_attachment(self, item: dict, index: int) -> dict:
+        attachment = self._take("attachment", f"{item.get('message_id')}/{item.get('part_id')}")
+        return {"message_id": attachment["message_id"], "part_id": attachment["part_id"],
+                "save_path": os.path.join(self.tmp_dir, f"replay-attachment-{index}.bin")}
+
+
+def load_session(path: str) -> list[dict]:
+    """Client requests of a recording (tools/call and tools/list), with their recorded offsets and latencies."""
+    requests = {}
+    order = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            message = entry["message"]
+            if entry["direction"] == "client" and message.get("method") in ("tools/call", "tools/list"):
+                requests[message["id"]] = {"t": entry["t"], "method": message["method"],
+                                           "params": message.get("params") or {}, "recorded_ms": None}
+                order.append(message["id"])
+            elif entry["direction"] == "server" and message.get("id") in requests:
+                request = requests[message["id"]]
+                request["recorded_ms"] = round((entry["t"] - request["t"]) * 1000, 3)
+    calls = [requests[request_id] for request_id in order]
+    if calls:
+        first = calls[0]["t"]
+        for call in calls:
+            call["t"] -= first
+    return calls
+
+
+class StdioClient():
+    """Minimal MCP client over the server's stdin/stdout that allows many requests in flight."""
+
+    def __init__(self, command: list[str], stderr):
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr)
+        self.lock = threading.Lock()
+        self.next_id = 0
+        self.pending: dict[int, dict] = {}
+        self.completion_order: list[int] = []
+        self.reader = threading.Thread(target=self._read, daemon=True)
+        self.reader.start()
+
+    def _read(self):
+        for line in iter(self.process.stdout.readline, b""):
+            received = time.perf_counter()
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            if "id" not in message:
+                continue
+            with self.lock:
+                call = self.pending.pop(message["id"], None)
+                self.completion_order.append(message["id"])
+            if call is not None:
+                call["received"] = received
+                call["error"] = "error" in message or bool((message.get("result") or {}).get("isError"))
+                call["bytes"] = len(line)
+                call["done"].set()
+
+    def send(self, method: str, params: dict | None = None, notification: bool = False) -> dict | None:
+        message = {"jsonrpc": "2.0", "method": method}
+        if params is not None:
+            message["params"] = params
+        call = None
+        with self.lock:
+            if not notification:
+                self.next_id += 1
+                message["id"] = self.next_id
+                call = {"id": self.next_id, "done": threading.Event(), "sent": time.perf_counter()}
+                self.pending[self.next_id] = call
+            self.process.stdin.write((json.dumps(message) + "\n").encode())
+            self.process.stdin.flush()
+        return call
+
+    def request(self, method: str, params: dict | None = None, timeout: float = 120) -> dict:
+        call = self.send(method, params)
+        if not call["done"].wait(timeout):
+            raise TimeoutError(f"No response to {method} within {timeout}s")
+        return call
+
+    def initialize(self):
+        self.request("initialize", {"protocolVersion": "2025-03-26", "capabilities": {},
+                                    "clientInfo": {"name": "mcp-gsuite-replay", "version": "1.0"}})
+        self.send("notifications/initialized", notification=True)
+
+    def close(self):
+        self.process.stdin.close()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+def run_pass(client: StdioClient, calls: list[dict], mapper: IdMapper, concurrency: int, speed: float) -> list[dict]:
+    """Send the calls on the recorded schedule (or back to back), at most `concurrency` in flight."""
+    slots = threading.Semaphore(max(1, concurrency))
+    results = []
+    started = time.perf_counter()
+    for index, call in enumerate(calls):
+        if speed > 0:
+            delay = started + call["t"] / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        slots.acquire()
+        params = dict(call["params"])
+        if call["method"] == "tools/call":
+            params["arguments"] = mapper.map_arguments(params.get("arguments") or {})
+        sent = client.send(call["method"], params)
+        sent["index"] = index
+        sent["tool"] = params.get("name", call["method"])
+        threading.Thread(target=lambda s=sent: (s["done"].wait(), slots.release()), daemon=True).start()
+        results.append(sent)
+    for sent in results:
+        sent["done"].wait()
+    wall = time.perf_counter() - started
+    for sent in results:
+        sent["latency_ms"] = (sent["received"] - sent["sent"]) * 1000
+        sent["wall_s"] = wall
+    return results
+
+
+def _summary(latencies: list[float]) -> dict:
+    return {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "max_ms": round(max(latencies), 2),
+    }
+
+
+def report(baseline: list[dict], concurrent: list[dict], completion_order: list[int], stats: dict) -> dict:
+    wall = concurrent[0]["wall_s"] if concurrent else 0.0
+    by_tool: dict[str, list[dict]] = {}
+    for call in concurrent:
+        by_tool.setdefault(call["tool"], []).append(call)
+
+    # Delay added by sharing the server with other calls, per call
+    added = [max(0.0, c["latency_ms"] - b["latency_ms"]) for b, c in zip(baseline, concurrent)]
+
+    # A call completed out of order when it finished before a call sent earlier
+    positions = {call_id: i for i, call_id in enumerate(completion_order)}
+    reordered = 0
+    latest_earlier = -1
+    for call in concurrent:
+        position = positions.get(call["id"], -1)
+        if position < latest_earlier:
+            reordered += 1
+        latest_earlier = max(latest_earlier, position)
+
+    return {
+        "calls": len(concurrent),
+        "wall_s": round(wall, 3),
+        "throughput_per_s": round(len(concurrent) / wall, 2) if wall else None,
+        "errors": sum(1 for c in concurrent if c["error"]),
+        "latency": _summary([c["latency_ms"] for c in concurrent]),
+        "isolated_latency": _summary([b["latency_ms"] for b in baseline]),
+        "head_of_line": {
+            "added_delay_p50_ms": round(percentile(added, 50), 2),
+            "added_delay_p95_ms": round(percentile(added, 95), 2),
+            "added_delay_mean_ms": round(statistics.mean(added), 2),
+            "calls_delayed_over_2x": sum(1 for b, c in zip(baseline, concurrent)
+                                         if c["latency_ms"] > 2 * b["latency_ms"] + 5),
+            "completed_out_of_order": reordered,
+        },
+        "per_tool": {tool: _summary([c["latency_ms"] for c in calls]) for tool, calls in sorted(by_tool.items())},
+        "backend": {"api_calls": stats["api_calls"], "http_requests": stats["http_requests"],
+                    "rate_limited": stats["rate_limited"]},
+    }
+
+
+def _print_report(result: dict):
+    latency = result["latency"]
+    isolated = result["isolated_latency"]
+    hol = result["head_of_line"]
+    print(f"calls {result['calls']}  wall {result['wall_s']}s  throughput {result['throughput_per_s']}/s  "
+          f"errors {result['errors']}")
+    print(f"latency     p50 {latency['p50_ms']:>9.2f}  p95 {latency['p95_ms']:>9.2f}  "
+          f"p99 {latency['p99_ms']:>9.2f}  max {latency['max_ms']:>9.2f} ms")
+    print(f"isolated    p50 {isolated['p50_ms']:>9.2f}  p95 {isolated['p95_ms']:>9.2f}  "
+          f"p99 {isolated['p99_ms']:>9.2f}  max {isolated['max_ms']:>9.2f} ms")
+    print(f"head-of-line: added delay p50 {hol['added_delay_p50_ms']} ms, p95 {hol['added_delay_p95_ms']} ms; "
+          f"{hol['calls_delayed_over_2x']} calls over 2x their isolated latency; "
+          f"{hol['completed_out_of_order']} completed before an earlier call")
+    print(f"backend: {result['backend']['api_calls']} API calls, {result['backend']['http_requests']} HTTP requests, "
+          f"{result['backend']['rate_limited']} injected 429s\n")
+    print(f"{'tool':<30} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for tool, s in result["per_tool"].items():
+        print(f"{tool:<30} {s['count']:>6} {s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['p99_ms']:>9.2f} {s['max_ms']:>9.2f}")
+
+
+def replay(args: argparse.Namespace, server_args: list[str]) -> int:
+    session = load_session(args.session)
+    if not session:
+        raise SystemExit(f"No tools/call requests in {args.session}")
+    # Repetitions follow each other with a one second gap
+    length = session[-1]["t"] + 1.0
+    calls = [dict(call, t=call["t"] + length * i) for i in range(args.repeat) for call in session]
+
+    if "--gmail-quota-units-per-second" not in server_args:
+        server_args += ["--gmail-quota-units-per-second", "1e9"]
+    if "--calendar-requests-per-second" not in server_args:
+        server_args += ["--calendar-requests-per-second", "1e9"]
+
+    backend, backend_url = start_backend(args)
+    try:
+        with tempfile.TemporaryDirectory(prefix="mcp-gsuite-replay-") as tmp_dir:
+            accounts_file, credentials_dir = write_account(tmp_dir)
+            command = [sys.executable, "-c", "import mcp_gsuite; mcp_gsuite.main()",
+                       "--accounts-file", accounts_file, "--credentials-dir", credentials_dir,
+                       "--google-api-root-url", backend_url,
+                       "--adaptive-state-file", os.path.join(tmp_dir, "adaptive.json")] + server_args
+            with open(args.server_log or os.devnull, "w") as server_log:
+                client = StdioClient(command, stderr=server_log)
+                try:
+                    client.initialize()
+                    client.request("tools/list", {})
+                    mapper = IdMapper(get_json(backend_url + "_fake/fixtures"), tmp_dir)
+
+                    baseline = run_pass(client, calls, mapper, concurrency=1, speed=0)
+                    get_json(backend_url + "_fake/reset", method="POST")
+                    with client.lock:
+                        client.completion_order.clear()
+                    concurrent = run_pass(client, calls, mapper, args.concurrency, args.speed)
+                    stats = get_json(backend_url + "_fake/stats")
+                    result = report(baseline, concurrent, list(client.completion_order), stats)
+                finally:
+                    client.close()
+    finally:
+        backend.terminate()
+        backend.wait()
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        _print_report(result)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="Proxy a live session and write a redacted recording")
+    record_parser.add_argument("--out", required=True, help="Recording file (JSON lines)")
+
+    replay_parser = subparsers.add_parser("replay", help="Replay a recording against the server and fake backend")
+    replay_parser.add_argument("session", help="Recording file (JSON lines)")
+    replay_parser.add_argument("--concurrency", type=int, default=4, help="Maximum calls in flight")
+    replay_parser.add_argument("--speed", type=float, default=1.0,
+                               help="Replay speed relative to the recording; 0 sends calls back to back")
+    replay_parser.add_argument("--repeat", type=int, default=1, help="Replay the session this many times")
+    replay_parser.add_argument("--server-log", type=str, default=None, help="File for the server's stderr")
+    replay_parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    fake_google.add_config_arguments(replay_parser)
+
+    if "--" in sys.argv:
+        split = sys.argv.index("--")
+        argv, command = sys.argv[1:split], sys.argv[split + 1:]
+    else:
+        argv, command = sys.argv[1:], []
+    args, extra = parser.parse_known_args(argv)
+
+    if args.command == "record":
+        return record(args, command + extra)
+    return replay(args, extra)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,10 +6,11 @@ import json
 import os
 import sys
 
-def create_cursor_mcp_config():
-    """Creates Cursor-specific configuration"""
+def create_cursor_mcp_config(shared=False):
+    """Creates Cursor-specific configuration; shared=True relays to one background daemon for all clients"""
     
     current_dir = os.path.abspath(os.path.dirname(__file__))
+    server_args = ["--use-daemon"] if shared else []
     
     config = {
         "mcpServers": {
@@ -19,7 +20,8 @@ def create_cursor_mcp_config():
                     "--directory", 
                     current_dir,
                             "run",
-        "mcp-gsuite-enhanced"
+        "mcp-gsuite-enhanced",
+                    *server_args
                 ],
                 "env": {
                     "PYTHONPATH": current_dir,
@@ -79,7 +81,7 @@ def main():
     auth_ok = check_authentication()
     
     # Create configuration
-    config = create_cursor_mcp_config()
+    config = create_cursor_mcp_config(shared="--shared" in sys.argv)
     
     if not auth_ok:
         print("\n⚠️  IMPORTANT: You must authenticate at least one account before using MCP in Cursor")
@@ -93,6 +95,7 @@ def main():
     print("  3. Re-enable MCP with the new configuration")
     print("- Port 4100 must be available")
     print("- Verify that no other MCP processes are running")
+    print("- Run with --shared to let all MCP clients share one background server (warm caches, instant start)")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
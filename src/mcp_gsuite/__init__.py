@@ -1,9 +1,16 @@
-from . import server
 import asyncio
+import sys
+
+from . import shim
 
 def main():
     """Main entry point for the package."""
-    asyncio.run(server.main())
+    if shim.get_use_daemon():
+        # Thin stdio relay to the shared background server; the server itself is never imported
+        asyncio.run(shim.run_shim(sys.argv[1:]))
+    else:
+        from . import server
+        asyncio.run(server.main())
 
 # Optionally expose other important items at package level
-__all__ = ['main', 'server']
\ No newline at end of file
+__all__ = ['main', 'server']
@@ -0,0 +1,203 @@
+import argparse
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from . import gauth
+
+# Batch paths whose size and parallelism are tuned per account
+PATH_MESSAGE_GET = "messages.get"
+PATH_BATCH_MODIFY = "messages.batchModify"
+PATH_MESSAGE_MODIFY = "messages.modify"
+PATH_ATTACHMENT_GET = "messages.attachments.get"
+PATH_MESSAGE_SEND = "messages.send"
+PATH_DRAFT_CREATE = "drafts.create"
+
+# Starting point and bounds of each path. Gmail advises against batches of
+# more than 50 requests; batchModify accepts up to 1000 message IDs per call.
+# Per-message modify requests are writes, tuned apart from the reads of messages.get.
+# Sending starts small: each send costs 100 quota units and is not retried
+# unless it was rate limited.
+PATH_DEFAULTS = {
+    PATH_MESSAGE_GET: {"batch_size": 20, "max_batch_size": 50, "concurrency": 2, "max_concurrency": 4, "target_latency": 5.0},
+    PATH_BATCH_MODIFY: {"batch_size": 100, "max_batch_size": 1000, "concurrency": 1, "max_concurrency": 4, "target_latency": 5.0},
+    PATH_MESSAGE_MODIFY: {"batch_size": 20, "max_batch_size": 50, "concurrency": 1, "max_concurrency": 2, "target_latency": 5.0},
+    PATH_ATTACHMENT_GET: {"batch_size": 5, "max_batch_size": 20, "concurrency": 2, "max_concurrency": 4, "target_latency": 15.0},
+    PATH_MESSAGE_SEND: {"batch_size": 5, "max_batch_size": 25, "concurrency": 1, "max_concurrency": 2, "target_latency": 10.0},
+    PATH_DRAFT_CREATE: {"batch_size": 10, "max_batch_size": 50, "concurrency": 1, "max_concurrency": 2, "target_latency": 10.0},
+}
+
+# Clean rounds needed before one more parallel request is allowed
+CONCURRENCY_INCREASE_AFTER = 4
+SAVE_INTERVAL_SECONDS = 5.0
+
+
+def get_adaptive_state_file() -> str:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--adaptive-state-file",
+        type=str,
+        default=None,
+        help="File where learned batch sizes and concurrency are kept between runs",
+    )
+    args, _ = parser.parse_known_args()
+    return args.adaptive_state_file or os.path.join(gauth.get_credentials_dir(), ".adaptive_batching.json")
+
+
+class AimdController():
+    """
+    Additive-increase/multiplicative-decrease control of batch size and parallelism.
+
+    Throttling (429 / rateLimitExceeded) halves both the batch size and the
+    number of parallel requests. A round slower than the target latency
+    halves the batch size only. Every clean round grows the batch size by a
+    fixed step, and parallelism by one after a few clean rounds in a row.
+    """
+
+    def __init__(self, batch_size: int, max_batch_size: int, concurrency: int, max_concurrency: int,
+                 target_latency: float, min_batch_size: int = 1):
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.step = max(1, max_batch_size // 20)
+        self.batch_size = min(max(batch_size, min_batch_size), max_batch_size)
+        self.concurrency = min(max(concurrency, 1), max_concurrency)
+        self.clean_rounds = 0
+        self.throttle_events = 0
+        self._lock = threading.Lock()
+
+    def settings(self) -> tuple[int, int]:
+        with self._lock:
+            return self.batch_size, self.concurrency
+
+    def record(self, throttled: bool, latency: float) -> bool:
+        """
+        Feed back the outcome of one request or batch.
+
+        Returns:
+            bool: Whether the settings changed
+        """
+        with self._lock:
+            before = (self.batch_size, self.concurrency)
+            if throttled:
+                self.throttle_events += 1
+                self.clean_rounds = 0
+                self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+                self.concurrency = max(1, self.concurrency // 2)
+            elif latency > self.target_latency:
+                self.clean_rounds = 0
+                self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+            else:
+                self.clean_rounds += 1
+                self.batch_size = min(self.max_batch_size, self.batch_size + self.step)
+                if self.clean_rounds >= CONCURRENCY_INCREASE_AFTER:
+                    self.clean_rounds = 0
+                    self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+            return before != (self.batch_size, self.concurrency)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {"batch_size": self.batch_size, "concurrency": self.concurrency}
+
+
+_controllers: dict[tuple[str, str], AimdController] = {}
+_controllers_lock = threading.Lock()
+_saved_state: dict | None = None
+_last_save = 0.0
+_dirty = False
+# Guards _dirty, _last_save and writing the state file; record() runs in many handler threads at once
+_save_lock = threading.Lock()
+
+
+def _load_state() -> dict:
+    global _saved_state
+    if _saved_state is None:
+        path = get_adaptive_state_file()
+        try:
+            with open(path) as f:
+                _saved_state = json.load(f)
+        except FileNotFoundError:
+            _saved_state = {}
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable adaptive batching state {path}: {e}")
+            _saved_state = {}
+    return _saved_state
+
+
+def get_controller(user_id: str, path: str) -> AimdController:
+    """Return the controller of an account's batch path, restoring learned settings on first use."""
+    key = (user_id, path)
+    controller = _controllers.get(key)
+    if controller is None:
+        with _controllers_lock:
+            controller = _controllers.get(key)
+            if controller is None:
+                settings = dict(PATH_DEFAULTS[path])
+                settings.update(_load_state().get(user_id, {}).get(path, {}))
+                controller = AimdController(**settings)
+                _controllers[key] = controller
+    return controller
+
+
+def record(controller: AimdController, throttled: bool, latency: float):
+    """Feed back an outcome and persist the learned settings from time to time."""
+    global _dirty
+    changed = controller.record(throttled=throttled, latency=latency)
+    with _save_lock:
+        if changed:
+            _dirty = True
+        if _dirty and time.monotonic() - _last_save > SAVE_INTERVAL_SECONDS:
+            _save()
+
+
+def snapshot() -> dict:
+    """Current settings of every controller, keyed by account and path."""
+    state = {}
+    with _controllers_lock:
+        for (user_id, path), controller in _controllers.items():
+            state.setdefault(user_id, {})[path] = controller.to_dict()
+    return state
+
+
+def save():
+    """
+    Write the learned settings to the state file, keeping accounts not used by this process.
+
+    The file is read again first, so that processes sharing it (e.g. --workers) keep each other's accounts.
+    """
+    with _save_lock:
+        _save()
+
+
+def _save():
+    global _dirty, _last_save
+    path = get_adaptive_state_file()
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except Exception:
+        state = _load_state()
+    state = {user_id: dict(paths) for user_id, paths in state.items()}
+    for user_id, paths in snapshot().items():
+        state.setdefault(user_id, {}).update(paths)
+
+    try:
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # A file of its own for every write, so that concurrent writers never share a half-written one
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(state, f, indent=2)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        _dirty = False
+    except Exception as e:
+        logging.warning(f"Could not save adaptive batching state to {path}: {e}")
+    _last_save = time.monotonic()
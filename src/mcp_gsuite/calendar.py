@@ -1,17 +1,32 @@
-from googleapiclient.discovery import build
 from . import gauth
+from . import discovery
+from . import transport
+from . import executor
+from . import tracing
+from . import singleflight
+from . import toolcache
 import logging
 import traceback
 from datetime import datetime
 import pytz
 
+@tracing.traced_methods("calendar")
 class CalendarService():
     def __init__(self, user_id: str):
-        credentials = gauth.get_stored_credentials(user_id=user_id)
+        with tracing.span("gauth.get_stored_credentials"):
+            credentials = gauth.get_stored_credentials(user_id=user_id)
         if not credentials:
             raise RuntimeError("No Oauth2 credentials stored")
-        self.service = build('calendar', 'v3', credentials=credentials)  # Note: using v3 for Calendar API
+        self.user_id = user_id
+        self.executor = executor.RequestExecutor(user_id=user_id)
+        with tracing.span("discovery.build_service", api="calendar"):
+            self.service = discovery.build_service(
+                *discovery.CALENDAR_API,
+                http=transport.authorized_http(credentials, user_id=user_id),
+                request_builder=self.executor.request_builder
+            )
     
+    @singleflight.coalesced("calendar.list_calendars")
     def list_calendars(self) -> list:
         """
         Lists all calendars accessible by the user.
@@ -40,8 +55,10 @@ class CalendarService():
         except Exception as e:
             logging.error(f"Error retrieving calendars: {str(e)}")
             logging.error(traceback.format_exc())
+            toolcache.record_failed_read()
             return []
 
+    @singleflight.coalesced("calendar.get_events")
     def get_events(self, time_min=None, time_max=None, max_results=250, show_deleted=False, calendar_id: str ='primary'):
         """
         Retrieve calendar events within a specified time range.
@@ -108,6 +125,7 @@ class CalendarService():
         except Exception as e:
             logging.error(f"Error retrieving calendar events: {str(e)}")
             logging.error(traceback.format_exc())
+            toolcache.record_failed_read()
             return []
         
     def create_event(self, summary: str, start_time: str, end_time: str, 
@@ -0,0 +1,94 @@
+import contextlib
+import logging
+import os
+
+import anyio
+import anyio.lowlevel
+import mcp.types as types
+from anyio.streams.buffered import BufferedByteReceiveStream
+from mcp.shared.message import SessionMessage
+
+from . import shim
+
+# Longest JSON-RPC message accepted from a client, e.g. a tool call carrying an attachment
+MAX_MESSAGE_BYTES = 64 * 1024 * 1024
+
+
+@contextlib.asynccontextmanager
+async def session_streams(stream: anyio.abc.ByteStream):
+    """
+    MCP read and write streams of one socket connection.
+
+    Messages are newline delimited JSON-RPC, as on stdio, so the shim can
+    relay the client's stdio bytes unchanged.
+    """
+    read_stream_writer, read_stream = anyio.create_memory_object_stream(0)
+    write_stream, write_stream_reader = anyio.create_memory_object_stream(0)
+    buffered = BufferedByteReceiveStream(stream)
+
+    async def socket_reader():
+        try:
+            async with read_stream_writer:
+                while True:
+                    try:
+                        line = await buffered.receive_until(b"\n", MAX_MESSAGE_BYTES)
+                    except (anyio.IncompleteRead, anyio.EndOfStream, anyio.BrokenResourceError):
+                        return
+                    if not line.strip():
+                        continue
+                    try:
+                        message = types.JSONRPCMessage.model_validate_json(line)
+                    except Exception as exc:
+                        await read_stream_writer.send(exc)
+                        continue
+                    await read_stream_writer.send(SessionMessage(message))
+        except anyio.ClosedResourceError:
+            await anyio.lowlevel.checkpoint()
+
+    async def socket_writer():
+        try:
+            async with write_stream_reader:
+                async for session_message in write_stream_reader:
+                    json = session_message.message.model_dump_json(by_alias=True, exclude_none=True)
+                    await stream.send(json.encode() + b"\n")
+        except (anyio.ClosedResourceError, anyio.BrokenResourceError):
+            await anyio.lowlevel.checkpoint()
+
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(socket_reader)
+        tg.start_soon(socket_writer)
+        yield read_stream, write_stream
+
+
+async def serve_unix(server, init_options):
+    """
+    Serve every connection to the daemon socket as its own MCP session of one shared server.
+
+    Raises RuntimeError if another daemon already listens on the socket.
+    """
+    path = shim.get_daemon_socket()
+    if os.path.exists(path):
+        stream = await shim.connect(path)
+        if stream is not None:
+            await stream.aclose()
+            raise RuntimeError(f"A daemon is already listening on {path}")
+        # Left behind by a daemon that did not shut down cleanly
+        os.unlink(path)
+
+    async def handle_connection(stream):
+        async with stream:
+            try:
+                async with session_streams(stream) as (read_stream, write_stream):
+                    await server.run(read_stream, write_stream, init_options)
+            except Exception as e:
+                logging.warning(f"Daemon session ended with an error: {str(e)}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # Only this user may talk to the daemon, since it acts with the user's Google credentials
+    listener = await anyio.create_unix_listener(path, mode=0o600)
+    logging.info(f"Serving MCP sessions on unix socket {path}")
+    try:
+        await listener.serve(handle_connection)
+    finally:
+        with contextlib.suppress(OSError):
+            os.unlink(path)
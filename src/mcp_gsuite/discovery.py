@@ -0,0 +1,153 @@
+from googleapiclient.discovery import build_from_document
+from googleapiclient.http import HttpRequest
+from googleapiclient import discovery_cache
+import argparse
+import ipaddress
+import json
+import logging
+import threading
+from urllib.parse import urlsplit
+
+from . import metrics
+
+# API versions used by this server. The discovery documents for these exact
+# versions ship with google-api-python-client, which is pinned in uv.lock, so
+# no network round trip to the discovery service is ever needed.
+GMAIL_API = ('gmail', 'v1')
+CALENDAR_API = ('calendar', 'v3')
+
+# Hosts of Google's own API endpoints, e.g. a regional or private endpoint
+GOOGLE_API_HOST_SUFFIXES = (".googleapis.com", ".google.com")
+
+
+def get_api_root_url() -> str | None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--google-api-root-url",
+        type=str,
+        default=None,
+        help="Send Google API calls to this root URL instead of Google (e.g. a local fake backend for benchmarks); "
+             "must be https or a loopback address, since the accounts' OAuth tokens are sent along",
+    )
+    args, _ = parser.parse_known_args()
+    return args.google_api_root_url
+
+
+_warned_root_urls: set[str] = set()
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def check_api_root_url(root_url: str):
+    """
+    Refuse a root URL that would send OAuth tokens over plain HTTP to another machine.
+
+    https URLs of hosts other than Google's are allowed with a warning, since
+    every API call carries an account's access token.
+
+    Raises:
+        ValueError: If the URL is neither https nor http to a loopback address
+    """
+    parts = urlsplit(root_url)
+    host = (parts.hostname or "").lower()
+    if not host or parts.scheme not in ("https", "http"):
+        raise ValueError(f"--google-api-root-url must be an http(s) URL, not {root_url!r}")
+    if parts.scheme == "http" and not _is_loopback(host):
+        raise ValueError(f"--google-api-root-url {root_url} would send OAuth tokens unencrypted; "
+                         f"use https or a loopback address")
+    if not _is_loopback(host) and not host.endswith(GOOGLE_API_HOST_SUFFIXES) and root_url not in _warned_root_urls:
+        _warned_root_urls.add(root_url)
+        logging.warning(f"--google-api-root-url {root_url} is not a Google host: "
+                        f"the accounts' OAuth access tokens are sent to it")
+
+
+_documents: dict[tuple[str, str], dict] = {}
+_documents_lock = threading.Lock()
+
+
+def _warm_resource(resource, resource_desc: dict):
+    """Instantiate every nested resource once so that googleapiclient applies
+    its in-place fix-ups to the shared document before it is used concurrently."""
+    for name, nested_desc in resource_desc.get('resources', {}).items():
+        _warm_resource(getattr(resource, name)(), nested_desc)
+
+
+def get_discovery_document(service_name: str, version: str) -> dict:
+    """
+    Return the parsed discovery document for an API version.
+
+    The document is read from the static copy bundled with
+    google-api-python-client and parsed only once per process. The same dict
+    is shared by every service object built afterwards, for every account.
+
+    Args:
+        service_name (str): API name, e.g. 'gmail'
+        version (str): API version, e.g. 'v1'
+
+    Returns:
+        dict: Parsed discovery document
+    """
+    key = (service_name, version)
+    document = _documents.get(key)
+    metrics.record_cache("discovery", hit=document is not None)
+    if document is not None:
+        return document
+
+    with _documents_lock:
+        document = _documents.get(key)
+        if document is None:
+            content = discovery_cache.get_static_doc(service_name, version)
+            if content is None:
+                raise RuntimeError(f"No bundled discovery document for {service_name} {version}")
+            document = json.loads(content)
+            root_url = get_api_root_url()
+            if root_url:
+                check_api_root_url(root_url)
+                root_url = root_url.rstrip('/') + '/'
+                document['rootUrl'] = root_url
+                document['baseUrl'] = root_url + document.get('servicePath', '')
+                logging.info(f"Sending {service_name} {version} API calls to {root_url}")
+            _warm_resource(build_from_document(document, http=_NoHttp()), document)
+            _documents[key] = document
+            logging.info(f"Loaded discovery document for {service_name} {version}")
+    return document
+
+
+def build_service(service_name: str, version: str, http=None, credentials=None, request_builder=HttpRequest):
+    """
+    Build a Google API client from the shared, pre-parsed discovery document.
+
+    Equivalent to googleapiclient.discovery.build() without reading or
+    parsing the discovery document on every call.
+
+    Args:
+        service_name (str): API name, e.g. 'gmail'
+        version (str): API version, e.g. 'v1'
+        http (optional): Authorized http object used to send requests
+        credentials (optional): OAuth2 credentials, only used when no http is given
+        request_builder (optional): Factory for the HttpRequest objects of the client
+
+    Returns:
+        googleapiclient.discovery.Resource: The API client
+    """
+    document = get_discovery_document(service_name, version)
+    return build_from_document(
+        document,
+        http=http,
+        credentials=None if http else credentials,
+        requestBuilder=request_builder,
+    )
+
+
+class _NoHttp():
+    """Placeholder transport for the warm-up client, which never sends requests."""
+
+    def request(self, *args, **kwargs):
+        raise RuntimeError("The warm-up client cannot send requests")
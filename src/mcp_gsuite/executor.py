@@ -0,0 +1,407 @@
+import argparse
+import contextlib
+import contextvars
+import email.utils
+import json
+import logging
+import random
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import httplib2
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+
+from . import adaptive, metrics, ratelimit, tracing, transport
+
+# Error classes
+ERROR_RATE_LIMIT = "rate_limit"
+ERROR_SERVER = "server"
+ERROR_NETWORK = "network"
+ERROR_AUTH = "auth"
+ERROR_NOT_FOUND = "not_found"
+ERROR_CLIENT = "client"
+ERROR_OTHER = "other"
+
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded", "concurrentLimitExceeded"}
+
+# Calls that must not be repeated once the server may have processed them.
+# They are only retried when the request was rejected by rate limiting.
+NON_IDEMPOTENT_METHODS = {
+    "gmail.users.messages.send",
+    "gmail.users.messages.insert",
+    "gmail.users.messages.import",
+    "gmail.users.drafts.create",
+    "gmail.users.drafts.send",
+    "gmail.users.labels.create",
+    "calendar.events.insert",
+    "calendar.events.quickAdd",
+    "calendar.events.import",
+}
+
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 32.0
+GMAIL_BATCH_LIMIT = 50
+
+
+class RetryCount():
+    """Retries made for one tool call, by whichever threads run it."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def add(self, count: int):
+        with self._lock:
+            self.count += count
+
+
+_call_retries: contextvars.ContextVar["RetryCount | None"] = contextvars.ContextVar(
+    "mcp_gsuite_call_retries", default=None)
+
+
+@contextlib.contextmanager
+def count_call_retries():
+    """Count the retries of the calls made inside, including in threads started with a copy of the context."""
+    retries = RetryCount()
+    token = _call_retries.set(retries)
+    try:
+        yield retries
+    finally:
+        _call_retries.reset(token)
+
+
+def add_call_retries(count: int):
+    """Add retries made elsewhere, e.g. in a worker process, to the current tool call."""
+    retries = _call_retries.get()
+    if retries is not None and count:
+        retries.add(count)
+
+
+def get_max_retries() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=5,
+        help="Maximum number of retries for transient Google API errors",
+    )
+    args, _ = parser.parse_known_args()
+    return max(0, args.max_retries)
+
+
+def _error_reasons(error: HttpError) -> set[str]:
+    try:
+        content = error.content.decode("utf-8") if isinstance(error.content, bytes) else error.content
+        data = json.loads(content)
+    except (ValueError, TypeError, AttributeError):
+        return set()
+    if isinstance(data, list):
+        data = data[0] if data else {}
+    errors = data.get("error", {}).get("errors", []) if isinstance(data, dict) else []
+    return {e.get("reason") for e in errors if isinstance(e, dict)}
+
+
+def classify_error(error: Exception) -> str:
+    """
+    Classify an exception raised by a Google API call.
+
+    Returns:
+        str: One of the ERROR_* constants
+    """
+    if isinstance(error, HttpError):
+        status = error.resp.status
+        if status == 429:
+            return ERROR_RATE_LIMIT
+        if status == 403 and _error_reasons(error) & RATE_LIMIT_REASONS:
+            return ERROR_RATE_LIMIT
+        if status >= 500:
+            return ERROR_SERVER
+        if status in (401, 403):
+            return ERROR_AUTH
+        if status == 404:
+            return ERROR_NOT_FOUND
+        return ERROR_CLIENT
+    if isinstance(error, (TimeoutError, socket.timeout, ConnectionError, httplib2.ServerNotFoundError)):
+        return ERROR_NETWORK
+    if isinstance(error, OSError):
+        return ERROR_NETWORK
+    return ERROR_OTHER
+
+
+def is_retryable(error_class: str, idempotent: bool) -> bool:
+    """Rate limited requests were never processed and are always safe to repeat."""
+    if error_class == ERROR_RATE_LIMIT:
+        return True
+    return idempotent and error_class in (ERROR_SERVER, ERROR_NETWORK)
+
+
+def is_idempotent(request) -> bool:
+    return getattr(request, "methodId", None) not in NON_IDEMPOTENT_METHODS
+
+
+def get_retry_after(error: Exception) -> float | None:
+    """Seconds requested by the server's Retry-After header, if any."""
+    if not isinstance(error, HttpError):
+        return None
+    value = error.resp.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int, retry_after: float | None = None) -> float:
+    """Exponential backoff with full jitter, never shorter than Retry-After."""
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class ExecutorHttpRequest(HttpRequest):
+    """HttpRequest whose execute() goes through the account's RequestExecutor."""
+
+    executor = None
+
+    def execute(self, http=None, num_retries=0):
+        if self.executor is None:
+            return super().execute(http=http, num_retries=num_retries)
+        return self.executor.execute(self, http=http)
+
+    def execute_once(self, http=None):
+        return super().execute(http=http, num_retries=0)
+
+
+class RequestExecutor():
+    """
+    Central executor for the Google API calls of one account.
+
+    Every call first waits for the account's quota budget (see ratelimit).
+    Transient failures (rate limiting, 5xx, network errors) are retried with
+    exponential backoff and jitter, honouring Retry-After. Non-idempotent
+    calls are only retried when they were rejected by rate limiting.
+    """
+
+    def __init__(self, user_id: str, max_retries: int | None = None):
+        self.user_id = user_id
+        self.max_retries = get_max_retries() if max_retries is None else max_retries
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def request_builder(self, *args, **kwargs) -> ExecutorHttpRequest:
+        """requestBuilder for build_from_document(): binds every request to this executor."""
+        request = ExecutorHttpRequest(*args, **kwargs)
+        request.executor = self
+        return request
+
+    def _record_retries(self, count: int):
+        with self._lock:
+            self.retries += count
+        add_call_retries(count)
+
+    def execute(self, request, http=None, controller: adaptive.AimdController | None = None):
+        """
+        Execute a single request, retrying transient errors.
+
+        Args:
+            request: The request to send
+            http (optional): Http object overriding the one of the request
+            controller (optional): Adaptive controller fed with the outcome of every attempt
+
+        Returns:
+            The deserialized response
+
+        Raises:
+            The last error once it is not retryable or retries are exhausted
+        """
+        idempotent = is_idempotent(request)
+        attempt = 0
+        while True:
+            with tracing.span("ratelimit.acquire"):
+                ratelimit.acquire(self.user_id, [request.methodId])
+            started = time.monotonic()
+            try:
+                with tracing.span(f"google_api {request.methodId}", kind=tracing.SPAN_KIND_CLIENT, attempt=attempt):
+                    if isinstance(request, ExecutorHttpRequest):
+                        response = request.execute_once(http=http)
+                    else:
+                        response = request.execute(http=http)
+                latency = time.monotonic() - started
+                metrics.API_REQUESTS.inc(account=self.user_id, method=request.methodId, outcome="ok")
+                metrics.API_DURATION.observe(latency, method=request.methodId)
+                if controller is not None:
+                    adaptive.record(controller, throttled=False, latency=latency)
+                return response
+            except Exception as e:
+                error_class = classify_error(e)
+                metrics.API_REQUESTS.inc(account=self.user_id, method=request.methodId, outcome=error_class)
+                metrics.API_DURATION.observe(time.monotonic() - started, method=request.methodId)
+                if controller is not None and error_class == ERROR_RATE_LIMIT:
+                    adaptive.record(controller, throttled=True, latency=time.monotonic() - started)
+                if attempt >= self.max_retries or not is_retryable(error_class, idempotent):
+                    raise
+                delay = backoff_delay(attempt, get_retry_after(e))
+                logging.warning(f"Retrying {request.methodId} for {self.user_id} in {delay:.2f}s "
+                                f"(attempt {attempt + 1}/{self.max_retries}, {error_class}): {str(e)}")
+                self._record_retries(1)
+                metrics.API_RETRIES.inc(account=self.user_id, method=request.methodId, error_class=error_class)
+                time.sleep(delay)
+                attempt += 1
+
+    def _run_parallel(self, tasks: list, concurrency: int) -> list:
+        """Run callables, several at a time when the account's transport allows it."""
+        if concurrency <= 1 or len(tasks) <= 1 or not transport.is_thread_safe():
+            return [task() for task in tasks]
+        # Each task runs in a copy of the caller's context so its trace spans keep their parent.
+        contexts = [contextvars.copy_context() for _ in tasks]
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(tasks))) as pool:
+            return list(pool.map(lambda context, task: context.run(task), contexts, tasks))
+
+    def _send_batch(self, service, requests: dict, chunk: list[str]) -> tuple[dict, dict, float]:
+        responses = {}
+        failed = {}
+
+        def callback(request_id, response, exception):
+            if exception is not None:
+                failed[request_id] = exception
+            else:
+                responses[request_id] = response
+
+        batch = service.new_batch_http_request(callback=callback)
+        for key in chunk:
+            batch.add(requests[key], request_id=key)
+        with tracing.span("ratelimit.acquire"):
+            ratelimit.acquire(self.user_id, [requests[key].methodId for key in chunk])
+        started = time.monotonic()
+        try:
+            with tracing.span("google_api batch", kind=tracing.SPAN_KIND_CLIENT, size=len(chunk),
+                              method=requests[chunk[0]].methodId):
+                batch.execute()
+        except Exception as e:
+            for key in chunk:
+                if key not in responses and key not in failed:
+                    failed[key] = e
+        latency = time.monotonic() - started
+        metrics.API_DURATION.observe(latency, method="batch")
+        for key in chunk:
+            outcome = "ok" if key in responses else classify_error(failed[key])
+            metrics.API_REQUESTS.inc(account=self.user_id, method=requests[key].methodId, outcome=outcome)
+        return responses, failed, latency
+
+    def execute_batch(self, service, requests: dict, batch_size: int = GMAIL_BATCH_LIMIT,
+                      controller: adaptive.AimdController | None = None) -> tuple[dict, dict]:
+        """
+        Execute many requests as batch HTTP requests.
+
+        Only the sub-requests that failed with a retryable error are sent
+        again, in a new batch, after backing off. With a controller, the
+        batch size and the number of batches sent in parallel are taken from
+        it before every wave of batches and adjusted by each batch's outcome.
+
+        Args:
+            service: API client whose batch endpoint should be used
+            requests (dict): Requests keyed by a caller-chosen string ID
+            batch_size (int): Maximum number of sub-requests per batch, when no controller is given
+            controller (optional): Adaptive controller of this batch path
+
+        Returns:
+            Tuple[dict, dict]: Responses and final errors, both keyed by request ID
+        """
+        responses = {}
+        errors = {}
+        pending = dict(requests)
+        attempt = 0
+
+        while pending:
+            failed = {}
+            keys = list(pending)
+            while keys:
+                size, concurrency = controller.settings() if controller is not None else (batch_size, 1)
+                wave = []
+                while keys and len(wave) < concurrency:
+                    wave.append(keys[:size])
+                    keys = keys[size:]
+                tasks = [lambda chunk=chunk: self._send_batch(service, pending, chunk) for chunk in wave]
+                for chunk_responses, chunk_failed, latency in self._run_parallel(tasks, concurrency):
+                    responses.update(chunk_responses)
+                    failed.update(chunk_failed)
+                    if controller is not None:
+                        throttled = any(classify_error(e) == ERROR_RATE_LIMIT for e in chunk_failed.values())
+                        adaptive.record(controller, throttled=throttled, latency=latency)
+
+            retry = {}
+            retry_after = None
+            for key, error in failed.items():
+                error_class = classify_error(error)
+                if attempt < self.max_retries and is_retryable(error_class, is_idempotent(pending[key])):
+                    retry[key] = pending[key]
+                    metrics.API_RETRIES.inc(account=self.user_id, method=pending[key].methodId,
+                                            error_class=error_class)
+                    server_delay = get_retry_after(error)
+                    if server_delay is not None:
+                        retry_after = max(retry_after or 0.0, server_delay)
+                else:
+                    errors[key] = error
+
+            if retry:
+                delay = backoff_delay(attempt, retry_after)
+                logging.warning(f"Retrying {len(retry)} of {len(pending)} batched requests for "
+                                f"{self.user_id} in {delay:.2f}s (attempt {attempt + 1}/{self.max_retries})")
+                self._record_retries(len(retry))
+                time.sleep(delay)
+                attempt += 1
+            pending = retry
+
+        return responses, errors
+
+    def execute_chunked(self, items: list, make_request, controller: adaptive.AimdController) -> dict:
+        """
+        Execute one request per chunk of items, e.g. batchModify over message IDs.
+
+        Chunk size and the number of chunks sent in parallel are taken from
+        the controller before every wave. Each chunk is retried like a single
+        request.
+
+        Args:
+            items (list): Items to split into chunks
+            make_request: Callable building the request for a list of items
+            controller: Adaptive controller of this path
+
+        Returns:
+            dict: Final error for every item of a chunk that failed
+        """
+        errors = {}
+        remaining = list(items)
+
+        def send(chunk):
+            try:
+                self.execute(make_request(chunk), controller=controller)
+                return chunk, None
+            except Exception as e:
+                return chunk, e
+
+        while remaining:
+            size, concurrency = controller.settings()
+            wave = []
+            while remaining and len(wave) < concurrency:
+                wave.append(remaining[:size])
+                remaining = remaining[size:]
+            tasks = [lambda chunk=chunk: send(chunk) for chunk in wave]
+            for chunk, error in self._run_parallel(tasks, concurrency):
+                if error is not None:
+                    for item in chunk:
+                        errors[item] = error
+        return errors
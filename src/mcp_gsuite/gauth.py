@@ -4,6 +4,7 @@ from oauth2client.client import (
     FlowExchangeError,
     OAuth2Credentials,
     Credentials,
+    Storage,
 )
 from googleapiclient.discovery import build
 import httplib2
@@ -12,6 +13,16 @@ import os
 import pydantic
 import json
 import argparse
+import tempfile
+import threading
+
+from . import metrics
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: refreshes are only coordinated between the threads of a process
+    fcntl = None
 
 
 def get_gauth_file() -> str:
@@ -111,6 +122,89 @@ def _get_credential_filename(user_id: str) -> str:
     return os.path.join(creds_dir, f".oauth2.{user_id}.json")
 
 
+# One lock per credentials file for the threads of this process; other processes are kept out by flock
+_file_locks: dict[str, threading.Lock] = {}
+_file_locks_lock = threading.Lock()
+
+
+def _file_lock(path: str) -> threading.Lock:
+    with _file_locks_lock:
+        return _file_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+def _write_credentials_file(path: str, data: str):
+    """Replace the credentials file at once, so that readers never see a partly written file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class CredentialStorage(Storage):
+    """
+    oauth2client storage of an account's credentials file, locked across threads and processes.
+
+    oauth2client refreshes an expired token under the storage lock: it first
+    reads the file again and uses a still valid token another thread or
+    process stored meanwhile, and only otherwise asks the token endpoint and
+    stores the result. Server processes sharing a credentials directory
+    therefore refresh each account's token once instead of once each.
+    """
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.path = _get_credential_filename(user_id=user_id)
+        super().__init__(lock=_file_lock(self.path))
+        self._lock_file = None
+
+    def acquire_lock(self):
+        super().acquire_lock()
+        if fcntl is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._lock_file = open(f"{self.path}.lock", "a")
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+        except BaseException:
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+            super().release_lock()
+            raise
+
+    def release_lock(self):
+        if self._lock_file is not None:
+            # Closing the file releases the flock
+            self._lock_file.close()
+            self._lock_file = None
+        super().release_lock()
+
+    def locked_get(self) -> OAuth2Credentials | None:
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'r') as f:
+            credentials = Credentials.new_from_json(f.read())
+        credentials.set_store(self)
+        return credentials
+
+    def locked_put(self, credentials: OAuth2Credentials):
+        # Called by oauth2client after each token refresh
+        metrics.record_token_refresh(self.user_id, ok=not credentials.invalid)
+        _write_credentials_file(self.path, credentials.to_json())
+
+    def locked_delete(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
 def get_stored_credentials(user_id: str) -> OAuth2Credentials | None:
     """Retrieved stored credentials for the provided user ID.
 
@@ -128,7 +222,10 @@ def get_stored_credentials(user_id: str) -> OAuth2Credentials | None:
 
         with open(cred_file_path, 'r') as f:
             data = f.read()
-            return Credentials.new_from_json(data)
+        credentials = Credentials.new_from_json(data)
+        # Refreshes of these credentials, including those made by authorized HTTP clients, are coordinated
+        credentials.set_store(CredentialStorage(user_id=user_id))
+        return credentials
     except Exception as e:
         logging.error(e)
         return None
@@ -138,12 +235,24 @@ def get_stored_credentials(user_id: str) -> OAuth2Credentials | None:
 
 def store_credentials(credentials: OAuth2Credentials, user_id: str):
     """Store OAuth 2.0 credentials in the specified directory."""
-    cred_file_path = _get_credential_filename(user_id=user_id)
-    os.makedirs(os.path.dirname(cred_file_path), exist_ok=True)
-    
-    data = credentials.to_json()
-    with open(cred_file_path, "w") as f:
-        f.write(data)
+    storage = CredentialStorage(user_id=user_id)
+    storage.acquire_lock()
+    try:
+        _write_credentials_file(storage.path, credentials.to_json())
+    finally:
+        storage.release_lock()
+
+
+def refresh_credentials(credentials: OAuth2Credentials, user_id: str):
+    """
+    Refresh an expired access token and store it, at most once across processes.
+
+    Waits while another thread or process refreshes the account's token and
+    takes over its result instead of asking the token endpoint again.
+    """
+    if credentials.store is None:
+        credentials.set_store(CredentialStorage(user_id=user_id))
+    credentials.refresh(httplib2.Http())
 
 
 def exchange_code(authorization_code):
@@ -1,5 +1,15 @@
-from googleapiclient.discovery import build 
 from . import gauth
+from . import discovery
+from . import transport
+from . import executor
+from . import tracing
+from . import adaptive
+from . import mime
+from . import normalize
+from . import mailmerge
+from . import labels
+from . import singleflight
+from . import toolcache
 import logging
 import base64
 import traceback
@@ -7,128 +17,182 @@ from email.mime.text import MIMEText
 from email.message import EmailMessage
 from typing import Tuple
 
+# Largest page drafts.list returns
+DRAFTS_LIST_PAGE_LIMIT = 500
+# history.list pages read per list_history() call
+HISTORY_MAX_PAGES = 10
+# Newest messages of a label returned by label_overview
+LABEL_OVERVIEW_MESSAGES = 25
+# Counters of a label resource reported by mailbox_stats
+LABEL_COUNT_FIELDS = ('messagesTotal', 'messagesUnread', 'threadsTotal', 'threadsUnread')
 
+
+def _raw_message(to: str, subject: str, body: str, cc: str | None = None, bcc: str | None = None) -> str:
+    """A plain text message encoded for the 'raw' field of the Gmail API."""
+    message = EmailMessage()
+    message["To"] = to
+    message["Subject"] = subject
+    message.set_content(body)
+    if cc:
+        message["Cc"] = cc
+    if bcc:
+        message["Bcc"] = bcc
+    return base64.urlsafe_b64encode(message.as_bytes()).decode()
+
+
+@tracing.traced_methods("gmail")
 class GmailService():
     def __init__(self, user_id: str):
-        credentials = gauth.get_stored_credentials(user_id=user_id)
+        with tracing.span("gauth.get_stored_credentials"):
+            credentials = gauth.get_stored_credentials(user_id=user_id)
         if not credentials:
             raise RuntimeError("No Oauth2 credentials stored")
-        self.service = build('gmail', 'v1', credentials=credentials)
+        self.user_id = user_id
+        self.executor = executor.RequestExecutor(user_id=user_id)
+        with tracing.span("discovery.build_service", api="gmail"):
+            self.service = discovery.build_service(
+                *discovery.GMAIL_API,
+                http=transport.authorized_http(credentials, user_id=user_id),
+                request_builder=self.executor.request_builder
+            )
 
-    def _parse_message(self, txt, parse_body=False) -> dict | None:
+    def _parse_message(self, txt, parse_body=False, body_mode='full', max_body_chars=None,
+                       normalize_body=False) -> dict | None:
         """
         Parse a Gmail message into a structured format.
         
         Args:
             txt (dict): Raw message from Gmail API
             parse_body (bool): Whether to parse and include the message body (default: False)
+            body_mode (str): How much of the body to include, see mime.BODY_MODES (default: 'full')
+            max_body_chars (int, optional): Body length limit of the 'truncated' body mode
+            normalize_body (bool): Whether to return the body as normalized text, see normalize.normalize_text
         
         Returns:
             dict: Parsed message containing comprehensive metadata
             None: If parsing fails
         """
+        return self._parse_message_with_attachments(
+            txt, parse_body=parse_body, body_mode=body_mode, max_body_chars=max_body_chars,
+            normalize_body=normalize_body
+        )[0]
+
+    def _parse_message_with_attachments(self, txt, parse_body=False, body_mode='full', max_body_chars=None,
+                                        normalize_body=False) -> Tuple[dict, dict] | Tuple[None, dict]:
+        """
+        Parse a Gmail message and list its attachments in one walk over its MIME tree.
+
+        A truncated body is marked with 'body_truncated' and 'body_next_offset',
+        the offset to pass to get_email_body for the rest. A normalized body is
+        marked with 'body_normalized'; its offsets count characters of the
+        normalized text.
+
+        Args:
+            txt (dict): Raw message from Gmail API
+            parse_body (bool): Whether to parse the body and attachments (default: False)
+            body_mode (str): How much of the body to include, see mime.BODY_MODES (default: 'full')
+            max_body_chars (int, optional): Body length limit of the 'truncated' body mode
+            normalize_body (bool): Whether to return the body as normalized text, see normalize.normalize_text
+
+        Returns:
+            Tuple[dict, dict]: Parsed message and attachments at any depth, keyed by part ID
+            Tuple[None, dict]: If parsing fails
+        """
         try:
-            message_id = txt.get('id')
-            thread_id = txt.get('threadId')
             payload = txt.get('payload', {})
-            headers = payload.get('headers', [])
+            walked = mime.walk(payload, parse_parts=parse_body and mime.message_format(body_mode) == 'full')
 
             metadata = {
-                'id': message_id,
-                'threadId': thread_id,
+                'id': txt.get('id'),
+                'threadId': txt.get('threadId'),
                 'historyId': txt.get('historyId'),
                 'internalDate': txt.get('internalDate'),
                 'sizeEstimate': txt.get('sizeEstimate'),
                 'labelIds': txt.get('labelIds', []),
                 'snippet': txt.get('snippet'),
             }
-
-            for header in headers:
-                name = header.get('name', '').lower()
-                value = header.get('value', '')
-                
-                if name == 'subject':
-                    metadata['subject'] = value
-                elif name == 'from':
-                    metadata['from'] = value
-                elif name == 'to':
-                    metadata['to'] = value
-                elif name == 'date':
-                    metadata['date'] = value
-                elif name == 'cc':
-                    metadata['cc'] = value
-                elif name == 'bcc':
-                    metadata['bcc'] = value
-                elif name == 'message-id':
-                    metadata['message_id'] = value
-                elif name == 'in-reply-to':
-                    metadata['in_reply_to'] = value
-                elif name == 'references':
-                    metadata['references'] = value
-                elif name == 'delivered-to':
-                    metadata['delivered_to'] = value
+            metadata.update(walked.headers)
 
             if parse_body:
-                body = self._extract_body(payload)
-                if body:
-                    metadata['body'] = body
+                if body_mode == 'none':
+                    del metadata['snippet']
+                elif walked.body_part is not None and body_mode != 'snippet':
+                    body, truncated = self._body_text(
+                        txt.get('id'), walked.body_part, max_chars=max_body_chars, normalize_body=normalize_body
+                    )
+                    if body:
+                        metadata['body'] = body
+                    if truncated:
+                        metadata['body_truncated'] = True
+                        metadata['body_next_offset'] = max_body_chars
+                    if normalize_body:
+                        metadata['body_normalized'] = True
 
                 metadata['mimeType'] = payload.get('mimeType')
 
-            return metadata
+            return metadata, walked.attachments
 
         except Exception as e:
             logging.error(f"Error parsing message: {str(e)}")
             logging.error(traceback.format_exc())
-            return None
+            return None, {}
 
-    def _extract_body(self, payload) -> str | None:
-        """
-        Extract the email body from the payload.
-        Handles both multipart and single part messages, including nested multiparts.
+    def _body_text(self, message_id: str | None, part: dict, offset: int = 0, max_chars: int | None = None,
+                   normalize_body: bool = False) -> Tuple[str, bool]:
+        """A character range of a body part, raw or normalized, and whether the body continues after it."""
+        if not normalize_body:
+            return mime.decode_body_range(part, offset, max_chars)
+        text = normalize.normalized_body(self.user_id, message_id, part)
+        if max_chars is None:
+            return text[offset:], False
+        return text[offset:offset + max_chars], len(text) > offset + max_chars
+
+    def _get_messages(self, message_ids: list[str], parse_body: bool = False, body_mode: str = 'full',
+                      max_body_chars: int | None = None, normalize_body: bool = False) -> list:
         """
-        try:
-            # For single part text/plain messages
-            if payload.get('mimeType') == 'text/plain':
-                data = payload.get('body', {}).get('data')
-                if data:
-                    return base64.urlsafe_b64decode(data).decode('utf-8')
-            
-            # For single part text/html messages
-            if payload.get('mimeType') == 'text/html':
-                data = payload.get('body', {}).get('data')
-                if data:
-                    return base64.urlsafe_b64decode(data).decode('utf-8')
-            
-            # For multipart messages (both alternative and related)
-            if payload.get('mimeType', '').startswith('multipart/'):
-                parts = payload.get('parts', [])
-                
-                # First try to find a direct text/plain part
-                for part in parts:
-                    if part.get('mimeType') == 'text/plain':
-                        data = part.get('body', {}).get('data')
-                        if data:
-                            return base64.urlsafe_b64decode(data).decode('utf-8')
-                
-                # If no direct text/plain, recursively check nested multipart structures
-                for part in parts:
-                    if part.get('mimeType', '').startswith('multipart/'):
-                        nested_body = self._extract_body(part)
-                        if nested_body:
-                            return nested_body
-                            
-                # If still no body found, try the first part as fallback
-                if parts and 'body' in parts[0] and 'data' in parts[0]['body']:
-                    data = parts[0]['body']['data']
-                    return base64.urlsafe_b64decode(data).decode('utf-8')
+        Fetch and parse several messages using batch requests.
 
-            return None
+        Messages that still fail after retries are logged and skipped. The
+        MIME parts of the messages are only fetched if a body is returned.
 
-        except Exception as e:
-            logging.error(f"Error extracting body: {str(e)}")
-            return None
+        Args:
+            message_ids (list[str]): Gmail message IDs, in the desired output order
+            parse_body (bool): Whether to parse and include the message bodies
+            body_mode (str): How much of the bodies to include, see mime.BODY_MODES (default: 'full')
+            max_body_chars (int, optional): Body length limit of the 'truncated' body mode
+            normalize_body (bool): Whether to return the bodies as normalized text
 
+        Returns:
+            list: Parsed messages in the order of message_ids
+        """
+        message_format = mime.message_format(body_mode) if parse_body else 'metadata'
+        requests = {
+            message_id: self.service.users().messages().get(userId='me', id=message_id, format=message_format)
+            for message_id in message_ids
+        }
+        controller = adaptive.get_controller(self.user_id, adaptive.PATH_MESSAGE_GET)
+        responses, errors = self.executor.execute_batch(self.service, requests, controller=controller)
+        for message_id, error in errors.items():
+            logging.error(f"Error retrieving email {message_id}: {str(error)}")
+        if errors:
+            # The listing lacks these messages
+            toolcache.record_failed_read()
+
+        parsed = []
+        with tracing.span("gmail.parse_messages", count=len(responses)):
+            for message_id in message_ids:
+                txt = responses.get(message_id)
+                if txt is None:
+                    continue
+                parsed_message = self._parse_message(
+                    txt=txt, parse_body=parse_body, body_mode=body_mode, max_body_chars=max_body_chars,
+                    normalize_body=normalize_body
+                )
+                if parsed_message:
+                    parsed.append(parsed_message)
+        return parsed
+
+    @singleflight.coalesced("gmail.query_emails")
     def query_emails(self, query=None, max_results=100):
         """
         Query emails from Gmail based on a search query.
@@ -153,31 +217,28 @@ class GmailService():
             ).execute()
 
             messages = result.get('messages', [])
-            parsed = []
 
-            # Fetch full message details for each message
-            for msg in messages:
-                txt = self.service.users().messages().get(
-                    userId='me', 
-                    id=msg['id']
-                ).execute()
-                parsed_message = self._parse_message(txt=txt, parse_body=False)
-                if parsed_message:
-                    parsed.append(parsed_message)
-                    
-            return parsed
+            # Fetch full message details in batch requests
+            return self._get_messages([msg['id'] for msg in messages], parse_body=False)
             
         except Exception as e:
             logging.error(f"Error reading emails: {str(e)}")
             logging.error(traceback.format_exc())
+            toolcache.record_failed_read()
             return []
         
-    def get_email_by_id_with_attachments(self, email_id: str) -> Tuple[dict, dict] | Tuple[None, dict]:
+    @singleflight.coalesced("gmail.get_email_by_id_with_attachments")
+    def get_email_by_id_with_attachments(self, email_id: str, body_mode: str = 'full', max_body_chars: int | None = None,
+                                         normalize_body: bool = False) -> Tuple[dict, dict] | Tuple[None, dict]:
         """
         Fetch and parse a complete email message by its ID including attachment IDs.
         
         Args:
             email_id (str): The Gmail message ID to retrieve
+            body_mode (str): How much of the body to include, see mime.BODY_MODES (default: 'full');
+                             attachments are only listed in the 'truncated' and 'full' modes
+            max_body_chars (int, optional): Body length limit of the 'truncated' body mode
+            normalize_body (bool): Whether to return the body as normalized text (default: False)
         
         Returns:
             Tuple[dict, list]: Complete parsed email message including body and list of attachment IDs
@@ -187,50 +248,137 @@ class GmailService():
             # Fetch the complete message by ID
             message = self.service.users().messages().get(
                 userId='me',
-                id=email_id
+                id=email_id,
+                format=mime.message_format(body_mode)
             ).execute()
             
-            # Parse the message with body included
-            parsed_email = self._parse_message(txt=message, parse_body=True)
+            # Parse the message with body included; attachments may sit in nested multiparts
+            parsed_email, attachments = self._parse_message_with_attachments(
+                txt=message, parse_body=True, body_mode=body_mode, max_body_chars=max_body_chars,
+                normalize_body=normalize_body
+            )
 
             if parsed_email is None:
                 return None, {}
 
-            attachments = {}
-            # Check if 'parts' exists in payload before trying to access it
-            if "payload" in message and "parts" in message["payload"]:
-                for part in message["payload"]["parts"]:
-                    if "body" in part and "attachmentId" in part["body"]:
-                        attachment_id = part["body"]["attachmentId"]
-                        part_id = part["partId"]
-                        attachment = {
-                            "filename": part["filename"],
-                            "mimeType": part["mimeType"],
-                            "attachmentId": attachment_id,
-                            "partId": part_id
-                        }
-                        attachments[part_id] = attachment
-            else:
-                # Handle case when there are no parts (single part message)
-                logging.info(f"Email {email_id} does not have 'parts' in payload (likely single part message)")
-                if "payload" in message and "body" in message["payload"] and "attachmentId" in message["payload"]["body"]:
-                    # Handle potential attachment in single part message
-                    attachment_id = message["payload"]["body"]["attachmentId"]
-                    attachment = {
-                        "filename": message["payload"].get("filename", "attachment"),
-                        "mimeType": message["payload"].get("mimeType", "application/octet-stream"),
-                        "attachmentId": attachment_id,
-                        "partId": "0"
-                    }
-                    attachments["0"] = attachment
-
             return parsed_email, attachments
             
         except Exception as e:
             logging.error(f"Error retrieving email {email_id}: {str(e)}")
             logging.error(traceback.format_exc())
+            toolcache.record_failed_read()
             return None, {}
         
+    @singleflight.coalesced("gmail.get_email_body")
+    def get_email_body(self, email_id: str, offset: int = 0, max_chars: int | None = mime.DEFAULT_MAX_BODY_CHARS,
+                       normalize_body: bool = False) -> dict | None:
+        """
+        Fetch part of an email body, e.g. the rest of a body that was truncated.
+
+        Only the requested range is decoded, unless the body is normalized.
+
+        Args:
+            email_id (str): The Gmail message ID
+            offset (int): Character offset to start at (default: 0)
+            max_chars (int, optional): Maximum number of characters to return; None for the rest of the body
+            normalize_body (bool): Whether offsets and text refer to the normalized body (default: False)
+
+        Returns:
+            dict: 'id', 'offset', 'body' and 'truncated'; 'next_offset' if the body continues
+            None: If retrieval fails
+        """
+        try:
+            message = self.service.users().messages().get(userId='me', id=email_id).execute()
+            body_part = mime.walk(message.get('payload', {})).body_part
+            body, truncated = ('', False)
+            if body_part is not None:
+                body, truncated = self._body_text(email_id, body_part, offset, max_chars, normalize_body)
+            result = {'id': email_id, 'offset': offset, 'body': body, 'truncated': truncated}
+            if normalize_body:
+                result['normalized'] = True
+            if truncated:
+                result['next_offset'] = offset + len(body)
+            return result
+
+        except Exception as e:
+            logging.error(f"Error retrieving body of email {email_id}: {str(e)}")
+            logging.error(traceback.format_exc())
+            toolcache.record_failed_read()
+            return None
+
+    @singleflight.coalesced("gmail.get_thread")
+    def get_thread(self, thread_id: str, body_mode: str = 'full', max_body_chars: int | None = None,
+                   normalize_body: bool = False, collapse_quotes: bool = False) -> dict | None:
+        """
+        Fetch a whole conversation with one threads.get call.
+
+        The 'none' and 'snippet' body modes fetch the thread in metadata format,
+        without MIME parts or attachments.
+
+        Args:
+            thread_id (str): The Gmail thread ID
+            body_mode (str): How much of each body to include, see mime.BODY_MODES (default: 'full')
+            max_body_chars (int, optional): Body length limit of the 'truncated' body mode
+            normalize_body (bool): Whether to return the bodies as normalized text (default: False)
+            collapse_quotes (bool): Whether to remove text repeating earlier messages of the thread;
+                                    collapsed bodies are marked with 'body_collapsed' (default: False)
+
+        Returns:
+            dict: 'id', 'historyId', 'message_count' and 'messages', oldest first, each with its 'attachments'
+            None: If retrieval fails
+        """
+        try:
+            message_format = mime.message_format(body_mode)
+            thread = self.service.users().threads().get(
+                userId='me',
+                id=thread_id,
+                format=message_format
+            ).execute()
+
+            # Quotes are collapsed on whole bodies, so truncation comes after
+            collapse = collapse_quotes and message_format == 'full'
+            messages = []
+            with tracing.span("gmail.parse_messages", count=len(thread.get('messages', []))):
+                for txt in thread.get('messages', []):
+                    parsed, attachments = self._parse_message_with_attachments(
+                        txt=txt, parse_body=True, body_mode=body_mode,
+                        max_body_chars=None if collapse else max_body_chars, normalize_body=normalize_body
+                    )
+                    if parsed is None:
+                        continue
+                    if message_format == 'full':
+                        parsed['attachments'] = attachments
+                    messages.append(parsed)
+
+            if collapse:
+                bodies = normalize.collapse_thread_quotes([message.get('body', '') for message in messages])
+                for message, body in zip(messages, bodies):
+                    if len(body) < len(message.get('body', '')):
+                        message['body_collapsed'] = True
+                    if max_body_chars is not None and len(body) > max_body_chars:
+                        body = body[:max_body_chars]
+                        message['body_truncated'] = True
+                        # get_email_body reads the whole body; collapsing only removed text, so the
+                        # returned part ends at or after this offset of it (the rest may repeat some text)
+                        message['body_next_offset'] = max_body_chars
+                    if body:
+                        message['body'] = body
+                    else:
+                        message.pop('body', None)
+
+            return {
+                'id': thread.get('id', thread_id),
+                'historyId': thread.get('historyId'),
+                'message_count': len(messages),
+                'messages': messages
+            }
+
+        except Exception as e:
+            logging.error(f"Error retrieving thread {thread_id}: {str(e)}")
+            logging.error(traceback.format_exc())
+            toolcache.record_failed_read()
+            return None
+
     def create_draft(self, to: str, subject: str, body: str, cc: list[str] | None = None) -> dict | None:
         """
         Create a draft email message.
@@ -376,6 +524,7 @@ class GmailService():
             logging.error(traceback.format_exc())
             return None
         
+    @singleflight.coalesced("gmail.get_attachment")
     def get_attachment(self, message_id: str, attachment_id: str) -> dict | None:
         """
         Retrieves a Gmail attachment by its ID.
@@ -404,27 +553,51 @@ class GmailService():
             logging.error(traceback.format_exc())
             return None
 
+    def get_attachments(self, attachments: list[Tuple[str, str]]) -> dict:
+        """
+        Retrieves several Gmail attachments using batch requests.
+
+        Args:
+            attachments (list[Tuple[str, str]]): (message_id, attachment_id) pairs
+
+        Returns:
+            dict: Attachment data keyed by (message_id, attachment_id); failed downloads are left out
+        """
+        requests = {}
+        keys = {}
+        for message_id, attachment_id in attachments:
+            request_id = str(len(requests))
+            keys[request_id] = (message_id, attachment_id)
+            requests[request_id] = self.service.users().messages().attachments().get(
+                userId='me',
+                messageId=message_id,
+                id=attachment_id
+            )
+
+        controller = adaptive.get_controller(self.user_id, adaptive.PATH_ATTACHMENT_GET)
+        responses, errors = self.executor.execute_batch(self.service, requests, controller=controller)
+        for request_id, error in errors.items():
+            message_id, attachment_id = keys[request_id]
+            logging.error(f"Error retrieving attachment {attachment_id} from message {message_id}: {str(error)}")
+
+        return {
+            keys[request_id]: {
+                "size": attachment.get("size"),
+                "data": attachment.get("data")
+            }
+            for request_id, attachment in responses.items()
+        }
+
     def send_email(self, to: str, subject: str, body: str, cc: str = None, bcc: str = None) -> dict:
         """Send an email message directly through Gmail"""
         try:
-            message = EmailMessage()
-            message["To"] = to
-            message["Subject"] = subject
-            message.set_content(body)
-            
-            if cc:
-                message["Cc"] = cc
-            if bcc:
-                message["Bcc"] = bcc
-
-            # Encode message
-            encoded_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
-            create_message = {'raw': encoded_message}
+            create_message = {'raw': _raw_message(to, subject, body, cc=cc, bcc=bcc)}
             
             send_message = self.service.users().messages().send(
                 userId="me", 
                 body=create_message
             ).execute()
+            mailmerge.get_send_ledger(self.user_id).record(1)
             
             return {
                 "status": "success", 
@@ -437,42 +610,238 @@ class GmailService():
             logging.error(f"Error sending email: {str(e)}")
             return {"status": "error", "error_message": str(e)}
 
-    def list_drafts(self, max_results: int = 50) -> list:
-        """List all draft emails in Gmail"""
+    def mail_merge(self, subject_template: str, body_template: str, recipients: list[dict],
+                   mode: str = mailmerge.MODE_SEND, job_id: str | None = None, max_messages: int | None = None,
+                   retry_unknown: bool = False, dry_run: bool = False) -> dict:
+        """
+        Send, or save as drafts, one message per recipient rendered from a template.
+
+        Messages are submitted as batched messages.send / drafts.create
+        requests sized by the account's adaptive controller and paced by its
+        quota budget. In send mode every batch first reserves its messages in
+        the account's rolling 24 hour send count; recipients beyond the daily
+        limit are deferred. Every batch is written to the job journal before
+        and after it is sent, so repeating the call (or passing its job_id)
+        resumes the job and skips recipients already done.
+
+        Args:
+            subject_template (str): Subject with $field placeholders, see mailmerge.render()
+            body_template (str): Plain text body with $field placeholders
+            recipients (list[dict]): One dict per message with 'to', an optional 'cc' and the template fields
+            mode (str): 'send' or 'draft' (default: 'send')
+            job_id (str, optional): Job to resume; derived from the arguments if omitted
+            max_messages (int, optional): Submit at most this many messages in this call
+            retry_unknown (bool): Submit again recipients whose outcome is unknown (risks duplicates)
+            dry_run (bool): Only render and report what would be submitted
+
+        Returns:
+            dict: Job ID, counts per status for the whole job, the results of this call and the send budget
+        """
+        rendered = mailmerge.render(subject_template, body_template, recipients)
+        job_id = job_id or mailmerge.make_job_id(mode, subject_template, body_template, recipients)
+        journal = mailmerge.JobJournal(self.user_id, job_id)
+        ledger = mailmerge.get_send_ledger(self.user_id)
+        if not mailmerge.start_job(self.user_id, job_id):
+            return {'status': 'error', 'job_id': job_id, 'error_message': 'This job is already running'}
+        try:
+            states = journal.states()
+            mismatched = [m.index for m in rendered if m.index in states and states[m.index].get('to') != m.to]
+            if mismatched:
+                return {'status': 'error', 'job_id': job_id,
+                        'error_message': f"Recipients differ from the journal of job {job_id} (first at index "
+                                         f"{mismatched[0]}); pass the same recipients in the same order"}
+            # A batch still marked as submitting was interrupted: its messages may have gone out
+            interrupted = [
+                {'index': index, 'to': entry.get('to'), 'status': mailmerge.STATUS_UNKNOWN,
+                 'error': 'interrupted while submitting'}
+                for index, entry in states.items() if entry.get('status') == mailmerge.STATUS_SUBMITTING
+            ]
+            done = set(mailmerge.DONE_STATUSES)
+            if retry_unknown:
+                done.discard(mailmerge.STATUS_UNKNOWN)
+
+            invalid = []
+            todo = []
+            for message in rendered:
+                previous = states.get(message.index, {}).get('status')
+                if message.error is not None:
+                    if previous != mailmerge.STATUS_INVALID:
+                        invalid.append({'index': message.index, 'to': message.to,
+                                        'status': mailmerge.STATUS_INVALID, 'error': message.error})
+                elif previous not in done and not (previous == mailmerge.STATUS_SUBMITTING and not retry_unknown):
+                    todo.append(message)
+            skipped = len(rendered) - len(todo) - sum(1 for m in rendered if m.error is not None)
+            if max_messages is not None:
+                todo = todo[:max(0, max_messages)]
+
+            if dry_run:
+                return {
+                    'status': 'dry_run',
+                    'job_id': job_id,
+                    'mode': mode,
+                    'total': len(rendered),
+                    'would_submit': len(todo),
+                    'already_done': skipped,
+                    'invalid': [{'index': e['index'], 'to': e['to'], 'error': e['error']} for e in invalid],
+                    'preview': [{'index': m.index, 'to': m.to, 'cc': m.cc, 'subject': m.subject, 'body': m.body}
+                                for m in todo[:3]],
+                    'send_budget': ledger.usage(),
+                }
+
+            journal.append(interrupted + invalid)
+            path = adaptive.PATH_MESSAGE_SEND if mode == mailmerge.MODE_SEND else adaptive.PATH_DRAFT_CREATE
+            controller = adaptive.get_controller(self.user_id, path)
+            results = []
+            deferred = 0
+            position = 0
+            while position < len(todo):
+                size, concurrency = controller.settings()
+                chunk = todo[position:position + size * concurrency]
+                if mode == mailmerge.MODE_SEND:
+                    granted = ledger.reserve(len(chunk))
+                    if granted < len(chunk):
+                        deferred = len(todo) - position - granted
+                        chunk = chunk[:granted]
+                    if not chunk:
+                        break
+                position += len(chunk)
+
+                journal.append([{'index': m.index, 'to': m.to, 'status': mailmerge.STATUS_SUBMITTING} for m in chunk])
+                requests = {}
+                for m in chunk:
+                    raw = _raw_message(m.to, m.subject, m.body, cc=m.cc)
+                    if mode == mailmerge.MODE_SEND:
+                        requests[str(m.index)] = self.service.users().messages().send(userId='me', body={'raw': raw})
+                    else:
+                        requests[str(m.index)] = self.service.users().drafts().create(
+                            userId='me', body={'message': {'raw': raw}})
+                responses, errors = self.executor.execute_batch(self.service, requests, controller=controller)
+
+                entries = []
+                rejected = 0
+                for m in chunk:
+                    key = str(m.index)
+                    entry = {'index': m.index, 'to': m.to}
+                    if key in responses:
+                        response = responses[key]
+                        if mode == mailmerge.MODE_SEND:
+                            entry.update(status=mailmerge.STATUS_SENT, message_id=response.get('id'),
+                                         thread_id=response.get('threadId'))
+                        else:
+                            entry.update(status=mailmerge.STATUS_DRAFTED, draft_id=response.get('id'),
+                                         message_id=(response.get('message') or {}).get('id'))
+                    else:
+                        error = errors.get(key)
+                        error_class = executor.classify_error(error)
+                        # 5xx and network errors leave open whether the message went out
+                        ambiguous = error_class in (executor.ERROR_SERVER, executor.ERROR_NETWORK, executor.ERROR_OTHER)
+                        if not ambiguous:
+                            rejected += 1
+                        entry.update(status=mailmerge.STATUS_UNKNOWN if ambiguous else mailmerge.STATUS_FAILED,
+                                     error=str(error))
+                        logging.error(f"Mail merge {job_id}: could not {mode} to {m.to}: {str(error)}")
+                    entries.append(entry)
+                if mode == mailmerge.MODE_SEND:
+                    ledger.release(rejected)
+                journal.append(entries)
+                results.extend(entries)
+
+            if deferred:
+                logging.warning(f"Mail merge {job_id}: daily send limit reached, {deferred} messages deferred")
+            counts = mailmerge.summarize(journal.states())
+            remaining = len(rendered) - sum(counts.get(status, 0) for status in mailmerge.DONE_STATUSES) \
+                - counts.get(mailmerge.STATUS_INVALID, 0)
+            return {
+                'status': 'completed' if remaining == 0 else 'incomplete',
+                'job_id': job_id,
+                'mode': mode,
+                'total': len(rendered),
+                'already_done': skipped,
+                'submitted': len(results),
+                'deferred': deferred,
+                'job_counts': counts,
+                'remaining': remaining,
+                'results': interrupted + results + invalid,
+                'send_budget': ledger.usage(),
+            }
+        except Exception as e:
+            logging.error(f"Error in mail merge {job_id}: {str(e)}")
+            logging.error(traceback.format_exc())
+            return {'status': 'error', 'job_id': job_id, 'error_message': str(e)}
+        finally:
+            mailmerge.finish_job(self.user_id, job_id)
+
+    @singleflight.coalesced("gmail.list_drafts")
+    def list_drafts(self, max_results: int = 50, page_token: str | None = None, body_mode: str = 'snippet',
+                    max_body_chars: int | None = None, normalize_body: bool = False) -> dict:
+        """
+        List draft emails, fetching their details in batch requests.
+
+        drafts.list is paged through until max_results drafts are found, then
+        the drafts are fetched with batched drafts.get calls; the MIME parts
+        are only fetched if a body is returned.
+
+        Args:
+            max_results (int): Maximum number of drafts to return (default: 50)
+            page_token (str, optional): next_page_token of a previous call
+            body_mode (str): How much of the bodies to include, see mime.BODY_MODES (default: 'snippet')
+            max_body_chars (int, optional): Body length limit of the 'truncated' body mode
+            normalize_body (bool): Whether to return the bodies as normalized text
+
+        Returns:
+            dict: 'drafts' in listing order and 'next_page_token' if there are more
+        """
         try:
-            result = self.service.users().drafts().list(
-                userId='me',
-                maxResults=max_results
-            ).execute()
-            
-            drafts = result.get('drafts', [])
+            draft_ids = []
+            while len(draft_ids) < max_results:
+                result = self.service.users().drafts().list(
+                    userId='me',
+                    maxResults=min(max_results - len(draft_ids), DRAFTS_LIST_PAGE_LIMIT),
+                    pageToken=page_token
+                ).execute()
+                draft_ids.extend(draft['id'] for draft in result.get('drafts', []))
+                page_token = result.get('nextPageToken')
+                if not page_token:
+                    break
+
+            message_format = mime.message_format(body_mode)
+            requests = {
+                draft_id: self.service.users().drafts().get(userId='me', id=draft_id, format=message_format)
+                for draft_id in draft_ids
+            }
+            controller = adaptive.get_controller(self.user_id, adaptive.PATH_MESSAGE_GET)
+            responses, errors = self.executor.execute_batch(self.service, requests, controller=controller)
+            for draft_id, error in errors.items():
+                logging.error(f"Error retrieving draft {draft_id}: {str(error)}")
+
             parsed_drafts = []
-            
-            for draft in drafts:
-                try:
-                    draft_detail = self.service.users().drafts().get(
-                        userId='me',
-                        id=draft['id']
-                    ).execute()
-                    
-                    message = draft_detail.get('message', {})
-                    parsed_draft = self._parse_message(txt=message, parse_body=True)
+            with tracing.span("gmail.parse_messages", count=len(responses)):
+                for draft_id in draft_ids:
+                    draft_detail = responses.get(draft_id)
+                    if draft_detail is None:
+                        continue
+                    parsed_draft = self._parse_message(
+                        txt=draft_detail.get('message', {}), parse_body=True, body_mode=body_mode,
+                        max_body_chars=max_body_chars, normalize_body=normalize_body
+                    )
                     if parsed_draft:
-                        parsed_draft['draft_id'] = draft['id']
+                        parsed_draft['draft_id'] = draft_id
                         parsed_drafts.append(parsed_draft)
-                        
-                except Exception as e:
-                    logging.error(f"Error parsing draft {draft['id']}: {str(e)}")
-                    continue
-                    
-            return parsed_drafts
+
+            listing = {'drafts': parsed_drafts}
+            if page_token:
+                listing['next_page_token'] = page_token
+            return listing
             
         except Exception as e:
             logging.error(f"Error listing drafts: {str(e)}")
-            return []
+            toolcache.record_failed_read()
+            return {'drafts': []}
 
-    def get_unread_emails(self, max_results: int = 100) -> list:
-        """Get all unread emails from Gmail"""
+    @singleflight.coalesced("gmail.get_unread_emails")
+    def get_unread_emails(self, max_results: int = 100, body_mode: str = 'full',
+                          max_body_chars: int | None = None, normalize_body: bool = False) -> list:
+        """Get all unread emails from Gmail, with as much of their bodies as body_mode asks for"""
         try:
             result = self.service.users().messages().list(
                 userId='me',
@@ -481,25 +850,14 @@ class GmailService():
             ).execute()
             
             messages = result.get('messages', [])
-            parsed = []
-            
-            for msg in messages:
-                try:
-                    txt = self.service.users().messages().get(
-                        userId='me', 
-                        id=msg['id']
-                    ).execute()
-                    parsed_message = self._parse_message(txt=txt, parse_body=True)
-                    if parsed_message:
-                        parsed.append(parsed_message)
-                except Exception as e:
-                    logging.error(f"Error parsing unread email {msg['id']}: {str(e)}")
-                    continue
-                    
-            return parsed
+            return self._get_messages(
+                [msg['id'] for msg in messages], parse_body=True, body_mode=body_mode, max_body_chars=max_body_chars,
+                normalize_body=normalize_body
+            )
             
         except Exception as e:
             logging.error(f"Error getting unread emails: {str(e)}")
+            toolcache.record_failed_read()
             return []
 
     def mark_email_read(self, email_id: str) -> bool:
@@ -510,6 +868,7 @@ class GmailService():
                 id=email_id,
                 body={'removeLabelIds': ['UNREAD']}
             ).execute()
+            labels.invalidate_stats(self.user_id)
             return True
         except Exception as e:
             logging.error(f"Error marking email {email_id} as read: {str(e)}")
@@ -522,21 +881,55 @@ class GmailService():
                 userId='me',
                 id=email_id
             ).execute()
+            labels.invalidate_stats(self.user_id)
             return True
         except Exception as e:
             logging.error(f"Error moving email {email_id} to trash: {str(e)}")
             return False
 
+    @singleflight.coalesced("gmail.list_labels")
     def list_labels(self) -> list:
-        """List all Gmail labels"""
+        """List all Gmail labels, refreshing the account's cached label index"""
         try:
-            result = self.service.users().labels().list(userId='me').execute()
-            labels = result.get('labels', [])
-            return [{'id': label['id'], 'name': label['name'], 'type': label.get('type', 'user')} for label in labels]
+            return labels.store(self.user_id, self._fetch_labels()).labels()
         except Exception as e:
             logging.error(f"Error listing labels: {str(e)}")
+            toolcache.record_failed_read()
             return []
 
+    def _fetch_labels(self) -> list:
+        result = self.service.users().labels().list(userId='me').execute()
+        return [
+            {'id': label['id'], 'name': label['name'], 'type': label.get('type', 'user')}
+            for label in result.get('labels', [])
+        ]
+
+    def get_label_id(self, name: str) -> str | None:
+        """
+        Resolve a label name to its ID using the account's cached label index.
+
+        The index is listed again when it is older than the cache TTL, and
+        once more when the name is not in it, in case the label was created
+        elsewhere since.
+
+        Args:
+            name (str): Label name, e.g. 'Work/Projects'; matched case-insensitively if there is no exact match
+
+        Returns:
+            str: The label ID
+            None: If the account has no such label or the labels could not be listed
+        """
+        try:
+            index = labels.get_index(self.user_id)
+            if index is not None:
+                label_id = index.find(name)
+                if label_id is not None:
+                    return label_id
+            return labels.store(self.user_id, self._fetch_labels()).find(name)
+        except Exception as e:
+            logging.error(f"Error resolving label '{name}': {str(e)}")
+            return None
+
     def create_label(self, name: str, visibility: str = 'labelShow') -> dict:
         """Create a new Gmail label"""
         try:
@@ -549,11 +942,156 @@ class GmailService():
                 userId='me',
                 body=label
             ).execute()
+            labels.invalidate_stats(self.user_id)
+            labels.added(self.user_id, {'id': result['id'], 'name': result['name'], 'type': result.get('type', 'user')})
             return {'status': 'success', 'label_id': result['id'], 'name': result['name']}
         except Exception as e:
             logging.error(f"Error creating label '{name}': {str(e)}")
             return {'status': 'error', 'error_message': str(e)}
 
+    def get_history_id(self) -> str:
+        """The mailbox's current history ID, the starting point for list_history()."""
+        return self.service.users().getProfile(userId='me').execute()['historyId']
+
+    def list_history(self, start_history_id: str, max_pages: int = HISTORY_MAX_PAGES) -> dict | None:
+        """
+        Changes to the mailbox after start_history_id, from history.list.
+
+        Without changes this is a single request. Errors other than an
+        expired start point are raised, so that a poller can tell a failed
+        poll from a quiet mailbox.
+
+        Args:
+            start_history_id (str): History ID of the last change already seen
+            max_pages (int): Stop after this many pages; the rest is returned by the next call
+
+        Returns:
+            dict: 'history' records, oldest first, and the 'historyId' to continue from
+            None: If start_history_id is too old for Gmail to answer (about a week); start again from get_history_id()
+        """
+        records = []
+        history_id = start_history_id
+        page_token = None
+        for _ in range(max_pages):
+            try:
+                result = self.service.users().history().list(
+                    userId='me',
+                    startHistoryId=start_history_id,
+                    pageToken=page_token
+                ).execute()
+            except Exception as e:
+                if executor.classify_error(e) == executor.ERROR_NOT_FOUND:
+                    return None
+                raise
+            page = result.get('history', [])
+            records.extend(page)
+            page_token = result.get('nextPageToken')
+            if not page_token:
+                history_id = result.get('historyId', history_id)
+                break
+            # Continue a truncated listing from the last record returned
+            history_id = page[-1]['id'] if page else history_id
+        return {'history': records, 'historyId': history_id}
+
+    @singleflight.coalesced("gmail.mailbox_stats")
+    def mailbox_stats(self, label_filter: list[str] | None = None, refresh: bool = False) -> dict:
+        """
+        Message and thread counts (total and unread) of every label.
+
+        The counts of all labels are fetched with one batch of labels.get
+        calls, which cost one quota unit each, and cached for the mailbox
+        stats TTL. Labels come from the cached label index, so a warm cache
+        answers without any API call.
+
+        Args:
+            label_filter (list[str], optional): Only report these labels, given by ID or name
+            refresh (bool): Fetch the counts again even if they are cached
+
+        Returns:
+            dict: 'labels' with their counts, 'age_seconds' of the counts and 'unknown_labels' not found
+        """
+        try:
+            cached = None if refresh else labels.get_stats(self.user_id)
+            if cached is not None:
+                stats, age = cached
+            else:
+                index = labels.get_index(self.user_id) or labels.store(self.user_id, self._fetch_labels())
+                requests = {
+                    label_id: self.service.users().labels().get(userId='me', id=label_id)
+                    for label_id in index.by_id
+                }
+                responses, errors = self.executor.execute_batch(self.service, requests)
+                for label_id, error in errors.items():
+                    logging.error(f"Error retrieving label {label_id}: {str(error)}")
+                if errors:
+                    # A label deleted elsewhere; list the labels again next time
+                    labels.invalidate(self.user_id)
+                stats = [
+                    {
+                        'id': label['id'],
+                        'name': label['name'],
+                        'type': label['type'],
+                        **{key: responses[label['id']].get(key, 0) for key in LABEL_COUNT_FIELDS},
+                    }
+                    for label in index.labels() if label['id'] in responses
+                ]
+                labels.store_stats(self.user_id, stats)
+                age = 0.0
+
+            result = {'labels': stats, 'age_seconds': round(age, 1)}
+            if label_filter:
+                by_key = {}
+                for label in stats:
+                    by_key[label['id']] = label
+                    by_key.setdefault(label['name'].casefold(), label)
+                selected = []
+                unknown = []
+                for key in label_filter:
+                    label = by_key.get(key) or by_key.get(key.casefold())
+                    if label is None:
+                        unknown.append(key)
+                    elif label not in selected:
+                        selected.append(label)
+                result['labels'] = selected
+                if unknown:
+                    result['unknown_labels'] = unknown
+            return result
+        except Exception as e:
+            logging.error(f"Error getting mailbox stats: {str(e)}")
+            return {'status': 'error', 'error_message': str(e)}
+
+    @singleflight.coalesced("gmail.label_overview")
+    def label_overview(self, label_id: str, max_results: int = LABEL_OVERVIEW_MESSAGES) -> dict:
+        """
+        Counts and newest messages of a label.
+
+        The counts come from mailbox_stats() and its cache; the messages are
+        one messages.list call plus a batch of metadata fetches.
+
+        Args:
+            label_id (str): ID of the label
+            max_results (int): Newest messages to include (default: 25)
+
+        Returns:
+            dict: The label's 'counts' and its newest 'messages' (headers and snippet)
+        """
+        try:
+            stats = self.mailbox_stats(label_filter=[label_id])
+            if stats.get('status') == 'error':
+                return stats
+            if not stats['labels']:
+                return {'status': 'error', 'error_message': f"Label {label_id} not found"}
+            result = self.service.users().messages().list(
+                userId='me',
+                labelIds=[label_id],
+                maxResults=min(max(1, max_results), 500)
+            ).execute()
+            messages = self._get_messages([msg['id'] for msg in result.get('messages', [])], parse_body=False)
+            return {'counts': stats['labels'][0], 'messages': messages}
+        except Exception as e:
+            logging.error(f"Error getting label {label_id}: {str(e)}")
+            return {'status': 'error', 'error_message': str(e)}
+
     def apply_label(self, email_id: str, label_id: str) -> bool:
         """Apply a label to an email"""
         try:
@@ -562,9 +1100,12 @@ class GmailService():
                 id=email_id,
                 body={'addLabelIds': [label_id]}
             ).execute()
+            labels.invalidate_stats(self.user_id)
             return True
         except Exception as e:
             logging.error(f"Error applying label {label_id} to email {email_id}: {str(e)}")
+            # The label may have been deleted elsewhere
+            labels.invalidate(self.user_id)
             return False
 
     def remove_label(self, email_id: str, label_id: str) -> bool:
@@ -575,9 +1116,11 @@ class GmailService():
                 id=email_id,
                 body={'removeLabelIds': [label_id]}
             ).execute()
+            labels.invalidate_stats(self.user_id)
             return True
         except Exception as e:
             logging.error(f"Error removing label {label_id} from email {email_id}: {str(e)}")
+            labels.invalidate(self.user_id)
             return False
 
     def archive_email(self, email_id: str) -> bool:
@@ -588,27 +1131,54 @@ class GmailService():
                 id=email_id,
                 body={'removeLabelIds': ['INBOX']}
             ).execute()
+            labels.invalidate_stats(self.user_id)
             return True
         except Exception as e:
             logging.error(f"Error archiving email {email_id}: {str(e)}")
             return False
 
     def batch_archive_emails(self, email_ids: list[str]) -> dict:
-        """Archive multiple emails at once"""
+        """
+        Archive multiple emails at once.
+
+        IDs are sent in batchModify chunks sized by the account's adaptive
+        controller. A chunk rejected for another reason than throttling (e.g.
+        one unknown ID) is retried message by message so that only the
+        offending IDs are reported as failed.
+        """
         try:
-            success_count = 0
-            failed_ids = []
-            
-            for email_id in email_ids:
-                if self.archive_email(email_id):
-                    success_count += 1
-                else:
-                    failed_ids.append(email_id)
+            controller = adaptive.get_controller(self.user_id, adaptive.PATH_BATCH_MODIFY)
+            chunk_errors = self.executor.execute_chunked(
+                email_ids,
+                lambda chunk: self.service.users().messages().batchModify(
+                    userId='me',
+                    body={'ids': chunk, 'removeLabelIds': ['INBOX']}
+                ),
+                controller,
+            )
+
+            errors = {}
+            if chunk_errors:
+                requests = {
+                    email_id: self.service.users().messages().modify(
+                        userId='me',
+                        id=email_id,
+                        body={'removeLabelIds': ['INBOX']}
+                    )
+                    for email_id in chunk_errors
+                }
+                modify_controller = adaptive.get_controller(self.user_id, adaptive.PATH_MESSAGE_MODIFY)
+                _, errors = self.executor.execute_batch(self.service, requests, controller=modify_controller)
+
+            labels.invalidate_stats(self.user_id)
+            failed_ids = [email_id for email_id in email_ids if email_id in errors]
+            for email_id in failed_ids:
+                logging.error(f"Error archiving email {email_id}: {str(errors[email_id])}")
             
             return {
                 'status': 'completed',
                 'total': len(email_ids),
-                'success': success_count,
+                'success': len(email_ids) - len(failed_ids),
                 'failed': len(failed_ids),
                 'failed_ids': failed_ids
             }
@@ -616,8 +1186,10 @@ class GmailService():
             logging.error(f"Error in batch archive: {str(e)}")
             return {'status': 'error', 'error_message': str(e)}
 
-    def list_archived_emails(self, max_results: int = 100) -> list:
-        """List archived emails (not in inbox but not in trash)"""
+    @singleflight.coalesced("gmail.list_archived_emails")
+    def list_archived_emails(self, max_results: int = 100, body_mode: str = 'full',
+                             max_body_chars: int | None = None, normalize_body: bool = False) -> list:
+        """List archived emails (not in inbox but not in trash), with as much of their bodies as body_mode asks for"""
         try:
             result = self.service.users().messages().list(
                 userId='me',
@@ -626,25 +1198,14 @@ class GmailService():
             ).execute()
             
             messages = result.get('messages', [])
-            parsed = []
-            
-            for msg in messages:
-                try:
-                    txt = self.service.users().messages().get(
-                        userId='me', 
-                        id=msg['id']
-                    ).execute()
-                    parsed_message = self._parse_message(txt=txt, parse_body=True)
-                    if parsed_message:
-                        parsed.append(parsed_message)
-                except Exception as e:
-                    logging.error(f"Error parsing archived email {msg['id']}: {str(e)}")
-                    continue
-                    
-            return parsed
+            return self._get_messages(
+                [msg['id'] for msg in messages], parse_body=True, body_mode=body_mode, max_body_chars=max_body_chars,
+                normalize_body=normalize_body
+            )
             
         except Exception as e:
             logging.error(f"Error getting archived emails: {str(e)}")
+            toolcache.record_failed_read()
             return []
 
     def restore_email_to_inbox(self, email_id: str) -> bool:
@@ -655,6 +1216,7 @@ class GmailService():
                 id=email_id,
                 body={'addLabelIds': ['INBOX']}
             ).execute()
+            labels.invalidate_stats(self.user_id)
             return True
         except Exception as e:
             logging.error(f"Error restoring email {email_id} to inbox: {str(e)}")
@@ -667,6 +1229,8 @@ class GmailService():
                 userId='me',
                 id=label_id
             ).execute()
+            labels.removed(self.user_id, label_id)
+            labels.invalidate_stats(self.user_id)
             return {'status': 'success', 'label_id': label_id, 'action': 'deleted'}
         except Exception as e:
             logging.error(f"Error deleting label {label_id}: {str(e)}")
@@ -0,0 +1,137 @@
+import argparse
+import threading
+import time
+
+from . import metrics
+
+
+def get_label_cache_ttl() -> float:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--label-cache-ttl",
+        type=float,
+        default=300.0,
+        help="Seconds a label name to ID index is used before it is listed again (0 disables the cache)",
+    )
+    args, _ = parser.parse_known_args()
+    return max(0.0, args.label_cache_ttl)
+
+
+class LabelIndex():
+    """
+    Labels of one account by ID and by name.
+
+    Gmail label names are unique regardless of case, so names are looked up
+    exactly first and case-insensitively second.
+    """
+
+    def __init__(self, labels: list[dict]):
+        self.by_id: dict[str, dict] = {}
+        self.by_name: dict[str, str] = {}
+        self.by_folded_name: dict[str, str] = {}
+        self.loaded = time.monotonic()
+        for label in labels:
+            self.add(label)
+
+    def add(self, label: dict):
+        self.by_id[label['id']] = label
+        self.by_name[label['name']] = label['id']
+        self.by_folded_name[label['name'].casefold()] = label['id']
+
+    def remove(self, label_id: str):
+        label = self.by_id.pop(label_id, None)
+        if label is not None:
+            self.by_name.pop(label['name'], None)
+            self.by_folded_name.pop(label['name'].casefold(), None)
+
+    def find(self, name: str) -> str | None:
+        """ID of the label with this name, or None."""
+        label_id = self.by_name.get(name)
+        if label_id is None:
+            label_id = self.by_folded_name.get(name.casefold())
+        return label_id
+
+    def labels(self) -> list[dict]:
+        return list(self.by_id.values())
+
+    def age(self) -> float:
+        return time.monotonic() - self.loaded
+
+
+_indexes: dict[str, LabelIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(user_id: str) -> LabelIndex | None:
+    """The account's label index if it is younger than the cache TTL."""
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+    fresh = index is not None and index.age() < get_label_cache_ttl()
+    metrics.record_cache("labels", hit=fresh)
+    return index if fresh else None
+
+
+def store(user_id: str, labels: list[dict]) -> LabelIndex:
+    """Replace the account's label index with a complete label listing."""
+    index = LabelIndex(labels)
+    with _indexes_lock:
+        _indexes[user_id] = index
+    return index
+
+
+def added(user_id: str, label: dict):
+    """Write a label created by this server through to the cached index."""
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+        if index is not None:
+            index.add(label)
+
+
+def removed(user_id: str, label_id: str):
+    """Drop a label deleted by this server from the cached index."""
+    with _indexes_lock:
+        index = _indexes.get(user_id)
+        if index is not None:
+            index.remove(label_id)
+
+
+def invalidate(user_id: str):
+    with _indexes_lock:
+        _indexes.pop(user_id, None)
+
+
+def get_mailbox_stats_ttl() -> float:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--mailbox-stats-ttl",
+        type=float,
+        default=60.0,
+        help="Seconds mailbox_stats answers from its cached label counts (0 disables the cache)",
+    )
+    args, _ = parser.parse_known_args()
+    return max(0.0, args.mailbox_stats_ttl)
+
+
+# Message and thread counts per label, with the time they were fetched, by account
+_stats: dict[str, tuple[float, list[dict]]] = {}
+
+
+def get_stats(user_id: str) -> tuple[list[dict], float] | None:
+    """The account's cached label counts and their age in seconds, if younger than the TTL."""
+    with _indexes_lock:
+        cached = _stats.get(user_id)
+    age = time.monotonic() - cached[0] if cached is not None else None
+    fresh = age is not None and age < get_mailbox_stats_ttl()
+    metrics.record_cache("mailbox_stats", hit=fresh)
+    return (cached[1], age) if fresh else None
+
+
+def store_stats(user_id: str, stats: list[dict]):
+    with _indexes_lock:
+        _stats[user_id] = (time.monotonic(), stats)
+
+
+def invalidate_stats(user_id: str):
+    """Forget the account's label counts after this server changed labels of messages."""
+    with _indexes_lock:
+        _stats.pop(user_id, None)
@@ -0,0 +1,362 @@
+import argparse
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import string
+import tempfile
+import threading
+import time
+
+from . import gauth
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: jobs and send counts are only coordinated between the threads of a process
+    fcntl = None
+
+MODE_SEND = "send"
+MODE_DRAFT = "draft"
+MODES = (MODE_SEND, MODE_DRAFT)
+
+# Per-recipient outcomes recorded in a job journal:
+#   submitting  written before a batch is sent; still the last state after a crash mid-batch
+#   sent        messages.send succeeded (send mode)
+#   drafted     drafts.create succeeded (draft mode)
+#   failed      Google rejected the request; submitted again when the job is resumed
+#   unknown     the request may or may not have been processed (network error, crash); never resent
+#               automatically since that could deliver the message twice
+#   invalid     the template could not be rendered for this recipient
+STATUS_SUBMITTING = "submitting"
+STATUS_SENT = "sent"
+STATUS_DRAFTED = "drafted"
+STATUS_FAILED = "failed"
+STATUS_UNKNOWN = "unknown"
+STATUS_INVALID = "invalid"
+# Recipients a resumed job does not submit again
+DONE_STATUSES = {STATUS_SENT, STATUS_DRAFTED, STATUS_UNKNOWN}
+
+# Gmail counts sent messages over a rolling day
+SEND_WINDOW_SECONDS = 24 * 60 * 60
+
+
+def get_daily_send_limit() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--gmail-daily-send-limit",
+        type=int,
+        default=500,
+        help="Messages each account may send per rolling 24 hours (500 for Gmail, 2000 for Google Workspace)",
+    )
+    args, _ = parser.parse_known_args()
+    return max(0, args.gmail_daily_send_limit)
+
+
+def get_mail_merge_dir() -> str:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--mail-merge-dir",
+        type=str,
+        default=None,
+        help="Directory of mail merge job journals and sent message counts",
+    )
+    args, _ = parser.parse_known_args()
+    return args.mail_merge_dir or os.path.join(gauth.get_credentials_dir(), ".mail_merge")
+
+
+class Rendered():
+    """A message rendered for one recipient, or the reason it could not be."""
+
+    __slots__ = ('index', 'to', 'cc', 'subject', 'body', 'error')
+
+    def __init__(self, index: int, to: str, cc: str | None = None, subject: str | None = None,
+                 body: str | None = None, error: str | None = None):
+        self.index = index
+        self.to = to
+        self.cc = cc
+        self.subject = subject
+        self.body = body
+        self.error = error
+
+
+def render(subject_template: str, body_template: str, recipients: list[dict]) -> list[Rendered]:
+    """
+    Render the subject and body of every recipient.
+
+    Templates use $name or ${name} placeholders (string.Template), filled
+    from the recipient's own fields; $to is the recipient address and $$ a
+    literal dollar sign. A recipient without 'to' or missing a field used by
+    a template is returned with an error instead of a message.
+    """
+    subject = string.Template(subject_template)
+    body = string.Template(body_template)
+    rendered = []
+    for index, recipient in enumerate(recipients):
+        to = recipient.get("to") if isinstance(recipient, dict) else None
+        if not to or not isinstance(to, str):
+            rendered.append(Rendered(index, str(to or ""), error="recipient has no 'to' address"))
+            continue
+        fields = {key: "" if value is None else str(value) for key, value in recipient.items()}
+        try:
+            rendered.append(Rendered(index, to, cc=recipient.get("cc") or None,
+                                     subject=subject.substitute(fields), body=body.substitute(fields)))
+        except KeyError as e:
+            rendered.append(Rendered(index, to, error=f"missing field {e.args[0]!r}"))
+        except ValueError as e:
+            rendered.append(Rendered(index, to, error=f"invalid template: {e}"))
+    return rendered
+
+
+def make_job_id(mode: str, subject_template: str, body_template: str, recipients: list[dict]) -> str:
+    """Job ID derived from the job's content, so that repeating the same call resumes the same job."""
+    content = json.dumps([mode, subject_template, body_template, recipients], sort_keys=True, default=str)
+    return hashlib.sha256(content.encode()).hexdigest()[:16]
+
+
+def _safe_name(value: str) -> str:
+    return "".join(c if c.isalnum() or c in "@._-" else "_" for c in value)
+
+
+def _open_lock_file(path: str):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return open(f"{path}.lock", "a")
+
+
+@contextlib.contextmanager
+def _file_lock(path: str):
+    """Exclusive lock on a file shared by every process using the same mail merge directory."""
+    if fcntl is None:
+        yield
+        return
+    with _open_lock_file(path) as lock_file:
+        # Closing the file releases the flock
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        yield
+
+
+class JobJournal():
+    """
+    Append-only JSON lines record of a mail merge job, one line per recipient state change.
+
+    Every batch is journaled as submitting before it is sent and with its
+    outcome once it returns, so a job interrupted at any point can be
+    resumed without sending any message twice. The journal can be read by
+    another call while the job runs.
+    """
+
+    def __init__(self, user_id: str, job_id: str):
+        self.user_id = user_id
+        self.job_id = job_id
+        self.path = os.path.join(get_mail_merge_dir(), _safe_name(user_id), f"{_safe_name(job_id)}.jsonl")
+        self._lock = threading.Lock()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def states(self) -> dict[int, dict]:
+        """Latest entry of every recipient, by index; unreadable lines (e.g. a torn last write) are skipped."""
+        states = {}
+        try:
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                        states[entry["index"]] = entry
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except FileNotFoundError:
+            pass
+        return states
+
+    def append(self, entries: list[dict]):
+        if not entries:
+            return
+        now = time.time()
+        lines = "".join(json.dumps({**entry, "time": now}) + "\n" for entry in entries)
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "a") as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def summarize(states: dict[int, dict]) -> dict:
+    """Number of recipients per status."""
+    counts = {}
+    for entry in states.values():
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+    return counts
+
+
+class SendLedger():
+    """
+    Times of the messages an account sent in the last 24 hours, kept in a file between runs.
+
+    Sends are reserved before they are submitted and released again if
+    Google rejected them, so concurrent jobs of one account never exceed the
+    daily limit together. The file is locked and read again for every change,
+    so this also holds for jobs of other server processes.
+    """
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.path = os.path.join(get_mail_merge_dir(), f"{_safe_name(user_id)}.sends.json")
+        self.limit = get_daily_send_limit()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Hold the ledger of the account, also against other server processes, and yield its current times."""
+        with self._lock, _file_lock(self.path):
+            yield self._load(time.time())
+
+    def _load(self, now: float) -> list[float]:
+        # Always read the file: other processes may have sent since the last call
+        try:
+            with open(self.path) as f:
+                times = [float(t) for t in json.load(f)]
+        except FileNotFoundError:
+            times = []
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable sent message counts {self.path}: {e}")
+            times = []
+        cutoff = now - SEND_WINDOW_SECONDS
+        return [t for t in times if t > cutoff]
+
+    def _save(self, times: list[float]):
+        try:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(self.path)}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    json.dump(times, f)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except Exception as e:
+            logging.warning(f"Could not save sent message counts to {self.path}: {e}")
+
+    def reserve(self, count: int) -> int:
+        """Reserve up to count sends within the daily limit. Returns how many were granted."""
+        with self._locked() as times:
+            now = time.time()
+            granted = max(0, min(count, self.limit - len(times)))
+            if granted:
+                times.extend([now] * granted)
+                self._save(times)
+            return granted
+
+    def record(self, count: int = 1):
+        """Count sends made outside a reservation, e.g. by the send_email tool."""
+        with self._locked() as times:
+            times.extend([time.time()] * count)
+            self._save(times)
+
+    def release(self, count: int):
+        """Give back reserved sends that were not delivered."""
+        if count <= 0:
+            return
+        with self._locked() as times:
+            del times[max(0, len(times) - count):]
+            self._save(times)
+
+    def usage(self) -> dict:
+        with self._locked() as times:
+            usage = {"limit": self.limit, "used": len(times), "remaining": max(0, self.limit - len(times))}
+            if times and len(times) >= self.limit:
+                usage["next_send_after"] = time.strftime(
+                    "%Y-%m-%dT%H:%M:%SZ", time.gmtime(min(times) + SEND_WINDOW_SECONDS))
+            return usage
+
+
+_ledgers: dict[str, SendLedger] = {}
+_ledgers_lock = threading.Lock()
+
+
+def get_send_ledger(user_id: str) -> SendLedger:
+    with _ledgers_lock:
+        ledger = _ledgers.get(user_id)
+        if ledger is None:
+            ledger = SendLedger(user_id)
+            _ledgers[user_id] = ledger
+        return ledger
+
+
+# Jobs running in this process, with the open file holding their flock
+_running_jobs: dict[tuple[str, str], object] = {}
+_running_jobs_lock = threading.Lock()
+
+
+def start_job(user_id: str, job_id: str) -> bool:
+    """
+    Mark a job as running, also for other server processes sharing the mail merge directory.
+
+    Returns False if it already is.
+    """
+    with _running_jobs_lock:
+        if (user_id, job_id) in _running_jobs:
+            return False
+        lock_file = None
+        if fcntl is not None:
+            lock_file = _open_lock_file(JobJournal(user_id, job_id).path)
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                return False
+        _running_jobs[(user_id, job_id)] = lock_file
+        return True
+
+
+def finish_job(user_id: str, job_id: str):
+    with _running_jobs_lock:
+        lock_file = _running_jobs.pop((user_id, job_id), None)
+        if lock_file is not None:
+            lock_file.close()
+
+
+def is_running(user_id: str, job_id: str) -> bool:
+    """Whether a job is running in this or another server process."""
+    with _running_jobs_lock:
+        if (user_id, job_id) in _running_jobs:
+            return True
+    path = f"{JobJournal(user_id, job_id).path}.lock"
+    if fcntl is None or not os.path.exists(path):
+        return False
+    with open(path, "a") as lock_file:
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+    return False
+
+
+def job_status(user_id: str, job_id: str, include_results: bool = False) -> dict | None:
+    """
+    Progress of a mail merge job from its journal, also while it runs.
+
+    Returns:
+        dict: Counts per status, whether the job is running and optionally the latest entry per recipient
+        None: If the job has no journal
+    """
+    journal = JobJournal(user_id, job_id)
+    if not journal.exists():
+        return None
+    states = journal.states()
+    status = {
+        'job_id': job_id,
+        'running': is_running(user_id, job_id),
+        'recipients_seen': len(states),
+        'job_counts': summarize(states),
+        'updated': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(max(e.get('time', 0) for e in states.values())))
+        if states else None,
+        'send_budget': get_send_ledger(user_id).usage(),
+    }
+    if include_results:
+        status['results'] = [states[index] for index in sorted(states)]
+    return status
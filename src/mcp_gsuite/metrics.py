@@ -0,0 +1,374 @@
+import argparse
+import logging
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+TOOL_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+API_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+EXPORT_INTERVAL_SECONDS = 15.0
+
+
+def get_metrics_file() -> str | None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--metrics-file",
+        type=str,
+        default=None,
+        help="File rewritten periodically with metrics in OpenMetrics text format",
+    )
+    args, _ = parser.parse_known_args()
+    return args.metrics_file
+
+
+def get_metrics_port() -> int | None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=None,
+        help="Serve metrics in OpenMetrics text format on http://127.0.0.1:<port>/metrics",
+    )
+    args, _ = parser.parse_known_args()
+    return args.metrics_port
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric():
+    """A metric family; samples are keyed by their label values."""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple) -> dict:
+        return dict(zip(self.labelnames, key))
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> list[tuple[str, dict, float]]:
+        with self._lock:
+            return [(f"{self.name}_total", self._labels(key), value) for key, value in self._values.items()]
+
+    def snapshot(self) -> list[dict]:
+        with self._lock:
+            return [{"labels": self._labels(key), "value": value} for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self) -> list[tuple[str, dict, float]]:
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+    def snapshot(self) -> list[dict]:
+        with self._lock:
+            return [{"labels": self._labels(key), "value": value} for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets=API_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self._values[key] = state
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def samples(self) -> list[tuple[str, dict, float]]:
+        samples = []
+        with self._lock:
+            for key, state in self._values.items():
+                labels = self._labels(key)
+                cumulative = 0
+                for bound, count in zip(self.buckets, state["counts"]):
+                    cumulative += count
+                    samples.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+                samples.append((f"{self.name}_count", labels, state["count"]))
+                samples.append((f"{self.name}_sum", labels, state["sum"]))
+        return samples
+
+    def _quantile(self, state: dict, q: float) -> float | None:
+        """Upper bound of the bucket holding the q-quantile."""
+        if not state["count"]:
+            return None
+        rank = q * state["count"]
+        cumulative = 0
+        for bound, count in zip(self.buckets, state["counts"]):
+            cumulative += count
+            if cumulative >= rank:
+                return bound if bound != math.inf else None
+        return None
+
+    def snapshot(self) -> list[dict]:
+        with self._lock:
+            return [
+                {
+                    "labels": self._labels(key),
+                    "count": state["count"],
+                    "sum": round(state["sum"], 6),
+                    "p50_le": self._quantile(state, 0.5),
+                    "p95_le": self._quantile(state, 0.95),
+                    "p99_le": self._quantile(state, 0.99),
+                }
+                for key, state in self._values.items()
+            ]
+
+
+class Registry():
+    def __init__(self):
+        self._metrics: list[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """All metrics in OpenMetrics text exposition format."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        return {metric.name: metric.snapshot() for metric in self._metrics}
+
+    def clear(self):
+        for metric in self._metrics:
+            metric.clear()
+
+
+REGISTRY = Registry()
+
+TOOL_CALLS = REGISTRY.register(Counter(
+    "mcp_gsuite_tool_calls", "MCP tool calls by outcome", ("tool", "status")))
+TOOL_DURATION = REGISTRY.register(Histogram(
+    "mcp_gsuite_tool_duration_seconds", "MCP tool call latency", ("tool",), TOOL_BUCKETS))
+TOOLS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "mcp_gsuite_tool_calls_in_flight", "MCP tool calls currently running", ("tool",)))
+# Tool label of calls naming a tool the server does not have, so that clients cannot add series at will
+UNKNOWN_TOOL = "unknown"
+
+API_REQUESTS = REGISTRY.register(Counter(
+    "mcp_gsuite_google_api_requests",
+    "Google API calls (batch sub-requests counted individually) by outcome: ok or an error class",
+    ("account", "method", "outcome")))
+API_DURATION = REGISTRY.register(Histogram(
+    "mcp_gsuite_google_api_request_duration_seconds",
+    "Latency of single Google API calls, and of whole batches under method=batch",
+    ("method",), API_BUCKETS))
+API_RETRIES = REGISTRY.register(Counter(
+    "mcp_gsuite_google_api_retries", "Google API calls sent again after a transient error",
+    ("account", "method", "error_class")))
+API_IN_FLIGHT = REGISTRY.register(Gauge(
+    "mcp_gsuite_google_api_http_in_flight", "HTTP requests to Google currently open", ("account",)))
+BYTES_SENT = REGISTRY.register(Counter(
+    "mcp_gsuite_google_api_sent_bytes", "Request body bytes sent to Google APIs", ("account",)))
+BYTES_RECEIVED = REGISTRY.register(Counter(
+    "mcp_gsuite_google_api_received_bytes", "Response body bytes received from Google APIs", ("account",)))
+RATE_LIMIT_WAIT = REGISTRY.register(Counter(
+    "mcp_gsuite_rate_limit_wait_seconds", "Time calls waited for the account's quota budget", ("account",)))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "mcp_gsuite_cache_requests", "Cache lookups by result: hit or miss", ("cache", "result")))
+SINGLEFLIGHT_CALLS = REGISTRY.register(Counter(
+    "mcp_gsuite_singleflight_calls",
+    "Calls of read-only service methods by result: executed, or coalesced into an identical call in flight",
+    ("method", "result")))
+TOKEN_REFRESHES = REGISTRY.register(Counter(
+    "mcp_gsuite_token_refreshes",
+    "Access token refreshes sent to the token endpoint by this process, by outcome: ok or invalid",
+    ("account", "outcome")))
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def record_singleflight(method: str, coalesced: bool):
+    SINGLEFLIGHT_CALLS.inc(method=method, result="coalesced" if coalesced else "executed")
+
+
+def record_token_refresh(account: str, ok: bool):
+    TOKEN_REFRESHES.inc(account=account, outcome="ok" if ok else "invalid")
+
+
+def coalesced_calls() -> dict:
+    """Number of calls of every read-only method that shared an identical call in flight."""
+    return {
+        sample["labels"]["method"]: int(sample["value"])
+        for sample in SINGLEFLIGHT_CALLS.snapshot()
+        if sample["labels"]["result"] == "coalesced"
+    }
+
+
+def cache_hit_ratios() -> dict:
+    """Hit ratio of every cache that has been used."""
+    totals: dict[str, dict[str, float]] = {}
+    for sample in CACHE_REQUESTS.snapshot():
+        labels = sample["labels"]
+        totals.setdefault(labels["cache"], {"hit": 0.0, "miss": 0.0})[labels["result"]] += sample["value"]
+    return {
+        cache: round(counts["hit"] / (counts["hit"] + counts["miss"]), 4)
+        for cache, counts in totals.items()
+        if counts["hit"] + counts["miss"]
+    }
+
+
+class track_tool():
+    """Context manager recording the latency, outcome and concurrency of one tool call."""
+
+    def __init__(self, tool: str):
+        self.tool = tool
+
+    def __enter__(self):
+        TOOLS_IN_FLIGHT.inc(tool=self.tool)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        TOOLS_IN_FLIGHT.dec(tool=self.tool)
+        TOOL_DURATION.observe(time.perf_counter() - self.started, tool=self.tool)
+        TOOL_CALLS.inc(tool=self.tool, status="ok" if exc_type is None else "error")
+        return False
+
+
+def write_file(path: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(REGISTRY.render())
+    os.replace(tmp_path, path)
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_http_server: ThreadingHTTPServer | None = None
+_file_thread: threading.Thread | None = None
+_stop = threading.Event()
+
+
+def _export_file_loop(path: str):
+    while not _stop.wait(EXPORT_INTERVAL_SECONDS):
+        try:
+            write_file(path)
+        except Exception as e:
+            logging.warning(f"Could not write metrics to {path}: {e}")
+
+
+def start_exporters():
+    """Start the metrics file writer and HTTP endpoint configured on the command line."""
+    global _http_server, _file_thread
+    _stop.clear()
+    port = get_metrics_port()
+    if port is not None and _http_server is None:
+        _http_server = ThreadingHTTPServer(("127.0.0.1", port), _MetricsRequestHandler)
+        threading.Thread(target=_http_server.serve_forever, name="metrics-http", daemon=True).start()
+        logging.info(f"Serving metrics on http://127.0.0.1:{_http_server.server_port}/metrics")
+    path = get_metrics_file()
+    if path and _file_thread is None:
+        _file_thread = threading.Thread(target=_export_file_loop, args=(path,), name="metrics-file", daemon=True)
+        _file_thread.start()
+        logging.info(f"Writing metrics to {path} every {EXPORT_INTERVAL_SECONDS:.0f}s")
+
+
+def stop_exporters():
+    """Stop the exporters, writing the metrics file one last time."""
+    global _http_server, _file_thread
+    _stop.set()
+    if _http_server is not None:
+        _http_server.shutdown()
+        _http_server.server_close()
+        _http_server = None
+    path = get_metrics_file()
+    if path:
+        try:
+            write_file(path)
+        except Exception as e:
+            logging.warning(f"Could not write metrics to {path}: {e}")
+    _file_thread = None
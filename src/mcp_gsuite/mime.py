@@ -0,0 +1,192 @@
+import base64
+import codecs
+
+# Message headers copied into parsed messages, by lower-case header name
+HEADER_FIELDS = {
+    'subject': 'subject',
+    'from': 'from',
+    'to': 'to',
+    'date': 'date',
+    'cc': 'cc',
+    'bcc': 'bcc',
+    'message-id': 'message_id',
+    'in-reply-to': 'in_reply_to',
+    'references': 'references',
+    'delivered-to': 'delivered_to',
+}
+
+# How much of a message body to return:
+#   none       no body and no snippet
+#   snippet    only Gmail's snippet; like none, the message is fetched without its MIME parts
+#   truncated  at most max_body_chars characters of the body
+#   full       the whole body
+BODY_MODES = ('none', 'snippet', 'truncated', 'full')
+DEFAULT_MAX_BODY_CHARS = 5000
+
+# Largest number of base64 characters decoded per step when only part of a body is needed; a multiple of 4
+DECODE_CHUNK_CHARS = 64 * 1024
+
+# Body candidates by preference, lower is better
+BODY_RANKS = {
+    'text/plain': 0,
+    'text/html': 1,
+}
+
+
+def resolve_body_mode(body_mode: str | None, max_body_chars: int | None,
+                      default: str = 'full') -> tuple[str, int | None]:
+    """
+    Validate a body_mode/max_body_chars pair of tool arguments.
+
+    Without body_mode, giving max_body_chars means truncated and omitting it
+    means default. truncated without max_body_chars uses DEFAULT_MAX_BODY_CHARS.
+    """
+    if body_mode is None:
+        body_mode = 'truncated' if max_body_chars is not None else default
+    if body_mode not in BODY_MODES:
+        raise ValueError(f"body_mode must be one of {', '.join(BODY_MODES)}, got {body_mode!r}")
+    if body_mode != 'truncated':
+        return body_mode, None
+    if max_body_chars is None:
+        return body_mode, DEFAULT_MAX_BODY_CHARS
+    if max_body_chars < 0:
+        raise ValueError(f"max_body_chars must not be negative, got {max_body_chars}")
+    return body_mode, max_body_chars
+
+
+def message_format(body_mode: str) -> str:
+    """The messages.get format needed for a body mode: the MIME parts are only fetched to return a body."""
+    return 'full' if body_mode in ('truncated', 'full') else 'metadata'
+
+
+class WalkResult():
+    """What a single traversal of a Gmail message payload found."""
+
+    __slots__ = ('headers', 'body_part', 'attachments')
+
+    def __init__(self):
+        self.headers: dict[str, str] = {}
+        self.body_part: dict | None = None
+        self.attachments: dict[str, dict] = {}
+
+
+def parse_headers(headers: list[dict], into: dict | None = None) -> dict:
+    """Copy the known message headers into a dict keyed by HEADER_FIELDS; the last occurrence wins."""
+    fields = {} if into is None else into
+    for header in headers:
+        key = HEADER_FIELDS.get(header.get('name', '').lower())
+        if key is not None:
+            fields[key] = header.get('value', '')
+    return fields
+
+
+def walk(payload: dict, parse_parts: bool = True) -> WalkResult:
+    """
+    Walk a Gmail message payload once, without recursion.
+
+    Collects the message headers, picks the part to use as body (text/plain
+    over text/html, then the shallowest, then the first in document order;
+    parts with a filename are attachments, not bodies) and lists the
+    attachments at any depth, keyed by part ID.
+
+    Args:
+        payload (dict): The 'payload' of a Gmail message resource
+        parse_parts (bool): Whether to look at the MIME parts at all; headers only if False
+
+    Returns:
+        WalkResult: headers, body_part (None if there is none) and attachments
+    """
+    result = WalkResult()
+    parse_headers(payload.get('headers', []), into=result.headers)
+    if not parse_parts:
+        return result
+
+    attachments = result.attachments
+    best_rank = None
+    stack = [(payload, 0)]
+    pop, push = stack.pop, stack.append
+    while stack:
+        part, depth = pop()
+        children = part.get('parts')
+        if children:
+            # Containers hold no data; children are pushed reversed to visit them in document order
+            depth += 1
+            for child in reversed(children):
+                push((child, depth))
+            continue
+
+        body = part.get('body')
+        if not body:
+            continue
+        mime_type = part.get('mimeType', '')
+        attachment_id = body.get('attachmentId')
+        if attachment_id is not None:
+            part_id = part.get('partId') or '0'
+            attachments[part_id] = {
+                'filename': part.get('filename') or 'attachment',
+                'mimeType': mime_type or 'application/octet-stream',
+                'attachmentId': attachment_id,
+                'partId': part_id,
+            }
+            continue
+
+        rank = BODY_RANKS.get(mime_type)
+        if rank is None or part.get('filename') or not body.get('data'):
+            continue
+        if best_rank is None or (rank, depth) < best_rank:
+            best_rank = (rank, depth)
+            result.body_part = part
+
+    if result.body_part is None and not payload.get('parts') and (payload.get('body') or {}).get('data'):
+        # A single part message of another type, e.g. text/calendar
+        result.body_part = payload
+    return result
+
+
+def decode_body(part: dict) -> str | None:
+    """Decode the base64url data of a body part as UTF-8, replacing undecodable bytes."""
+    data = (part.get('body') or {}).get('data')
+    if not data:
+        return None
+    return base64.urlsafe_b64decode(data).decode('utf-8', errors='replace')
+
+
+def decode_body_range(part: dict, offset: int = 0, max_chars: int | None = None) -> tuple[str, bool]:
+    """
+    Decode max_chars characters of a body part starting at character offset.
+
+    The base64 data is decoded in chunks and decoding stops as soon as the
+    requested range is complete, so a short prefix of a large body costs
+    about as much as the prefix itself.
+
+    Returns:
+        tuple[str, bool]: The text and whether the body continues after it
+    """
+    data = (part.get('body') or {}).get('data')
+    if not data:
+        return '', False
+    if max_chars is None:
+        text = decode_body(part) or ''
+        return text[offset:], False
+
+    end = offset + max_chars
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    pieces = []
+    decoded = 0
+    # The first step covers the range if the text is ASCII; later steps grow up to DECODE_CHUNK_CHARS
+    step = min(DECODE_CHUNK_CHARS, ((end + 1) * 4 // 3 // 4 + 1) * 4)
+    start = 0
+    while start < len(data):
+        chunk = data[start:start + step]
+        start += step
+        final = start >= len(data)
+        if final:
+            chunk += '=' * (-len(chunk) % 4)
+        text = decoder.decode(base64.urlsafe_b64decode(chunk), final=final)
+        pieces.append(text)
+        decoded += len(text)
+        if decoded > end:
+            break
+        step = min(DECODE_CHUNK_CHARS, step * 2)
+    text = ''.join(pieces)
+    return text[offset:end], len(text) > end
@@ -0,0 +1,278 @@
+import re
+import threading
+from collections import OrderedDict
+from html.parser import HTMLParser
+
+from . import metrics
+from . import mime
+
+# Normalized bodies kept in memory, by message ID; message contents never change
+CACHE_MAX_CHARS = 8 * 1024 * 1024
+# Shortest run of repeated lines collapse_thread_quotes() removes
+THREAD_DUPLICATE_MIN_CHARS = 40
+
+# Elements whose content is never text
+SKIP_TAGS = {'script', 'style', 'head', 'title', 'noscript', 'template', 'svg'}
+# Elements starting a new line
+BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'dd', 'div', 'dl', 'dt', 'fieldset', 'figcaption', 'figure',
+    'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main', 'nav', 'ol', 'p', 'pre',
+    'section', 'table', 'tbody', 'thead', 'tfoot', 'tr', 'ul',
+}
+# Classes and IDs of quoted replies and signatures added by common mail clients
+QUOTE_CLASSES = {'gmail_quote', 'gmail_extra', 'moz-cite-prefix', 'yahoo_quoted', 'protonmail_quote'}
+QUOTE_IDS = {'mail-editor-reference-message-container'}
+# Outlook marks where the original message starts; everything after it is quoted
+ORIGINAL_MESSAGE_IDS = {'divrplyfwdmsg', 'appendonsend'}
+SIGNATURE_CLASSES = {'gmail_signature', 'moz-signature'}
+# Void elements have no end tag, so they never open a skipped section
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+# "On Mon, 3 Jun 2024 at 10:00, Alice <alice@example.com> wrote:", possibly wrapped over two lines
+ATTRIBUTION_PATTERN = re.compile(
+    r'^(on\b.+\bwrote|le\b.+\ba écrit|am\b.+\bschrieb|el\b.+\bescribió|il giorno\b.+\bha scritto)\s?:$',
+    re.IGNORECASE,
+)
+# Start of a forwarded or top-posted original message (Outlook and others); everything after it is quoted
+ORIGINAL_MESSAGE_PATTERN = re.compile(
+    r'^(-{2,}\s*(original message|forwarded message)\s*-{2,}|_{20,})$',
+    re.IGNORECASE,
+)
+OUTLOOK_HEADER_PATTERN = re.compile(r'^(from|sent|date|to|subject|cc)\s?:', re.IGNORECASE)
+MOBILE_FOOTER_PATTERN = re.compile(r'^(sent from my \w+|get outlook for \w+|sent from (yahoo )?mail for \w+)', re.IGNORECASE)
+
+_SPACES = re.compile(r'[ \t\f\v\u00a0\u1680\u2000-\u200b\u202f\u205f\u3000]+')
+_BLANK_LINES = re.compile(r'\n{3,}')
+
+
+class _TextExtractor(HTMLParser):
+    """Collects the readable text of an HTML document, without quoted replies and signatures."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.pieces: list[str] = []
+        # Tags that opened a skipped section, innermost last
+        self.skipping: list[str] = []
+        self.pre = 0
+        self.done = False
+
+    def _newline(self):
+        if self.pieces and not self.pieces[-1].endswith('\n'):
+            self.pieces.append('\n')
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if self.skipping:
+            if tag not in VOID_TAGS:
+                self.skipping.append(tag)
+            return
+        if tag in SKIP_TAGS or tag == 'blockquote':
+            self.skipping.append(tag)
+            return
+        if tag == 'div':
+            attributes = dict(attrs)
+            classes = set((attributes.get('class') or '').split())
+            element_id = (attributes.get('id') or '').lower()
+            if element_id in ORIGINAL_MESSAGE_IDS:
+                self.done = True
+                return
+            if classes & (QUOTE_CLASSES | SIGNATURE_CLASSES) or element_id in QUOTE_IDS:
+                self.skipping.append(tag)
+                return
+        if tag == 'br':
+            self.pieces.append('\n')
+        elif tag in BLOCK_TAGS:
+            self._newline()
+            if tag == 'li':
+                self.pieces.append('- ')
+            elif tag == 'pre':
+                self.pre += 1
+        elif tag in ('td', 'th'):
+            self.pieces.append(' ')
+
+    def handle_endtag(self, tag):
+        if self.done:
+            return
+        if self.skipping:
+            # Tolerate unclosed tags inside the skipped section
+            if tag in self.skipping:
+                while self.skipping and self.skipping.pop() != tag:
+                    pass
+            return
+        if tag in BLOCK_TAGS:
+            self._newline()
+            if tag == 'pre' and self.pre:
+                self.pre -= 1
+
+    def handle_data(self, data):
+        if self.skipping or self.done:
+            return
+        self.pieces.append(data if self.pre else _SPACES.sub(' ', data.replace('\n', ' ')))
+
+    def text(self) -> str:
+        return ''.join(self.pieces)
+
+
+def html_to_text(html: str) -> str:
+    """Readable text of an HTML body: no markup, scripts, styles, quoted replies or signature blocks."""
+    extractor = _TextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return extractor.text()
+
+
+def strip_quoted(text: str) -> str:
+    """
+    Remove quoted replies from a plain text body.
+
+    Drops '>' quoted lines and the "On ... wrote:" line introducing them,
+    and cuts everything from an "Original Message" separator or an Outlook
+    style From:/Sent: header block on, since the original message follows.
+    Unquoted replies between quoted lines are kept.
+    """
+    lines = text.split('\n')
+    kept = []
+    i = 0
+    while i < len(lines):
+        line = lines[i].strip()
+        if ORIGINAL_MESSAGE_PATTERN.match(line) or (
+            OUTLOOK_HEADER_PATTERN.match(line)
+            and sum(1 for next_line in lines[i + 1:i + 5] if OUTLOOK_HEADER_PATTERN.match(next_line.strip())) >= 2
+        ):
+            break
+        if line.startswith('>'):
+            i += 1
+            continue
+        attribution = 0
+        if ATTRIBUTION_PATTERN.match(line):
+            attribution = 1
+        elif i + 1 < len(lines) and ATTRIBUTION_PATTERN.match(f"{line} {lines[i + 1].strip()}"):
+            attribution = 2
+        if attribution:
+            following = next((l.strip() for l in lines[i + attribution:] if l.strip()), None)
+            if following is None or following.startswith('>'):
+                i += attribution
+                continue
+        kept.append(lines[i])
+        i += 1
+    return '\n'.join(kept)
+
+
+def strip_signature(text: str) -> str:
+    """Cut the signature after a '-- ' delimiter line and trailing mobile client footers."""
+    lines = text.split('\n')
+    for i, line in enumerate(lines):
+        if line.rstrip() == '--':
+            lines = lines[:i]
+            break
+    while lines and (not lines[-1].strip() or MOBILE_FOOTER_PATTERN.match(lines[-1].strip())):
+        lines.pop()
+    return '\n'.join(lines)
+
+
+def collapse_whitespace(text: str) -> str:
+    """Collapse runs of spaces, trim lines and keep at most one blank line in a row."""
+    lines = [_SPACES.sub(' ', line).strip() for line in text.replace('\r\n', '\n').replace('\r', '\n').split('\n')]
+    return _BLANK_LINES.sub('\n\n', '\n'.join(lines)).strip()
+
+
+def normalize_text(text: str, html: bool = False) -> str:
+    """
+    Turn a message body into compact readable text.
+
+    HTML is converted to text, then quoted replies and the signature are
+    removed and whitespace is collapsed.
+    """
+    if html:
+        text = html_to_text(text)
+    return collapse_whitespace(strip_signature(strip_quoted(text)))
+
+
+def _line_key(line: str) -> str:
+    """A line without quote markers, case and whitespace differences, for comparing quoted copies."""
+    return _SPACES.sub(' ', line.lstrip(' >\t').lower()).strip()
+
+
+def collapse_thread_quotes(bodies: list[str], min_chars: int = THREAD_DUPLICATE_MIN_CHARS) -> list[str]:
+    """
+    Remove text that repeats earlier messages of a thread.
+
+    Bodies are in thread order. A run of consecutive lines that all appeared
+    in earlier bodies (ignoring '>' markers, case and whitespace) is removed
+    if it holds at least min_chars characters, so that short lines like
+    "Thanks," survive. An "On ... wrote:" line introducing a removed run is
+    removed with it.
+    """
+    seen: set[str] = set()
+    collapsed = []
+    for body in bodies:
+        lines = body.split('\n')
+        keys = [_line_key(line) for line in lines]
+        drop = [False] * len(lines)
+        i = 0
+        while i < len(lines):
+            if not keys[i] or keys[i] not in seen:
+                i += 1
+                continue
+            # Extend the run over duplicate and blank lines
+            end = i
+            run_chars = 0
+            while end < len(lines) and (not keys[end] or keys[end] in seen):
+                run_chars += len(keys[end])
+                end += 1
+            if run_chars >= min_chars:
+                for j in range(i, end):
+                    drop[j] = True
+                previous = i - 1
+                while previous >= 0 and not keys[previous]:
+                    previous -= 1
+                if previous >= 0 and ATTRIBUTION_PATTERN.match(lines[previous].strip()):
+                    drop[previous] = True
+            i = end
+        seen.update(key for key in keys if key)
+        kept = [line for line, dropped in zip(lines, drop) if not dropped]
+        collapsed.append(_BLANK_LINES.sub('\n\n', '\n'.join(kept)).strip())
+    return collapsed
+
+
+# Normalized bodies by (account, message ID): message IDs are only unique within a mailbox
+_cache: OrderedDict[tuple[str, str], str] = OrderedDict()
+_cache_chars = 0
+_cache_lock = threading.Lock()
+
+
+def normalized_body(user_id: str, message_id: str | None, part: dict) -> str:
+    """
+    The normalized text of a body part picked by mime.walk(), memoized by account and message ID.
+
+    A cached body is returned without decoding the part again.
+    """
+    global _cache_chars
+    key = (user_id, message_id)
+    if message_id is not None:
+        with _cache_lock:
+            text = _cache.get(key)
+            if text is not None:
+                _cache.move_to_end(key)
+        metrics.record_cache("normalized_body", hit=text is not None)
+        if text is not None:
+            return text
+
+    text = normalize_text(mime.decode_body(part) or '', html=part.get('mimeType') == 'text/html')
+    if message_id is not None and len(text) <= CACHE_MAX_CHARS:
+        with _cache_lock:
+            if key not in _cache:
+                _cache[key] = text
+                _cache_chars += len(text)
+            while _cache_chars > CACHE_MAX_CHARS:
+                _, evicted = _cache.popitem(last=False)
+                _cache_chars -= len(evicted)
+    return text
+
+
+def clear_cache():
+    global _cache_chars
+    with _cache_lock:
+        _cache.clear()
+        _cache_chars = 0
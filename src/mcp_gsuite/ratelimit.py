@@ -0,0 +1,238 @@
+import argparse
+import logging
+import threading
+import time
+from collections import deque
+
+from . import metrics
+
+API_GMAIL = "gmail"
+API_CALENDAR = "calendar"
+
+# Gmail API quota units per method, see
+# https://developers.google.com/gmail/api/reference/quota
+GMAIL_METHOD_COSTS = {
+    "gmail.users.getProfile": 1,
+    "gmail.users.drafts.create": 10,
+    "gmail.users.drafts.delete": 10,
+    "gmail.users.drafts.get": 5,
+    "gmail.users.drafts.list": 5,
+    "gmail.users.drafts.send": 100,
+    "gmail.users.drafts.update": 15,
+    "gmail.users.history.list": 2,
+    "gmail.users.labels.create": 5,
+    "gmail.users.labels.delete": 5,
+    "gmail.users.labels.get": 1,
+    "gmail.users.labels.list": 1,
+    "gmail.users.labels.patch": 5,
+    "gmail.users.labels.update": 5,
+    "gmail.users.messages.attachments.get": 5,
+    "gmail.users.messages.batchDelete": 50,
+    "gmail.users.messages.batchModify": 50,
+    "gmail.users.messages.delete": 10,
+    "gmail.users.messages.get": 5,
+    "gmail.users.messages.import": 25,
+    "gmail.users.messages.insert": 25,
+    "gmail.users.messages.list": 5,
+    "gmail.users.messages.modify": 5,
+    "gmail.users.messages.send": 100,
+    "gmail.users.messages.trash": 5,
+    "gmail.users.messages.untrash": 5,
+    "gmail.users.threads.delete": 20,
+    "gmail.users.threads.get": 10,
+    "gmail.users.threads.list": 10,
+    "gmail.users.threads.modify": 10,
+    "gmail.users.threads.trash": 10,
+    "gmail.users.threads.untrash": 10,
+    "gmail.users.watch": 100,
+    "gmail.users.stop": 50,
+}
+GMAIL_DEFAULT_COST = 10
+
+# Calendar has no per-method units, every request counts as one query.
+CALENDAR_DEFAULT_COST = 1
+
+USAGE_WINDOW_SECONDS = 60
+
+
+def get_gmail_quota_units_per_second() -> float:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--gmail-quota-units-per-second",
+        type=float,
+        default=250.0,
+        help="Gmail quota units each account may spend per second",
+    )
+    args, _ = parser.parse_known_args()
+    return args.gmail_quota_units_per_second
+
+
+def get_calendar_requests_per_second() -> float:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--calendar-requests-per-second",
+        type=float,
+        default=10.0,
+        help="Calendar API requests each account may send per second",
+    )
+    args, _ = parser.parse_known_args()
+    return args.calendar_requests_per_second
+
+
+def get_api(method_id: str | None) -> str:
+    if method_id and method_id.startswith("calendar."):
+        return API_CALENDAR
+    return API_GMAIL
+
+
+def get_method_cost(method_id: str | None) -> int:
+    """Quota cost of one call to a Google API method."""
+    if get_api(method_id) == API_CALENDAR:
+        return CALENDAR_DEFAULT_COST
+    return GMAIL_METHOD_COSTS.get(method_id, GMAIL_DEFAULT_COST)
+
+
+class TokenBucket():
+    """
+    Thread-safe token bucket refilled at `rate` tokens per second, holding at most one second of tokens.
+
+    A caller may take more tokens than the bucket holds (e.g. a large batch);
+    the balance then goes negative and later callers wait for the refill.
+    """
+
+    def __init__(self, rate: float):
+        self.rate = max(rate, 0.001)
+        self.capacity = self.rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, cost: float) -> float:
+        """
+        Take `cost` tokens, blocking until enough are available.
+
+        Returns:
+            float: Seconds spent waiting
+        """
+        needed = min(cost, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= needed:
+                    self.tokens -= cost
+                    return waited
+                delay = (needed - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def available(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            return self.tokens
+
+
+class AccountQuota():
+    """Rate limiter and usage accounting for one Google account."""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.started = time.time()
+        self.buckets = {
+            API_GMAIL: TokenBucket(get_gmail_quota_units_per_second()),
+            API_CALENDAR: TokenBucket(get_calendar_requests_per_second()),
+        }
+        self.methods: dict[str, dict] = {}
+        self.recent: deque[tuple[float, str, int]] = deque()
+        self.throttled_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, method_ids: list[str]):
+        """Block until the account may spend the quota for these calls, then record the usage."""
+        costs = {API_GMAIL: 0, API_CALENDAR: 0}
+        for method_id in method_ids:
+            costs[get_api(method_id)] += get_method_cost(method_id)
+
+        waited = 0.0
+        for api, cost in costs.items():
+            if cost:
+                waited += self.buckets[api].acquire(cost)
+        if waited:
+            metrics.RATE_LIMIT_WAIT.inc(waited, account=self.user_id)
+        if waited > 0.1:
+            logging.info(f"Throttled {self.user_id} for {waited:.2f}s to stay within API quota")
+
+        now = time.time()
+        with self._lock:
+            self.throttled_seconds += waited
+            for method_id in method_ids:
+                cost = get_method_cost(method_id)
+                usage = self.methods.setdefault(method_id, {"calls": 0, "units": 0})
+                usage["calls"] += 1
+                usage["units"] += cost
+                self.recent.append((now, get_api(method_id), cost))
+            self._trim(now)
+
+    def _trim(self, now: float):
+        while self.recent and self.recent[0][0] < now - USAGE_WINDOW_SECONDS:
+            self.recent.popleft()
+
+    def report(self) -> dict:
+        now = time.time()
+        with self._lock:
+            self._trim(now)
+            last_minute = {API_GMAIL: 0, API_CALENDAR: 0}
+            for _, api, cost in self.recent:
+                last_minute[api] += cost
+            methods = {method_id: dict(usage) for method_id, usage in sorted(self.methods.items())}
+            throttled_seconds = self.throttled_seconds
+
+        totals = {API_GMAIL: 0, API_CALENDAR: 0}
+        for method_id, usage in methods.items():
+            totals[get_api(method_id)] += usage["units"]
+
+        return {
+            "account": self.user_id,
+            "since": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.started)),
+            "limits": {
+                "gmail_units_per_second": self.buckets[API_GMAIL].rate,
+                "calendar_requests_per_second": self.buckets[API_CALENDAR].rate,
+            },
+            "available_now": {api: round(bucket.available(), 2) for api, bucket in self.buckets.items()},
+            "units_last_minute": last_minute,
+            "units_total": totals,
+            "throttled_seconds": round(throttled_seconds, 3),
+            "methods": methods,
+        }
+
+
+_accounts: dict[str, AccountQuota] = {}
+_accounts_lock = threading.Lock()
+
+
+def get_account_quota(user_id: str) -> AccountQuota:
+    quota = _accounts.get(user_id)
+    if quota is None:
+        with _accounts_lock:
+            quota = _accounts.get(user_id)
+            if quota is None:
+                quota = AccountQuota(user_id)
+                _accounts[user_id] = quota
+    return quota
+
+
+def acquire(user_id: str, method_ids: list[str]):
+    """Wait for the account's quota budget before sending one or more calls."""
+    get_account_quota(user_id).acquire(method_ids)
+
+
+def get_usage_report(user_id: str) -> dict:
+    """Quota usage of an account since the server started, with the Gmail cost table for planning bulk jobs."""
+    report = get_account_quota(user_id).report()
+    report["gmail_method_costs"] = GMAIL_METHOD_COSTS
+    return report
@@ -0,0 +1,191 @@
+import argparse
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+from . import calendar
+from . import gmail
+from . import metrics
+from . import toolcache
+
+# Resource kinds and their URIs; query parameters (since, if_none_match) are not part of a resource's identity
+KIND_CHANGES = "changes"
+KIND_LABEL = "label"
+KIND_MESSAGE = "message"
+KIND_CALENDAR_TODAY = "calendar_today"
+
+CHANGES_URI = "gmail://{account}/changes"
+LABEL_URI = "gmail://{account}/labels/{label_id}"
+MESSAGE_URI = "gmail://{account}/messages/{message_id}"
+CALENDAR_TODAY_URI = "calendar://{account}/{calendar_id}/today"
+
+TEMPLATES = [
+    (LABEL_URI, "Gmail label",
+     "Total and unread counts and the newest messages (headers and snippet) of a label, e.g. INBOX"),
+    (MESSAGE_URI, "Gmail message", "A message with its body and attachment list"),
+    (CALENDAR_TODAY_URI, "Today's calendar events",
+     "Events of a calendar (e.g. primary) from midnight to midnight in the server's time zone"),
+]
+
+
+def get_resource_cache_ttl() -> float:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--resource-cache-ttl",
+        type=float,
+        default=300.0,
+        help="Seconds a read MCP resource is served from memory before it is fetched again (0 disables the cache)",
+    )
+    args, _ = parser.parse_known_args()
+    return max(0.0, args.resource_cache_ttl)
+
+
+def changes_uri(account: str) -> str:
+    return CHANGES_URI.format(account=account)
+
+
+def label_uri(account: str, label_id: str) -> str:
+    return LABEL_URI.format(account=account, label_id=quote(label_id, safe=""))
+
+
+def message_uri(account: str, message_id: str) -> str:
+    return MESSAGE_URI.format(account=account, message_id=quote(message_id, safe=""))
+
+
+def calendar_today_uri(account: str, calendar_id: str = "primary") -> str:
+    return CALENDAR_TODAY_URI.format(account=account, calendar_id=quote(calendar_id, safe=""))
+
+
+class ResourceRef():
+    """A parsed resource URI."""
+
+    __slots__ = ('kind', 'account', 'key', 'params', 'uri')
+
+    def __init__(self, kind: str, account: str, key: str | None, params: dict[str, str], uri: str):
+        self.kind = kind
+        self.account = account
+        self.key = key
+        self.params = params
+        # Canonical URI without query parameters, under which the resource is cached and notified
+        self.uri = uri
+
+
+def parse_uri(uri: str) -> ResourceRef | None:
+    """Parse a resource URI of this server. Returns None for URIs it does not serve."""
+    parts = urlsplit(uri)
+    if not parts.netloc:
+        return None
+    account = unquote(parts.netloc)
+    segments = [unquote(segment) for segment in parts.path.strip("/").split("/")]
+    params = {key: values[0] for key, values in parse_qs(parts.query).items()}
+    if parts.scheme == "gmail":
+        if segments == ["changes"]:
+            return ResourceRef(KIND_CHANGES, account, None, params, changes_uri(account))
+        if len(segments) == 2 and segments[0] == "labels" and segments[1]:
+            return ResourceRef(KIND_LABEL, account, segments[1], params, label_uri(account, segments[1]))
+        if len(segments) == 2 and segments[0] == "messages" and segments[1]:
+            return ResourceRef(KIND_MESSAGE, account, segments[1], params, message_uri(account, segments[1]))
+    elif parts.scheme == "calendar":
+        if len(segments) == 2 and segments[0] and segments[1] == "today":
+            return ResourceRef(KIND_CALENDAR_TODAY, account, segments[0], params,
+                               calendar_today_uri(account, segments[0]))
+    return None
+
+
+def fetch(ref: ResourceRef) -> dict:
+    """Fetch a label, message or calendar resource from Google. Raises RuntimeError if it cannot be read."""
+    with toolcache.track_reads() as reads:
+        data = _fetch(ref)
+    if reads.failed:
+        raise RuntimeError(f"Could not read {ref.uri}")
+    return data
+
+
+def _fetch(ref: ResourceRef) -> dict:
+    if ref.kind == KIND_LABEL:
+        data = gmail.GmailService(user_id=ref.account).label_overview(ref.key)
+    elif ref.kind == KIND_MESSAGE:
+        email, attachments = gmail.GmailService(user_id=ref.account).get_email_by_id_with_attachments(ref.key)
+        if email is None:
+            raise RuntimeError(f"Message {ref.key} not found")
+        data = {'message': email, 'attachments': list(attachments.values())}
+    elif ref.kind == KIND_CALENDAR_TODAY:
+        start = datetime.now().astimezone().replace(hour=0, minute=0, second=0, microsecond=0)
+        end = start + timedelta(days=1)
+        events = calendar.CalendarService(user_id=ref.account).get_events(
+            time_min=start.isoformat(), time_max=end.isoformat(), calendar_id=ref.key)
+        data = {'calendar_id': ref.key, 'date': start.date().isoformat(), 'events': events}
+    else:
+        raise RuntimeError(f"Resource {ref.uri} is not fetched from Google")
+    if isinstance(data, dict) and data.get('status') == 'error':
+        raise RuntimeError(data.get('error_message', f"Could not read {ref.uri}"))
+    return data
+
+
+def make_etag(data) -> str:
+    """Version of a resource's content: equal content has an equal ETag, whenever it was fetched."""
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+class CachedResource():
+    __slots__ = ('data', 'etag', 'fetched')
+
+    def __init__(self, data, etag: str):
+        self.data = data
+        self.etag = etag
+        self.fetched = time.monotonic()
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched
+
+
+_cache: dict[str, CachedResource] = {}
+_cache_lock = threading.Lock()
+
+
+def _cached(uri: str) -> CachedResource | None:
+    with _cache_lock:
+        entry = _cache.get(uri)
+    fresh = entry is not None and entry.age() < get_resource_cache_ttl()
+    metrics.record_cache("resources", hit=fresh)
+    return entry if fresh else None
+
+
+def _store(uri: str, data) -> CachedResource:
+    entry = CachedResource(data, make_etag(data))
+    with _cache_lock:
+        _cache[uri] = entry
+    return entry
+
+
+def read(ref: ResourceRef) -> str:
+    """
+    The JSON content of a resource, from the cache while it is younger than the TTL.
+
+    The content carries an 'etag'. A reader passing it back as
+    ?if_none_match=<etag> gets a short not_modified answer instead of the
+    content if the resource did not change.
+    """
+    entry = _cached(ref.uri) or _store(ref.uri, fetch(ref))
+    if ref.params.get("if_none_match") == entry.etag:
+        return json.dumps({'uri': ref.uri, 'etag': entry.etag, 'not_modified': True})
+    return json.dumps(
+        {'uri': ref.uri, 'etag': entry.etag, 'age_seconds': round(entry.age(), 1), **entry.data}, indent=2)
+
+
+def refresh(uri: str) -> bool:
+    """Fetch a resource again. Returns whether its content differs from the cached version, if there was one."""
+    with _cache_lock:
+        previous = _cache.get(uri)
+    entry = _store(uri, fetch(parse_uri(uri)))
+    return previous is not None and previous.etag != entry.etag
+
+
+def invalidate(uris: list[str]):
+    """Drop resources known to have changed, so that the next read fetches them."""
+    with _cache_lock:
+        for uri in uris:
+            _cache.pop(uri, None)
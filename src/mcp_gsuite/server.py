@@ -5,22 +5,113 @@ import json
 from typing import Any
 import traceback
 
-from mcp.server.models import InitializationOptions
 import mcp.types as types
-from mcp.server import NotificationOptions, Server
+from mcp.server import Server
 import mcp.server.stdio
+from mcp.server.lowlevel.helper_types import ReadResourceContents
+from pydantic import AnyUrl
 
 from . import gauth
+from . import discovery
+from . import labels
+from . import transport
+from . import adaptive
+from . import metrics
+from . import tracing
+from . import mime
+from . import tools_server
 from . import tools_gmail
 from . import tools_calendar
+from . import watcher
+from . import resources
+from . import server_http
+from . import daemon
+from . import workers
+from . import executor
+from . import toolcache
+
+from .tools_calendar import (
+    ListCalendarsToolHandler, GetCalendarEventsToolHandler, 
+    CreateCalendarEventToolHandler, DeleteCalendarEventToolHandler,
+    UpdateCalendarEventToolHandler
+)
+from .tools_gmail import (
+    QueryEmailsToolHandler, GetEmailByIdToolHandler, 
+    CreateDraftToolHandler, DeleteDraftToolHandler,
+    ReplyEmailToolHandler, GetAttachmentToolHandler,
+    BulkGetEmailsByIdsToolHandler, BulkSaveAttachmentsToolHandler, GetEmailBodyToolHandler,
+    GetThreadToolHandler, MailMergeToolHandler, GetMailMergeStatusToolHandler,
+    SendEmailToolHandler, ListDraftsToolHandler, GetUnreadEmailsToolHandler,
+    MarkEmailReadToolHandler, TrashEmailToolHandler, ListLabelsToolHandler,
+    MailboxStatsToolHandler, CreateLabelToolHandler, ApplyLabelToolHandler, RemoveLabelToolHandler,
+    ArchiveEmailToolHandler, BatchArchiveEmailsToolHandler, 
+    ListArchivedEmailsToolHandler, RestoreEmailToInboxToolHandler, DeleteLabelToolHandler
+)
+from .tools_server import GetQuotaUsageToolHandler
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Handlers of the tools that act on an account, by tool name
+TOOL_HANDLERS = {
+    "list_calendars": ListCalendarsToolHandler,
+    "get_calendar_events": GetCalendarEventsToolHandler,
+    "create_calendar_event": CreateCalendarEventToolHandler,
+    "delete_calendar_event": DeleteCalendarEventToolHandler,
+    "update_calendar_event": UpdateCalendarEventToolHandler,
+    "query_emails": QueryEmailsToolHandler,
+    "get_email_by_id": GetEmailByIdToolHandler,
+    "create_draft": CreateDraftToolHandler,
+    "delete_draft": DeleteDraftToolHandler,
+    "reply_email": ReplyEmailToolHandler,
+    "get_attachment": GetAttachmentToolHandler,
+    "bulk_get_emails": BulkGetEmailsByIdsToolHandler,
+    "bulk_save_attachments": BulkSaveAttachmentsToolHandler,
+    "get_email_body": GetEmailBodyToolHandler,
+    "get_gmail_thread": GetThreadToolHandler,
+    "mail_merge": MailMergeToolHandler,
+    "get_mail_merge_status": GetMailMergeStatusToolHandler,
+    # Step 2 additions
+    "send_email": SendEmailToolHandler,
+    "list_drafts": ListDraftsToolHandler,
+    "get_unread_emails": GetUnreadEmailsToolHandler,
+    # Advanced Gmail management tools
+    "mark_email_read": MarkEmailReadToolHandler,
+    "trash_email": TrashEmailToolHandler,
+    "list_labels": ListLabelsToolHandler,
+    "mailbox_stats": MailboxStatsToolHandler,
+    "create_label": CreateLabelToolHandler,
+    "apply_label": ApplyLabelToolHandler,
+    "remove_label": RemoveLabelToolHandler,
+    "archive_email": ArchiveEmailToolHandler,
+    "batch_archive_emails": BatchArchiveEmailsToolHandler,
+    "list_archived_emails": ListArchivedEmailsToolHandler,
+    "restore_email_to_inbox": RestoreEmailToInboxToolHandler,
+    "delete_label": DeleteLabelToolHandler,
+    # Server tools
+    "get_quota_usage": GetQuotaUsageToolHandler,
+}
+
+
+class GSuiteServer(Server):
+    """
+    The lowlevel server, advertising resource subscriptions.
+
+    The lowlevel Server always reports subscribe=False; this server handles
+    resources/subscribe and resources/unsubscribe, so it reports subscribe=True.
+    """
+
+    def get_capabilities(self, notification_options, experimental_capabilities) -> types.ServerCapabilities:
+        capabilities = super().get_capabilities(notification_options, experimental_capabilities)
+        if capabilities.resources is not None:
+            capabilities.resources.subscribe = True
+        return capabilities
+
+
 async def main():
     # Initialize the server
-    server = Server("mcp-gsuite")
+    server = GSuiteServer("mcp-gsuite", version="0.4.1")
     
     # Log platform and account info
     logger.info(sys.platform)
@@ -30,6 +121,53 @@ async def main():
         if creds:
             logger.info(f"found credentials for {account.email}")
     logger.info(f"Available accounts: {', '.join([a.email for a in accounts])}")
+    # Read the tool cache policy now, so that mistakes in it are logged at startup
+    toolcache.get_policies()
+    # Refuse an unsafe --google-api-root-url at startup rather than on the first tool call
+    root_url = discovery.get_api_root_url()
+    if root_url:
+        discovery.check_api_root_url(root_url)
+
+    # Runs account tool calls in worker processes with --workers, see workers.WorkerPool
+    worker_pool = None
+
+    # Client sessions subscribed to each resource URI; sessions are created by server.run,
+    # so they are taken from the subscribe requests they send.
+    subscriptions: dict[str, set] = {}
+
+    async def _send_resources_updated(uris: list[str]):
+        for uri in uris:
+            for session in list(subscriptions.get(uri, ())):
+                try:
+                    await session.send_resource_updated(AnyUrl(uri))
+                except Exception as e:
+                    logger.warning(f"Dropping subscriptions of a client session after failed notification: {str(e)}")
+                    for subscribers in subscriptions.values():
+                        subscribers.discard(session)
+
+    async def _notify_resources_updated(uris: list[str]):
+        """Called by the watcher with the URIs of changed mailbox resources."""
+        resources.invalidate(uris)
+        await _send_resources_updated(uris)
+
+    def _invalidate_stats(user_id: str):
+        """Reset an account's label counts wherever they are cached: here for resources, and in its worker."""
+        labels.invalidate_stats(user_id)
+        if worker_pool is not None:
+            worker_pool.invalidate_stats(user_id)
+
+    async def _refresh_subscribed_resources():
+        """Fetch subscribed calendar resources again, which history.list does not cover, and notify changes."""
+        changed = []
+        for uri, subscribers in list(subscriptions.items()):
+            ref = resources.parse_uri(uri)
+            if subscribers and ref.kind == resources.KIND_CALENDAR_TODAY:
+                try:
+                    if await asyncio.to_thread(resources.refresh, uri):
+                        changed.append(uri)
+                except Exception as e:
+                    logger.warning(f"Could not refresh {uri}: {str(e)}")
+        await _send_resources_updated(changed)
 
     @server.list_tools()
     async def handle_list_tools() -> list[types.Tool]:
@@ -231,7 +369,8 @@ async def main():
                         "email_id": {
                             "type": "string",
                             "description": "Email ID to retrieve"
-                        }
+                        },
+                        "normalize_body": tools_gmail.NORMALIZE_BODY_SCHEMA
                                          },
                      "required": ["__user_id__", "email_id"]
                  }
@@ -342,11 +481,108 @@ async def main():
                              "type": "array",
                              "items": {"type": "string"},
                              "description": "List of message IDs to retrieve"
-                         }
+                         },
+                         "body_mode": tools_gmail.BODY_MODE_SCHEMA,
+                         "max_body_chars": tools_gmail.MAX_BODY_CHARS_SCHEMA,
+                         "normalize_body": tools_gmail.NORMALIZE_BODY_SCHEMA
                      },
                      "required": ["__user_id__", "message_ids"]
                  }
              ),
+             types.Tool(
+                 name="get_email_body",
+                 description="Get part of an email body by character offset, e.g. the rest of a body returned with body_truncated",
+                 inputSchema={
+                     "type": "object",
+                     "properties": {
+                         "__user_id__": {
+                             "type": "string",
+                             "description": f"The EMAIL of the Google account. Available accounts: {', '.join([a.email for a in accounts])}"
+                         },
+                         "email_id": {
+                             "type": "string",
+                             "description": "Email ID"
+                         },
+                         "offset": {
+                             "type": "integer",
+                             "description": "Character offset to start at, e.g. body_next_offset (default: 0)",
+                             "minimum": 0
+                         },
+                         "max_chars": {
+                             "type": "integer",
+                             "description": f"Maximum number of characters to return (default: {mime.DEFAULT_MAX_BODY_CHARS})",
+                             "minimum": 1
+                         },
+                         "normalize_body": {
+                             "type": "boolean",
+                             "description": "Read the normalized body; pass the same value as in the call that truncated it (default: false)"
+                         }
+                     },
+                     "required": ["__user_id__", "email_id"]
+                 }
+             ),
+             types.Tool(
+                 name="get_gmail_thread",
+                 description="Get a whole email conversation by thread ID in one request, oldest message first",
+                 inputSchema={
+                     "type": "object",
+                     "properties": {
+                         "__user_id__": {
+                             "type": "string",
+                             "description": f"The EMAIL of the Google account. Available accounts: {', '.join([a.email for a in accounts])}"
+                         },
+                         "thread_id": {
+                             "type": "string",
+                             "description": "Thread ID (threadId of any of its messages)"
+                         },
+                         "body_mode": tools_gmail.BODY_MODE_SCHEMA,
+                         "max_body_chars": tools_gmail.MAX_BODY_CHARS_SCHEMA,
+                         "normalize_body": tools_gmail.NORMALIZE_BODY_SCHEMA,
+                         "collapse_quotes": {
+                             "type": "boolean",
+                             "description": "Remove text repeating earlier messages of the thread, such as quoted replies; get_email_body continues a truncated collapsed body from body_next_offset in the uncollapsed body (default: false)"
+                         }
+                     },
+                     "required": ["__user_id__", "thread_id"]
+                 }
+             ),
+             types.Tool(
+                 name="mail_merge",
+                 description="Send, or save as drafts, one personalized email per recipient from templates; batched, within the daily sending limit and resumable",
+                 inputSchema={
+                     "type": "object",
+                     "properties": {
+                         "__user_id__": {
+                             "type": "string",
+                             "description": f"The EMAIL of the Google account. Available accounts: {', '.join([a.email for a in accounts])}"
+                         },
+                         **tools_gmail.MAIL_MERGE_PROPERTIES
+                     },
+                     "required": ["__user_id__", "subject_template", "body_template", "recipients"]
+                 }
+             ),
+             types.Tool(
+                 name="get_mail_merge_status",
+                 description="Progress of a mail merge job, also while it runs",
+                 inputSchema={
+                     "type": "object",
+                     "properties": {
+                         "__user_id__": {
+                             "type": "string",
+                             "description": f"The EMAIL of the Google account. Available accounts: {', '.join([a.email for a in accounts])}"
+                         },
+                         "job_id": {
+                             "type": "string",
+                             "description": "The job_id returned by mail_merge"
+                         },
+                         "include_results": {
+                             "type": "boolean",
+                             "description": "Include the latest state of every recipient (default: false)"
+                         }
+                     },
+                     "required": ["__user_id__", "job_id"]
+                 }
+             ),
              types.Tool(
                  name="bulk_save_attachments",
                  description="Save multiple attachments from emails",
@@ -410,7 +646,7 @@ async def main():
              ),
              types.Tool(
                  name="list_drafts",
-                 description="List Gmail drafts",
+                 description="List Gmail drafts, headers and snippet by default; pass next_page_token back as page_token for more",
                  inputSchema={
                      "type": "object",
                      "properties": {
@@ -420,8 +656,12 @@ async def main():
                          },
                          "max_results": {
                              "type": "integer",
-                             "description": "Maximum number of drafts to return (default: 10)"
-                         }
+                             "description": "Maximum number of drafts to return (default: 50)"
+                         },
+                         "page_token": tools_gmail.PAGE_TOKEN_SCHEMA,
+                         "body_mode": tools_gmail.DRAFT_BODY_MODE_SCHEMA,
+                         "max_body_chars": tools_gmail.MAX_BODY_CHARS_SCHEMA,
+                         "normalize_body": tools_gmail.NORMALIZE_BODY_SCHEMA
                      },
                      "required": ["__user_id__"]
                  }
@@ -439,7 +679,10 @@ async def main():
                          "max_results": {
                              "type": "integer",
                              "description": "Maximum number of emails to return (default: 10)"
-                         }
+                         },
+                         "body_mode": tools_gmail.BODY_MODE_SCHEMA,
+                         "max_body_chars": tools_gmail.MAX_BODY_CHARS_SCHEMA,
+                         "normalize_body": tools_gmail.NORMALIZE_BODY_SCHEMA
                      },
                      "required": ["__user_id__"]
                  }
@@ -495,6 +738,29 @@ async def main():
                      "required": ["__user_id__"]
                  }
              ),
+             types.Tool(
+                 name="mailbox_stats",
+                 description="Total and unread message and thread counts per Gmail label, without listing messages",
+                 inputSchema={
+                     "type": "object",
+                     "properties": {
+                         "__user_id__": {
+                             "type": "string",
+                             "description": f"The EMAIL of the Google account. Available accounts: {', '.join([a.email for a in accounts])}"
+                         },
+                         "labels": {
+                             "type": "array",
+                             "items": {"type": "string"},
+                             "description": "Only report these labels, by ID or name (default: all labels)"
+                         },
+                         "refresh": {
+                             "type": "boolean",
+                             "description": "Fetch the counts again instead of using cached ones (default: false)"
+                         }
+                     },
+                     "required": ["__user_id__"]
+                 }
+             ),
              types.Tool(
                  name="create_label",
                  description="Create a new Gmail label",
@@ -520,7 +786,7 @@ async def main():
              ),
              types.Tool(
                  name="apply_label",
-                 description="Apply a label to a Gmail email",
+                 description="Apply a label, given by ID or name, to a Gmail email",
                  inputSchema={
                      "type": "object",
                      "properties": {
@@ -535,14 +801,15 @@ async def main():
                          "label_id": {
                              "type": "string",
                              "description": "The ID of the label to apply"
-                         }
+                         },
+                         "label_name": tools_gmail.LABEL_NAME_SCHEMA
                      },
-                     "required": ["__user_id__", "email_id", "label_id"]
+                     "required": ["__user_id__", "email_id"]
                  }
              ),
              types.Tool(
                  name="remove_label",
-                 description="Remove a label from a Gmail email",
+                 description="Remove a label, given by ID or name, from a Gmail email",
                  inputSchema={
                      "type": "object",
                      "properties": {
@@ -557,9 +824,10 @@ async def main():
                          "label_id": {
                              "type": "string",
                              "description": "The ID of the label to remove"
-                         }
+                         },
+                         "label_name": tools_gmail.LABEL_NAME_SCHEMA
                      },
-                     "required": ["__user_id__", "email_id", "label_id"]
+                     "required": ["__user_id__", "email_id"]
                  }
              ),
              types.Tool(
@@ -613,7 +881,10 @@ async def main():
                              "type": "integer",
                              "description": "Maximum number of archived emails to return (default: 100)",
                              "default": 100
-                         }
+                         },
+                         "body_mode": tools_gmail.BODY_MODE_SCHEMA,
+                         "max_body_chars": tools_gmail.MAX_BODY_CHARS_SCHEMA,
+                         "normalize_body": tools_gmail.NORMALIZE_BODY_SCHEMA
                      },
                      "required": ["__user_id__"]
                  }
@@ -638,7 +909,7 @@ async def main():
              ),
              types.Tool(
                  name="delete_label",
-                 description="Delete a Gmail label",
+                 description="Delete a Gmail label, given by ID or name",
                  inputSchema={
                      "type": "object",
                      "properties": {
@@ -649,9 +920,41 @@ async def main():
                          "label_id": {
                              "type": "string",
                              "description": "The ID of the label to delete"
+                         },
+                         "label_name": tools_gmail.LABEL_NAME_SCHEMA
+                     },
+                     "required": ["__user_id__"]
+                 }
+             ),
+             # Server tools
+             types.Tool(
+                 name="get_quota_usage",
+                 description="Report Google API quota usage of an account (Gmail units, Calendar requests, per-method costs) to plan bulk operations",
+                 inputSchema={
+                     "type": "object",
+                     "properties": {
+                         "__user_id__": {
+                             "type": "string",
+                             "description": f"The EMAIL of the Google account. Available accounts: {', '.join([a.email for a in accounts])}"
+                         }
+                     },
+                     "required": ["__user_id__"]
+                 }
+             ),
+             types.Tool(
+                 name="server_metrics",
+                 description="Report server metrics: tool latency, Google API calls, errors, retries, bytes, concurrency and cache hit ratios (no account needed)",
+                 inputSchema={
+                     "type": "object",
+                     "properties": {
+                         "format": {
+                             "type": "string",
+                             "enum": ["json", "openmetrics"],
+                             "description": "json (default) for a summary with latency percentiles, openmetrics for the raw exposition text",
+                             "default": "json"
                          }
                      },
-                     "required": ["__user_id__", "label_id"]
+                     "required": []
                  }
              )
          ]
@@ -665,9 +968,33 @@ async def main():
         """Handle tool calls."""
         logger.info(f"call_tool: {name} with arguments: {arguments}")
         
+        known = name in TOOL_HANDLERS or name in tools_server.TOOL_HANDLERS
+        with metrics.track_tool(name if known else metrics.UNKNOWN_TOOL), executor.count_call_retries() as retries:
+            with tracing.span(f"call_tool {name}", kind=tracing.SPAN_KIND_SERVER, tool=name) as root:
+                result = await _call_tool(name, arguments)
+            if retries.count:
+                # Added here rather than by the tools, so that it is never part of a cached response
+                retried = {"_retries": retries.count}
+                result = list(result) + [types.TextContent(type="text", text=json.dumps(retried, indent=2))]
+            if root is not None and tracing.timing_enabled():
+                timing = {"_timing": tracing.timing_report(root)}
+                result = list(result) + [types.TextContent(type="text", text=json.dumps(timing, indent=2))]
+            return result
+
+    async def _call_tool(
+        name: str, arguments: dict | None
+    ) -> list[types.TextContent | types.ImageContent | types.EmbeddedResource]:
         try:
+            if arguments is None and name in tools_server.ACCOUNTLESS_TOOLS:
+                arguments = {}
+
             if not isinstance(arguments, dict):
                 raise RuntimeError("arguments must be dictionary")
+
+            if name in tools_server.ACCOUNTLESS_TOOLS:
+                handler = tools_server.TOOL_HANDLERS[name]()
+                with tracing.span("tool.run"):
+                    return await asyncio.to_thread(handler.run_tool, arguments)
             
             if "__user_id__" not in arguments:
                 raise RuntimeError("__user_id__ argument is missing")
@@ -675,100 +1002,168 @@ async def main():
             user_id = arguments["__user_id__"]
             
             # Verify authentication
-            accounts = gauth.get_account_info()
+            with tracing.span("gauth.get_account_info"):
+                accounts = gauth.get_account_info()
             if user_id not in [a.email for a in accounts]:
                 raise RuntimeError(f"Account for email: {user_id} not specified in .accounts.json")
 
-            credentials = gauth.get_stored_credentials(user_id=user_id)
+            cached = toolcache.get(user_id, name, arguments)
+            if cached is not None:
+                return cached
+
+            with tracing.span("gauth.get_stored_credentials"):
+                credentials = gauth.get_stored_credentials(user_id=user_id)
             if not credentials:
                 raise RuntimeError(f"No credentials found for {user_id}. Please run: python auth_setup.py {user_id}")
             
             if credentials.access_token_expired:
                 logger.info("Access token expired, attempting refresh...")
                 try:
-                    user_info = gauth.get_user_info(credentials=credentials)
-                    gauth.store_credentials(credentials=credentials, user_id=user_id)
+                    # In a thread: the refresh may wait for another process's refresh and for the token endpoint
+                    with tracing.span("gauth.refresh_credentials"):
+                        await asyncio.to_thread(gauth.refresh_credentials, credentials=credentials, user_id=user_id)
                     logger.info(f"Successfully refreshed credentials for {user_id}")
                 except Exception as e:
                     logger.error(f"Failed to refresh credentials: {e}")
                     raise RuntimeError(f"Failed to refresh credentials for {user_id}: {e}")
 
-            # Handle different tools using registry
-            from .tools_calendar import (
-                ListCalendarsToolHandler, GetCalendarEventsToolHandler, 
-                CreateCalendarEventToolHandler, DeleteCalendarEventToolHandler,
-                UpdateCalendarEventToolHandler
-            )
-            from .tools_gmail import (
-                QueryEmailsToolHandler, GetEmailByIdToolHandler, 
-                CreateDraftToolHandler, DeleteDraftToolHandler,
-                ReplyEmailToolHandler, GetAttachmentToolHandler,
-                BulkGetEmailsByIdsToolHandler, BulkSaveAttachmentsToolHandler,
-                SendEmailToolHandler, ListDraftsToolHandler, GetUnreadEmailsToolHandler,
-                MarkEmailReadToolHandler, TrashEmailToolHandler, ListLabelsToolHandler,
-                CreateLabelToolHandler, ApplyLabelToolHandler, RemoveLabelToolHandler,
-                ArchiveEmailToolHandler, BatchArchiveEmailsToolHandler, 
-                ListArchivedEmailsToolHandler, RestoreEmailToInboxToolHandler, DeleteLabelToolHandler
-            )
-            
-            # Tool handler registry
-            tool_handlers = {
-                "list_calendars": ListCalendarsToolHandler,
-                "get_calendar_events": GetCalendarEventsToolHandler,
-                "create_calendar_event": CreateCalendarEventToolHandler,
-                "delete_calendar_event": DeleteCalendarEventToolHandler,
-                "update_calendar_event": UpdateCalendarEventToolHandler,
-                "query_emails": QueryEmailsToolHandler,
-                "get_email_by_id": GetEmailByIdToolHandler,
-                "create_draft": CreateDraftToolHandler,
-                "delete_draft": DeleteDraftToolHandler,
-                "reply_email": ReplyEmailToolHandler,
-                "get_attachment": GetAttachmentToolHandler,
-                "bulk_get_emails": BulkGetEmailsByIdsToolHandler,
-                "bulk_save_attachments": BulkSaveAttachmentsToolHandler,
-                # Step 2 additions
-                "send_email": SendEmailToolHandler,
-                "list_drafts": ListDraftsToolHandler,
-                "get_unread_emails": GetUnreadEmailsToolHandler,
-                # Advanced Gmail management tools
-                "mark_email_read": MarkEmailReadToolHandler,
-                "trash_email": TrashEmailToolHandler,
-                "list_labels": ListLabelsToolHandler,
-                "create_label": CreateLabelToolHandler,
-                "apply_label": ApplyLabelToolHandler,
-                "remove_label": RemoveLabelToolHandler,
-                "archive_email": ArchiveEmailToolHandler,
-                "batch_archive_emails": BatchArchiveEmailsToolHandler,
-                "list_archived_emails": ListArchivedEmailsToolHandler,
-                "restore_email_to_inbox": RestoreEmailToInboxToolHandler,
-                "delete_label": DeleteLabelToolHandler,
-            }
-            
-            if name in tool_handlers:
-                handler_class = tool_handlers[name]
-                handler = handler_class()
-                return handler.run_tool(arguments)
-            else:
+            if name not in TOOL_HANDLERS:
                 raise ValueError(f"Unknown tool: {name}")
+
+            generation = toolcache.generation(user_id, name)
+            try:
+                with toolcache.track_reads() as reads:
+                    if worker_pool is not None:
+                        with tracing.span("tool.run", worker=workers.shard(user_id, len(worker_pool.workers))):
+                            result = await worker_pool.call(user_id, name, arguments)
+                    else:
+                        handler_class = TOOL_HANDLERS[name]
+                        handler = handler_class()
+                        # Run in a worker thread so concurrent tool calls share the pooled transport
+                        # instead of blocking the event loop one after another.
+                        with tracing.span("tool.run"):
+                            result = await asyncio.to_thread(handler.run_tool, arguments)
+            finally:
+                # Also after a failed write, which may have been partly applied
+                toolcache.tool_called(user_id, name)
+            toolcache.put(user_id, name, arguments, result, generation, reads)
+            return result
                 
         except Exception as e:
             logger.error(traceback.format_exc())
             logger.error(f"Error during call_tool: {str(e)}")
             raise RuntimeError(f"Caught Exception. Error: {str(e)}")
 
+    def _resource_ref(uri: AnyUrl) -> resources.ResourceRef:
+        ref = resources.parse_uri(str(uri))
+        if ref is None:
+            raise ValueError(f"Unknown resource: {uri}")
+        if ref.account not in [a.email for a in accounts]:
+            raise RuntimeError(f"Account for email: {ref.account} not specified in .accounts.json")
+        return ref
+
+    @server.list_resources()
+    async def handle_list_resources() -> list[types.Resource]:
+        """List the change feed, inbox and today's primary calendar of every account."""
+        listed = []
+        for account in accounts:
+            listed.extend([
+                types.Resource(
+                    uri=AnyUrl(resources.changes_uri(account.email)),
+                    name=f"Mailbox changes of {account.email}",
+                    description="Messages added and deleted and labels changed since the watcher started, "
+                                "as seen by history.list. Read with ?since=<sequence> for only newer changes.",
+                    mimeType="application/json",
+                ),
+                types.Resource(
+                    uri=AnyUrl(resources.label_uri(account.email, "INBOX")),
+                    name=f"Inbox of {account.email}",
+                    description="Total and unread counts and the newest messages of the inbox",
+                    mimeType="application/json",
+                ),
+                types.Resource(
+                    uri=AnyUrl(resources.calendar_today_uri(account.email)),
+                    name=f"Today's events of {account.email}",
+                    description="Events of the primary calendar today",
+                    mimeType="application/json",
+                ),
+            ])
+        return listed
+
+    @server.list_resource_templates()
+    async def handle_list_resource_templates() -> list[types.ResourceTemplate]:
+        return [
+            types.ResourceTemplate(uriTemplate=template, name=name, description=description,
+                                   mimeType="application/json")
+            for template, name, description in resources.TEMPLATES
+        ]
+
+    @server.read_resource()
+    async def handle_read_resource(uri: AnyUrl) -> list[ReadResourceContents]:
+        """
+        Read a resource. Label, message and calendar resources are served from the
+        resource cache and carry an 'etag'; pass it as ?if_none_match=<etag> to get
+        a short not_modified answer if the resource did not change.
+        """
+        ref = _resource_ref(uri)
+        with metrics.track_tool("read_resource"):
+            with tracing.span("read_resource", kind=tracing.SPAN_KIND_SERVER, resource=ref.kind):
+                if ref.kind == resources.KIND_CHANGES:
+                    try:
+                        since = max(0, int(ref.params.get("since", 0)))
+                    except ValueError:
+                        raise RuntimeError(f"Invalid since sequence in {uri}")
+                    content = json.dumps(watcher.get_feed(ref.account).since(since), indent=2)
+                else:
+                    content = await asyncio.to_thread(resources.read, ref)
+        return [ReadResourceContents(content=content, mime_type="application/json")]
+
+    @server.subscribe_resource()
+    async def handle_subscribe_resource(uri: AnyUrl) -> None:
+        ref = _resource_ref(uri)
+        subscriptions.setdefault(ref.uri, set()).add(server.request_context.session)
+
+    @server.unsubscribe_resource()
+    async def handle_unsubscribe_resource(uri: AnyUrl) -> None:
+        ref = _resource_ref(uri)
+        subscribers = subscriptions.get(ref.uri)
+        if subscribers is not None:
+            subscribers.discard(server.request_context.session)
+            if not subscribers:
+                del subscriptions[ref.uri]
+
     # Start the server
     logger.info("Starting MCP GSuite server...")
+    metrics.start_exporters()
     
-    async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
-        await server.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="mcp-gsuite",
-                server_version="0.4.1",
-                capabilities=server.get_capabilities(
-                    notification_options=NotificationOptions(),
-                    experimental_capabilities={},
-                ),
-            ),
-        )
\ No newline at end of file
+    server_transport = server_http.get_server_transport()
+    watch_interval = watcher.get_watch_interval()
+    watch_task = None
+    try:
+        worker_count = workers.get_worker_count()
+        if worker_count > 0:
+            worker_pool = workers.WorkerPool(worker_count)
+        if watch_interval > 0:
+            watched = [a.email for a in accounts if gauth.get_stored_credentials(user_id=a.email)]
+            change_watcher = watcher.Watcher(
+                watched, _notify_resources_updated, interval=watch_interval, refresh=_refresh_subscribed_resources,
+                invalidate_stats=_invalidate_stats,
+            )
+            watch_task = asyncio.create_task(change_watcher.run())
+        if server_transport == server_http.TRANSPORT_STDIO:
+            async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
+                await server.run(read_stream, write_stream, server.create_initialization_options())
+        elif server_transport == server_http.TRANSPORT_UNIX:
+            await daemon.serve_unix(server, server.create_initialization_options())
+        else:
+            # One process serves every client, sharing clients, caches and rate limiters
+            await server_http.serve(server, server.create_initialization_options(), server_transport)
+    finally:
+        if watch_task is not None:
+            watch_task.cancel()
+        if worker_pool is not None:
+            worker_pool.close()
+        adaptive.save()
+        metrics.stop_exporters()
+        tracing.close()
+        transport.close_all()
\ No newline at end of file
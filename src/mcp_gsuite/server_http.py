@@ -0,0 +1,239 @@
+import argparse
+import contextlib
+import hmac
+import ipaddress
+import logging
+from urllib.parse import urlsplit
+
+from mcp.server.lowlevel import Server
+from mcp.server.models import InitializationOptions
+
+TRANSPORT_STDIO = "stdio"
+TRANSPORT_SSE = "sse"
+TRANSPORT_STREAMABLE_HTTP = "streamable-http"
+# Newline delimited JSON-RPC on the daemon's Unix domain socket, see daemon.py
+TRANSPORT_UNIX = "unix"
+TRANSPORTS = (TRANSPORT_STDIO, TRANSPORT_SSE, TRANSPORT_STREAMABLE_HTTP, TRANSPORT_UNIX)
+
+# Endpoints of the HTTP transports
+STREAMABLE_HTTP_PATH = "/mcp"
+SSE_PATH = "/sse"
+SSE_MESSAGES_PATH = "/messages/"
+
+# Host names that always reach a loopback address
+LOOPBACK_HOSTS = ("localhost", "127.0.0.1", "::1")
+# Binding to these listens on every interface, so they are never what clients send as Host
+WILDCARD_HOSTS = ("0.0.0.0", "::", "")
+
+
+def get_server_transport() -> str:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--transport",
+        type=str,
+        choices=TRANSPORTS,
+        default=TRANSPORT_STDIO,
+        help="How MCP clients connect: stdio (one client per process), streamable-http, sse or unix "
+             "(many clients per process)",
+    )
+    args, _ = parser.parse_known_args()
+    return args.transport
+
+
+def get_http_host() -> str:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--host",
+        type=str,
+        default="127.0.0.1",
+        help="Address the streamable-http and sse transports listen on; "
+             "other than loopback addresses require --http-token-file",
+    )
+    args, _ = parser.parse_known_args()
+    return args.host
+
+
+def get_http_port() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8000,
+        help="Port the streamable-http and sse transports listen on",
+    )
+    args, _ = parser.parse_known_args()
+    return args.port
+
+
+def get_http_token_file() -> str | None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--http-token-file",
+        type=str,
+        default=None,
+        help="File holding a bearer token that streamable-http and sse clients must send "
+             "(Authorization: Bearer <token>); required with a non-loopback --host",
+    )
+    args, _ = parser.parse_known_args()
+    return args.http_token_file
+
+
+def get_http_allowed_hosts() -> list[str]:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--http-allowed-hosts",
+        type=str,
+        default="",
+        help="Comma separated host names clients may use to reach the streamable-http and sse transports, "
+             "besides localhost and --host",
+    )
+    args, _ = parser.parse_known_args()
+    return [host.strip().lower() for host in args.http_allowed_hosts.split(",") if host.strip()]
+
+
+def read_http_token(path: str) -> str:
+    """The bearer token in a token file. Raises RuntimeError if the file is empty."""
+    with open(path) as f:
+        token = f.read().strip()
+    if not token:
+        raise RuntimeError(f"HTTP token file {path} is empty")
+    return token
+
+
+def is_loopback(host: str) -> bool:
+    host = host.strip("[]").lower()
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _hostname(value: str) -> str:
+    """Host name of a Host header value or an Origin, without port and IPv6 brackets."""
+    netloc = urlsplit(value if "://" in value else f"//{value}").hostname
+    return (netloc or "").lower()
+
+
+class AccessGuard():
+    """
+    ASGI middleware admitting only requests meant for this server and, with a token, authorized ones.
+
+    The Host header (and Origin, if sent) must name localhost, the bound
+    host or an allowed host, so that a web page cannot reach the server
+    through DNS rebinding. With a token, every request must carry it as a
+    bearer token.
+    """
+
+    def __init__(self, app, allowed_hosts: set[str], token: str | None):
+        self.app = app
+        self.allowed_hosts = allowed_hosts
+        self.token = token
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+        if _hostname(headers.get("host", "")) not in self.allowed_hosts:
+            return await _reject(send, 421, "Invalid Host header")
+        origin = headers.get("origin")
+        if origin and _hostname(origin) not in self.allowed_hosts:
+            return await _reject(send, 403, "Invalid Origin header")
+        if self.token is not None:
+            scheme, _, credentials = headers.get("authorization", "").partition(" ")
+            if scheme.lower() != "bearer" or not hmac.compare_digest(credentials.strip().encode(), self.token.encode()):
+                return await _reject(send, 401, "Missing or invalid bearer token",
+                                     [(b"www-authenticate", b"Bearer")])
+        return await self.app(scope, receive, send)
+
+
+async def _reject(send, status: int, message: str, headers: list | None = None):
+    body = message.encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"text/plain; charset=utf-8"),
+                    (b"content-length", str(len(body)).encode()), *(headers or [])],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def guard(app, host: str):
+    """
+    Wrap an HTTP transport app in an AccessGuard for the address it is served on.
+
+    Raises RuntimeError for a non-loopback host without --http-token-file, since
+    the server acts with the Google credentials of every configured account,
+    and for a wildcard host without --http-allowed-hosts.
+    """
+    token_file = get_http_token_file()
+    token = read_http_token(token_file) if token_file else None
+    if token is None and not is_loopback(host):
+        raise RuntimeError(f"Listening on the non-loopback address {host} requires --http-token-file")
+
+    allowed_hosts = set(LOOPBACK_HOSTS) | set(get_http_allowed_hosts())
+    if host.strip("[]") in WILDCARD_HOSTS:
+        if not get_http_allowed_hosts():
+            raise RuntimeError(f"Listening on {host or 'all interfaces'} requires --http-allowed-hosts "
+                               "naming the host names clients connect to")
+    else:
+        allowed_hosts.add(host.strip("[]").lower())
+    return AccessGuard(app, allowed_hosts, token)
+
+
+def build_app(server: Server, init_options: InitializationOptions, server_transport: str):
+    """
+    The ASGI app of an HTTP transport.
+
+    Every client gets its own MCP session, served by the same Server and
+    therefore the same process-wide service clients, connection pools,
+    caches and rate limiters.
+    """
+    from starlette.applications import Starlette
+    from starlette.responses import Response
+    from starlette.routing import Mount, Route
+
+    if server_transport == TRANSPORT_STREAMABLE_HTTP:
+        from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+
+        # Stateful sessions, so that clients can keep a stream open for resource notifications
+        session_manager = StreamableHTTPSessionManager(app=server)
+
+        @contextlib.asynccontextmanager
+        async def lifespan(app):
+            async with session_manager.run():
+                yield
+
+        return Starlette(routes=[Mount(STREAMABLE_HTTP_PATH, app=session_manager.handle_request)], lifespan=lifespan)
+
+    if server_transport == TRANSPORT_SSE:
+        from mcp.server.sse import SseServerTransport
+
+        sse = SseServerTransport(SSE_MESSAGES_PATH)
+
+        async def handle_sse(request):
+            async with sse.connect_sse(request.scope, request.receive, request._send) as (read_stream, write_stream):
+                await server.run(read_stream, write_stream, init_options)
+            return Response()
+
+        return Starlette(routes=[
+            Route(SSE_PATH, endpoint=handle_sse, methods=["GET"]),
+            Mount(SSE_MESSAGES_PATH, app=sse.handle_post_message),
+        ])
+
+    raise ValueError(f"Not an HTTP transport: {server_transport}")
+
+
+async def serve(server: Server, init_options: InitializationOptions, server_transport: str):
+    """Serve MCP clients over HTTP until the process is stopped."""
+    import uvicorn
+
+    host = get_http_host()
+    port = get_http_port()
+    path = STREAMABLE_HTTP_PATH if server_transport == TRANSPORT_STREAMABLE_HTTP else SSE_PATH
+    app = guard(build_app(server, init_options, server_transport), host)
+    logging.info(f"Serving MCP over {server_transport} on http://{host}:{port}{path}")
+    config = uvicorn.Config(app, host=host, port=port, log_level="info")
+    await uvicorn.Server(config).serve()
@@ -0,0 +1,109 @@
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+import anyio
+
+# How long the shim waits for a daemon it started to accept connections
+DAEMON_START_TIMEOUT = 30.0
+PROXY_CHUNK_BYTES = 64 * 1024
+
+# This module runs in every client's shim process, so it imports nothing heavy and a
+# shim connecting to a running daemon starts without loading the server.
+
+
+def get_use_daemon() -> bool:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--use-daemon",
+        action="store_true",
+        help="Relay stdio to the shared background server on --daemon-socket, starting it if it is not running",
+    )
+    args, _ = parser.parse_known_args()
+    return args.use_daemon
+
+
+def get_daemon_socket() -> str:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--daemon-socket",
+        type=str,
+        default=None,
+        help="Unix domain socket of the shared background server",
+    )
+    # Read like gauth.get_credentials_dir(), which would import the Google client libraries
+    parser.add_argument("--credentials-dir", type=str, default=".")
+    args, _ = parser.parse_known_args()
+    return args.daemon_socket or os.path.join(args.credentials_dir, ".mcp-gsuite.sock")
+
+
+async def connect(path: str) -> anyio.abc.ByteStream | None:
+    try:
+        return await anyio.connect_unix(path)
+    except OSError:
+        return None
+
+
+def spawn_daemon(argv: list[str]) -> subprocess.Popen:
+    """Start the daemon in its own session with the shim's options, logging to a file next to its socket."""
+    args = [arg for arg in argv if arg != "--use-daemon"] + ["--transport", "unix"]
+    log_path = f"{get_daemon_socket()}.log"
+    with open(log_path, "ab") as log:
+        return subprocess.Popen(
+            [sys.executable, "-m", "mcp_gsuite", *args],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=log,
+            start_new_session=True,
+        )
+
+
+async def connect_or_spawn(argv: list[str]) -> anyio.abc.ByteStream:
+    """Connect to the daemon, starting it first if nothing listens on its socket."""
+    path = get_daemon_socket()
+    stream = await connect(path)
+    if stream is not None:
+        return stream
+
+    process = spawn_daemon(argv)
+    deadline = time.monotonic() + DAEMON_START_TIMEOUT
+    while time.monotonic() < deadline:
+        await anyio.sleep(0.05)
+        stream = await connect(path)
+        if stream is not None:
+            return stream
+        # Lost a race with another shim's daemon, which keeps the socket; keep trying to connect to that one
+        if process.poll() is not None and not os.path.exists(path):
+            raise RuntimeError(f"The daemon exited with status {process.returncode}, see {path}.log")
+    raise RuntimeError(f"The daemon did not listen on {path} within {DAEMON_START_TIMEOUT:g}s, see {path}.log")
+
+
+async def run_shim(argv: list[str]):
+    """Relay this process' stdio to a daemon session byte for byte until either side closes."""
+    stream = await connect_or_spawn(argv)
+    stdin = anyio.wrap_file(sys.stdin.buffer)
+    stdout = anyio.wrap_file(sys.stdout.buffer)
+
+    async with stream, anyio.create_task_group() as tg:
+        async def client_to_daemon():
+            while True:
+                data = await stdin.read1(PROXY_CHUNK_BYTES)
+                if not data:
+                    break
+                await stream.send(data)
+            # Let the daemon finish answering, then close its session
+            await stream.send_eof()
+
+        async def daemon_to_client():
+            try:
+                async for data in stream:
+                    await stdout.write(data)
+                    await stdout.flush()
+            except anyio.BrokenResourceError:
+                pass
+            tg.cancel_scope.cancel()
+
+        tg.start_soon(client_to_daemon)
+        tg.start_soon(daemon_to_client)
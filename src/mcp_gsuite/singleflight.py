@@ -0,0 +1,94 @@
+import copy
+import functools
+import inspect
+import json
+import threading
+
+from . import metrics
+from . import toolcache
+
+
+class _Call():
+    """An upstream call in flight, whose outcome identical calls wait for."""
+
+    __slots__ = ('done', 'result', 'error', 'failed_read', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+        # The result is a fallback for a failed read, see toolcache.record_failed_read()
+        self.failed_read = False
+        self.waiters = 0
+
+
+_in_flight: dict[tuple[str, str, str], _Call] = {}
+_in_flight_lock = threading.Lock()
+
+
+def _arguments_key(signature: inspect.Signature, args: tuple, kwargs: dict) -> str:
+    """The call's arguments with defaults filled in, so that f(x) and f(x, limit=100) are the same call."""
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    arguments = dict(bound.arguments)
+    arguments.pop('self', None)
+    return json.dumps(arguments, sort_keys=True, default=repr)
+
+
+def coalesced(name: str):
+    """
+    Decorator for read-only service methods: identical calls of one account share one upstream call.
+
+    A call made while an identical one (same account, method and arguments
+    after defaults) is running waits for it and returns a copy of its
+    result, or raises its exception, instead of calling Google again. Only
+    calls that overlap are coalesced; nothing is kept once a call returns.
+    The decorated method's instance must have a user_id.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            try:
+                key = (self.user_id, name, _arguments_key(signature, (self, *args), kwargs))
+            except TypeError:
+                return func(self, *args, **kwargs)
+
+            with _in_flight_lock:
+                call = _in_flight.get(key)
+                leader = call is None
+                if leader:
+                    call = _Call()
+                    _in_flight[key] = call
+                else:
+                    call.waiters += 1
+            metrics.record_singleflight(name, coalesced=not leader)
+
+            if not leader:
+                call.done.wait()
+                if call.error is not None:
+                    raise call.error
+                if call.failed_read:
+                    toolcache.record_failed_read()
+                # Callers may change their result, e.g. to add fields
+                return copy.deepcopy(call.result)
+
+            try:
+                with toolcache.track_reads() as reads:
+                    result = func(self, *args, **kwargs)
+                call.failed_read = reads.failed
+            except BaseException as e:
+                call.error = e
+                raise
+            finally:
+                with _in_flight_lock:
+                    del _in_flight[key]
+                    waiters = call.waiters
+                if waiters and call.error is None:
+                    # Taken before the leader's caller can change the result
+                    call.result = copy.deepcopy(result)
+                call.done.set()
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,269 @@
+import argparse
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from . import metrics
+
+# What a read-only tool's response depends on; writes drop the cached responses of the scopes they change
+SCOPE_GMAIL_LABELS = "gmail_labels"
+SCOPE_GMAIL_MESSAGES = "gmail_messages"
+SCOPE_GMAIL_DRAFTS = "gmail_drafts"
+SCOPE_CALENDAR = "calendar"
+
+# Read-only tools whose responses may be cached, with the scopes they read
+CACHEABLE_TOOLS = {
+    "list_labels": {SCOPE_GMAIL_LABELS},
+    "query_emails": {SCOPE_GMAIL_MESSAGES, SCOPE_GMAIL_LABELS},
+    "get_email_by_id": {SCOPE_GMAIL_MESSAGES},
+    "get_email_body": {SCOPE_GMAIL_MESSAGES},
+    "get_gmail_thread": {SCOPE_GMAIL_MESSAGES},
+    "get_unread_emails": {SCOPE_GMAIL_MESSAGES},
+    "list_archived_emails": {SCOPE_GMAIL_MESSAGES},
+    "list_drafts": {SCOPE_GMAIL_DRAFTS},
+    "list_calendars": {SCOPE_CALENDAR},
+    "get_calendar_events": {SCOPE_CALENDAR},
+}
+
+# Seconds a response is cached unless the policy file says otherwise; other cacheable tools are not cached
+DEFAULT_TTLS = {
+    "list_labels": 300.0,
+    "list_calendars": 300.0,
+    "get_calendar_events": 60.0,
+    "query_emails": 30.0,
+}
+
+# The scopes every mutating tool changes
+INVALIDATES = {
+    "create_label": {SCOPE_GMAIL_LABELS, SCOPE_GMAIL_MESSAGES},
+    "delete_label": {SCOPE_GMAIL_LABELS, SCOPE_GMAIL_MESSAGES},
+    "apply_label": {SCOPE_GMAIL_MESSAGES},
+    "remove_label": {SCOPE_GMAIL_MESSAGES},
+    "archive_email": {SCOPE_GMAIL_MESSAGES},
+    "batch_archive_emails": {SCOPE_GMAIL_MESSAGES},
+    "restore_email_to_inbox": {SCOPE_GMAIL_MESSAGES},
+    "mark_email_read": {SCOPE_GMAIL_MESSAGES},
+    "trash_email": {SCOPE_GMAIL_MESSAGES},
+    "send_email": {SCOPE_GMAIL_MESSAGES},
+    "reply_email": {SCOPE_GMAIL_MESSAGES, SCOPE_GMAIL_DRAFTS},
+    "create_draft": {SCOPE_GMAIL_MESSAGES, SCOPE_GMAIL_DRAFTS},
+    "delete_draft": {SCOPE_GMAIL_MESSAGES, SCOPE_GMAIL_DRAFTS},
+    "mail_merge": {SCOPE_GMAIL_MESSAGES, SCOPE_GMAIL_DRAFTS},
+    "create_calendar_event": {SCOPE_CALENDAR},
+    "update_calendar_event": {SCOPE_CALENDAR},
+    "delete_calendar_event": {SCOPE_CALENDAR},
+}
+
+# Total size of the cached responses, in characters of text content
+CACHE_MAX_CHARS = 32 * 1024 * 1024
+
+
+def get_tool_cache_config() -> str:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--tool-cache-config",
+        type=str,
+        default="./.tool-cache.json",
+        help="Path to the per-tool response cache policy, e.g. {\"query_emails\": {\"ttl\": 60}} "
+             "(ttl 0 disables caching of a tool)",
+    )
+    args, _ = parser.parse_known_args()
+    return args.tool_cache_config
+
+
+def load_policies(path: str) -> dict[str, float]:
+    """
+    Response TTL of every cached tool: the defaults, overridden by the policy file if it exists.
+
+    Tools that are not read-only and invalid TTLs are ignored with a warning.
+    """
+    ttls = dict(DEFAULT_TTLS)
+    if not os.path.exists(path):
+        return ttls
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring tool cache policy {path}: {str(e)}")
+        return ttls
+
+    for tool, policy in data.items():
+        if tool not in CACHEABLE_TOOLS:
+            logging.warning(f"Ignoring tool cache policy of {tool}: not a cacheable read-only tool")
+            continue
+        ttl = policy.get("ttl") if isinstance(policy, dict) else None
+        if not isinstance(ttl, (int, float)) or ttl < 0:
+            logging.warning(f"Ignoring tool cache policy of {tool}: ttl must be a number of seconds >= 0")
+            continue
+        ttls[tool] = float(ttl)
+    return {tool: ttl for tool, ttl in ttls.items() if ttl > 0}
+
+
+_policies: dict[str, float] | None = None
+_policies_lock = threading.Lock()
+
+
+def get_policies() -> dict[str, float]:
+    global _policies
+    with _policies_lock:
+        if _policies is None:
+            _policies = load_policies(get_tool_cache_config())
+            logging.info(f"Tool response cache TTLs: {_policies}")
+        return _policies
+
+
+class ReadOutcome():
+    """Whether a read of a tool call failed and was answered with a fallback such as [] or None."""
+
+    __slots__ = ('failed', 'parent')
+
+    def __init__(self, parent: "ReadOutcome | None"):
+        self.failed = False
+        self.parent = parent
+
+
+_reads: contextvars.ContextVar["ReadOutcome | None"] = contextvars.ContextVar("mcp_gsuite_reads", default=None)
+
+
+@contextlib.contextmanager
+def track_reads():
+    """
+    Track the reads made inside, including in threads started with a copy of the context.
+
+    Failures are passed on to an enclosing track_reads(), so a nested one
+    (e.g. of a coalesced call) can tell its own failures apart.
+    """
+    outcome = ReadOutcome(_reads.get())
+    token = _reads.set(outcome)
+    try:
+        yield outcome
+    finally:
+        _reads.reset(token)
+        if outcome.failed and outcome.parent is not None:
+            outcome.parent.failed = True
+
+
+def record_failed_read():
+    """Called by services and handlers that answer a failed read with a fallback value instead of raising."""
+    outcome = _reads.get()
+    if outcome is not None:
+        outcome.failed = True
+
+
+def _is_error(result: list) -> bool:
+    """Whether a tool response is an error answer, e.g. {"status": "error", ...}."""
+    for content in result:
+        text = getattr(content, "text", None)
+        if not text or not text.lstrip().startswith("{") or '"status": "error"' not in text:
+            continue
+        try:
+            data = json.loads(text)
+        except ValueError:
+            continue
+        if isinstance(data, dict) and data.get("status") == "error":
+            return True
+    return False
+
+
+class CachedResponse():
+    __slots__ = ('result', 'scopes', 'size', 'expires')
+
+    def __init__(self, result: list, scopes: set[str], ttl: float):
+        self.result = result
+        self.scopes = scopes
+        self.size = sum(len(getattr(content, "text", "") or "") for content in result)
+        self.expires = time.monotonic() + ttl
+
+
+# Responses by (account, tool, arguments), least recently used first
+_cache: OrderedDict[tuple[str, str, str], CachedResponse] = OrderedDict()
+_cache_chars = 0
+# Bumped by every invalidation of an account's scope, see generation()
+_generations: dict[tuple[str, str], int] = {}
+_cache_lock = threading.Lock()
+
+
+def _key(user_id: str, tool: str, arguments: dict) -> tuple[str, str, str]:
+    return (user_id, tool, json.dumps(arguments, sort_keys=True, default=repr))
+
+
+def _drop(key: tuple[str, str, str]):
+    global _cache_chars
+    entry = _cache.pop(key)
+    _cache_chars -= entry.size
+
+
+def get(user_id: str, tool: str, arguments: dict) -> list | None:
+    """The cached response of a tool call, or None if the tool is not cached or the response expired."""
+    if tool not in get_policies():
+        return None
+    key = _key(user_id, tool, arguments)
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None and entry.expires <= time.monotonic():
+            _drop(key)
+            entry = None
+        if entry is not None:
+            _cache.move_to_end(key)
+    metrics.record_cache(f"tool.{tool}", hit=entry is not None)
+    return entry.result if entry is not None else None
+
+
+def generation(user_id: str, tool: str) -> tuple:
+    """
+    Invalidation state of the scopes a tool reads, taken before running the tool.
+
+    put() only caches a response if no write invalidated these scopes while it was fetched.
+    """
+    scopes = CACHEABLE_TOOLS.get(tool, ())
+    with _cache_lock:
+        return tuple(_generations.get((user_id, scope), 0) for scope in sorted(scopes))
+
+
+def put(user_id: str, tool: str, arguments: dict, result: list, started: tuple, reads: ReadOutcome):
+    """
+    Cache a tool call's response, fetched with the generation() taken before the call.
+
+    Responses of calls with failed reads and error answers are not cached.
+    """
+    global _cache_chars
+    ttl = get_policies().get(tool)
+    if not ttl or reads.failed or _is_error(result):
+        return
+    entry = CachedResponse(result, CACHEABLE_TOOLS[tool], ttl)
+    if entry.size > CACHE_MAX_CHARS // 4:
+        return
+    key = _key(user_id, tool, arguments)
+    with _cache_lock:
+        current = tuple(_generations.get((user_id, scope), 0) for scope in sorted(entry.scopes))
+        if current != started:
+            # A write changed what the response was read from while it was fetched
+            return
+        if key in _cache:
+            _drop(key)
+        _cache[key] = entry
+        _cache_chars += entry.size
+        while _cache_chars > CACHE_MAX_CHARS:
+            _drop(next(iter(_cache)))
+
+
+def invalidate(user_id: str, scopes: set[str]):
+    """Drop an account's cached responses that read any of the scopes."""
+    with _cache_lock:
+        for scope in scopes:
+            _generations[(user_id, scope)] = _generations.get((user_id, scope), 0) + 1
+        stale = [key for key, entry in _cache.items() if key[0] == user_id and entry.scopes & scopes]
+        for key in stale:
+            _drop(key)
+
+
+def tool_called(user_id: str, tool: str):
+    """Write-through invalidation: drop the responses a call of a mutating tool may have changed."""
+    scopes = INVALIDATES.get(tool)
+    if scopes:
+        invalidate(user_id, scopes)
@@ -9,6 +9,9 @@ from mcp.types import (
 from . import gmail
 import json
 from . import toolhandler
+from . import mime
+from . import mailmerge
+from . import toolcache
 import base64
 
 def decode_base64_data(file_data):
@@ -18,6 +21,115 @@ def decode_base64_data(file_data):
         standard_base64_data += '=' * (4 - missing_padding)
     return base64.b64decode(standard_base64_data, validate=True)
 
+BODY_MODE_SCHEMA = {
+    "type": "string",
+    "enum": list(mime.BODY_MODES),
+    "description": """How much of each message body to return:
+        - 'none': no body and no snippet
+        - 'snippet': only the short snippet Gmail provides
+        - 'truncated': at most max_body_chars characters; truncated bodies have body_truncated and body_next_offset, see the get_email_body tool
+        - 'full': the whole body (default, unless max_body_chars is given)"""
+}
+
+DRAFT_BODY_MODE_SCHEMA = {
+    "type": "string",
+    "enum": list(mime.BODY_MODES),
+    "description": """How much of each draft body to return:
+        - 'none': headers only
+        - 'snippet': headers and the short snippet Gmail provides (default, unless max_body_chars is given); drafts are fetched without their MIME parts
+        - 'truncated': at most max_body_chars characters; truncated bodies have body_truncated and body_next_offset, see the get_email_body tool
+        - 'full': the whole body"""
+}
+
+PAGE_TOKEN_SCHEMA = {
+    "type": "string",
+    "description": "next_page_token of the previous call, to continue the listing"
+}
+
+MAX_BODY_CHARS_SCHEMA = {
+    "type": "integer",
+    "description": f"Maximum body length in characters for body_mode 'truncated' (default: {mime.DEFAULT_MAX_BODY_CHARS})",
+    "minimum": 0
+}
+
+NORMALIZE_BODY_SCHEMA = {
+    "type": "boolean",
+    "description": "Return bodies as compact readable text: HTML converted to text, quoted replies, signatures and extra whitespace removed (default: false)",
+    "default": False
+}
+
+LABEL_NAME_SCHEMA = {
+    "type": "string",
+    "description": "The name of the label, e.g. 'Work/Projects', instead of label_id; resolved from a cached label index"
+}
+
+def get_label_arg(gmail_service: gmail.GmailService, args: dict) -> str:
+    """The label_id argument, or the ID of the label named by label_name."""
+    if args.get("label_id"):
+        return args["label_id"]
+    name = args.get("label_name")
+    if not name:
+        raise RuntimeError("Missing required argument: label_id or label_name")
+    label_id = gmail_service.get_label_id(name)
+    if label_id is None:
+        raise RuntimeError(f"No label named '{name}'")
+    return label_id
+
+MAIL_MERGE_PROPERTIES = {
+    "subject_template": {
+        "type": "string",
+        "description": "Subject with $field or ${field} placeholders filled from each recipient ($$ for a literal $)"
+    },
+    "body_template": {
+        "type": "string",
+        "description": "Plain text body with $field or ${field} placeholders filled from each recipient"
+    },
+    "recipients": {
+        "type": "array",
+        "items": {
+            "type": "object",
+            "properties": {
+                "to": {"type": "string", "description": "Recipient email address, also available as $to"},
+                "cc": {"type": "string", "description": "CC recipients (comma-separated)"}
+            },
+            "required": ["to"],
+            "additionalProperties": True
+        },
+        "description": "One object per message: 'to', an optional 'cc' and the fields used by the templates"
+    },
+    "mode": {
+        "type": "string",
+        "enum": list(mailmerge.MODES),
+        "description": "'send' to send the messages, 'draft' to save them as drafts (default: 'send')"
+    },
+    "job_id": {
+        "type": "string",
+        "description": "Job to resume. By default it is derived from the templates and recipients, so repeating a call resumes it"
+    },
+    "max_messages": {
+        "type": "integer",
+        "description": "Submit at most this many messages in this call; call again to continue",
+        "minimum": 1
+    },
+    "retry_unknown": {
+        "type": "boolean",
+        "description": "Also submit recipients whose earlier attempt has an unknown outcome; they may receive the message twice (default: false)",
+        "default": False
+    },
+    "dry_run": {
+        "type": "boolean",
+        "description": "Only render the messages and report what would be submitted (default: false)",
+        "default": False
+    }
+}
+
+def get_body_args(args: dict, default: str = 'full') -> tuple[str, int | None]:
+    """The body_mode and max_body_chars tool arguments, validated; body_mode default applies without either."""
+    try:
+        return mime.resolve_body_mode(args.get("body_mode"), args.get("max_body_chars"), default=default)
+    except ValueError as e:
+        raise RuntimeError(str(e))
+
 class QueryEmailsToolHandler(toolhandler.ToolHandler):
     def __init__(self):
         super().__init__("query_gmail_emails")
@@ -89,7 +201,8 @@ class GetEmailByIdToolHandler(toolhandler.ToolHandler):
                     "email_id": {
                         "type": "string",
                         "description": "The ID of the Gmail message to retrieve"
-                    }
+                    },
+                    "normalize_body": NORMALIZE_BODY_SCHEMA
                 },
                 "required": ["email_id", toolhandler.USER_ID_ARG]
             }
@@ -103,9 +216,12 @@ class GetEmailByIdToolHandler(toolhandler.ToolHandler):
         if not user_id:
             raise RuntimeError(f"Missing required argument: {toolhandler.USER_ID_ARG}")
         gmail_service = gmail.GmailService(user_id=user_id)
-        email, attachments = gmail_service.get_email_by_id_with_attachments(args["email_id"])
+        email, attachments = gmail_service.get_email_by_id_with_attachments(
+            args["email_id"], normalize_body=args.get("normalize_body", False)
+        )
 
         if email is None:
+            toolcache.record_failed_read()
             return [
                 TextContent(
                     type="text",
@@ -140,7 +256,10 @@ class BulkGetEmailsByIdsToolHandler(toolhandler.ToolHandler):
                             "type": "string"
                         },
                         "description": "List of Gmail message IDs to retrieve"
-                    }
+                    },
+                    "body_mode": BODY_MODE_SCHEMA,
+                    "max_body_chars": MAX_BODY_CHARS_SCHEMA,
+                    "normalize_body": NORMALIZE_BODY_SCHEMA
                 },
                 "required": ["email_ids", toolhandler.USER_ID_ARG]
             }
@@ -153,11 +272,15 @@ class BulkGetEmailsByIdsToolHandler(toolhandler.ToolHandler):
         user_id = args.get(toolhandler.USER_ID_ARG)
         if not user_id:
             raise RuntimeError(f"Missing required argument: {toolhandler.USER_ID_ARG}")
+        body_mode, max_body_chars = get_body_args(args)
         gmail_service = gmail.GmailService(user_id=user_id)
         
         results = []
         for email_id in args["email_ids"]:
-            email, attachments = gmail_service.get_email_by_id_with_attachments(email_id)
+            email, attachments = gmail_service.get_email_by_id_with_attachments(
+                email_id, body_mode=body_mode, max_body_chars=max_body_chars,
+                normalize_body=args.get("normalize_body", False)
+            )
             if email is not None:
                 email["attachments"] = attachments
                 results.append(email)
@@ -177,6 +300,139 @@ class BulkGetEmailsByIdsToolHandler(toolhandler.ToolHandler):
             )
         ]
 
+class GetEmailBodyToolHandler(toolhandler.ToolHandler):
+    def __init__(self):
+        super().__init__("get_gmail_email_body")
+
+    def get_tool_description(self) -> Tool:
+        return Tool(
+            name=self.name,
+            description="""Retrieves part of a Gmail message body by character offset.
+            Use it to read the rest of a body returned with body_truncated, starting at its body_next_offset.""",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "__user_id__": self.get_user_id_arg_schema(),
+                    "email_id": {
+                        "type": "string",
+                        "description": "The ID of the Gmail message"
+                    },
+                    "offset": {
+                        "type": "integer",
+                        "description": "Character offset to start at (default: 0)",
+                        "minimum": 0,
+                        "default": 0
+                    },
+                    "max_chars": {
+                        "type": "integer",
+                        "description": f"Maximum number of characters to return (default: {mime.DEFAULT_MAX_BODY_CHARS})",
+                        "minimum": 1,
+                        "default": mime.DEFAULT_MAX_BODY_CHARS
+                    },
+                    "normalize_body": {
+                        **NORMALIZE_BODY_SCHEMA,
+                        "description": "Read the normalized body; pass the same value as in the call that truncated it (default: false)"
+                    }
+                },
+                "required": ["email_id", toolhandler.USER_ID_ARG]
+            }
+        )
+
+    def run_tool(self, args: dict) -> Sequence[TextContent | ImageContent | EmbeddedResource]:
+        if "email_id" not in args:
+            raise RuntimeError("Missing required argument: email_id")
+
+        user_id = args.get(toolhandler.USER_ID_ARG)
+        if not user_id:
+            raise RuntimeError(f"Missing required argument: {toolhandler.USER_ID_ARG}")
+
+        offset = args.get("offset", 0)
+        max_chars = args.get("max_chars", mime.DEFAULT_MAX_BODY_CHARS)
+        if offset < 0 or max_chars < 1:
+            raise RuntimeError("offset must not be negative and max_chars must be positive")
+
+        gmail_service = gmail.GmailService(user_id=user_id)
+        body = gmail_service.get_email_body(
+            args["email_id"], offset=offset, max_chars=max_chars, normalize_body=args.get("normalize_body", False)
+        )
+
+        if body is None:
+            toolcache.record_failed_read()
+            return [
+                TextContent(
+                    type="text",
+                    text=f"Failed to retrieve body of email with ID: {args['email_id']}"
+                )
+            ]
+
+        return [
+            TextContent(
+                type="text",
+                text=json.dumps(body, indent=2)
+            )
+        ]
+
+class GetThreadToolHandler(toolhandler.ToolHandler):
+    def __init__(self):
+        super().__init__("get_gmail_thread")
+
+    def get_tool_description(self) -> Tool:
+        return Tool(
+            name=self.name,
+            description="""Retrieves a whole Gmail conversation by its thread ID in one request, oldest message first.
+            Use it instead of fetching each message of a threadId separately.""",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "__user_id__": self.get_user_id_arg_schema(),
+                    "thread_id": {
+                        "type": "string",
+                        "description": "The thread ID (threadId of any of its messages)"
+                    },
+                    "body_mode": BODY_MODE_SCHEMA,
+                    "max_body_chars": MAX_BODY_CHARS_SCHEMA,
+                    "normalize_body": NORMALIZE_BODY_SCHEMA,
+                    "collapse_quotes": {
+                        "type": "boolean",
+                        "description": "Remove text that repeats earlier messages of the thread, such as quoted replies; get_email_body continues a truncated collapsed body from body_next_offset in the uncollapsed body (default: false)",
+                        "default": False
+                    }
+                },
+                "required": ["thread_id", toolhandler.USER_ID_ARG]
+            }
+        )
+
+    def run_tool(self, args: dict) -> Sequence[TextContent | ImageContent | EmbeddedResource]:
+        if "thread_id" not in args:
+            raise RuntimeError("Missing required argument: thread_id")
+
+        user_id = args.get(toolhandler.USER_ID_ARG)
+        if not user_id:
+            raise RuntimeError(f"Missing required argument: {toolhandler.USER_ID_ARG}")
+
+        body_mode, max_body_chars = get_body_args(args)
+        gmail_service = gmail.GmailService(user_id=user_id)
+        thread = gmail_service.get_thread(
+            args["thread_id"], body_mode=body_mode, max_body_chars=max_body_chars,
+            normalize_body=args.get("normalize_body", False), collapse_quotes=args.get("collapse_quotes", False)
+        )
+
+        if thread is None:
+            toolcache.record_failed_read()
+            return [
+                TextContent(
+                    type="text",
+                    text=f"Failed to retrieve thread with ID: {args['thread_id']}"
+                )
+            ]
+
+        return [
+            TextContent(
+                type="text",
+                text=json.dumps(thread, indent=2)
+            )
+        ]
+
 class CreateDraftToolHandler(toolhandler.ToolHandler):
     def __init__(self):
         super().__init__("create_gmail_draft")
@@ -502,12 +758,23 @@ class BulkSaveAttachmentsToolHandler(toolhandler.ToolHandler):
         gmail_service = gmail.GmailService(user_id=user_id)
         results = []
 
+        # Look up each message once, then download all attachments in batches
+        messages = {}
+        attachment_ids = []
         for attachment_info in args["attachments"]:
-            # get attachment data from message_id and part_id
-            message, attachments = gmail_service.get_email_by_id_with_attachments(
-                attachment_info["message_id"]
-            )
-            if message is None:
+            message_id = attachment_info["message_id"]
+            if message_id not in messages:
+                messages[message_id] = gmail_service.get_email_by_id_with_attachments(message_id)
+            message, attachments = messages[message_id]
+            if message is not None:
+                # get attachment_id from part_id
+                attachment_ids.append((message_id, attachments[attachment_info["part_id"]]["attachmentId"]))
+            else:
+                attachment_ids.append(None)
+        downloads = gmail_service.get_attachments([key for key in attachment_ids if key is not None])
+
+        for attachment_info, key in zip(args["attachments"], attachment_ids):
+            if key is None:
                 results.append(
                     TextContent(
                         type="text",
@@ -515,17 +782,12 @@ class BulkSaveAttachmentsToolHandler(toolhandler.ToolHandler):
                     )
                 )
                 continue
-            # get attachment_id from part_id
-            attachment_id = attachments[attachment_info["part_id"]]["attachmentId"]
-            attachment_data = gmail_service.get_attachment(
-                attachment_info["message_id"], 
-                attachment_id
-            )
+            attachment_data = downloads.get(key)
             if attachment_data is None:
                 results.append(
                     TextContent(
                         type="text",
-                        text=f"Failed to retrieve attachment with ID: {attachment_id} from message: {attachment_info['message_id']}"
+                        text=f"Failed to retrieve attachment with ID: {key[1]} from message: {attachment_info['message_id']}"
                     )
                 )
                 continue
@@ -610,6 +872,110 @@ class SendEmailToolHandler(toolhandler.ToolHandler):
             )
         ]
 
+class MailMergeToolHandler(toolhandler.ToolHandler):
+    def __init__(self):
+        super().__init__("mail_merge_gmail")
+
+    def get_tool_description(self) -> Tool:
+        return Tool(
+            name=self.name,
+            description="""Sends, or saves as drafts, one personalized email per recipient from a subject and body template.
+            Messages are submitted in batches within the account's API quota and daily sending limit; recipients over the limit are deferred.
+            The job is journaled per recipient: repeat the same call (or pass job_id) to resume it without sending anything twice,
+            and use get_mail_merge_status to follow a running job.""",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "__user_id__": self.get_user_id_arg_schema(),
+                    **MAIL_MERGE_PROPERTIES
+                },
+                "required": ["subject_template", "body_template", "recipients", toolhandler.USER_ID_ARG]
+            }
+        )
+
+    def run_tool(self, args: dict) -> Sequence[TextContent | ImageContent | EmbeddedResource]:
+        for arg in ("subject_template", "body_template", "recipients"):
+            if arg not in args:
+                raise RuntimeError(f"Missing required argument: {arg}")
+        if not isinstance(args["recipients"], list) or not args["recipients"]:
+            raise RuntimeError("recipients must be a non-empty list")
+        mode = args.get("mode", mailmerge.MODE_SEND)
+        if mode not in mailmerge.MODES:
+            raise RuntimeError(f"mode must be one of {', '.join(mailmerge.MODES)}, got {mode!r}")
+
+        user_id = args.get(toolhandler.USER_ID_ARG)
+        if not user_id:
+            raise RuntimeError(f"Missing required argument: {toolhandler.USER_ID_ARG}")
+
+        gmail_service = gmail.GmailService(user_id=user_id)
+        result = gmail_service.mail_merge(
+            subject_template=args["subject_template"],
+            body_template=args["body_template"],
+            recipients=args["recipients"],
+            mode=mode,
+            job_id=args.get("job_id"),
+            max_messages=args.get("max_messages"),
+            retry_unknown=args.get("retry_unknown", False),
+            dry_run=args.get("dry_run", False)
+        )
+
+        return [
+            TextContent(
+                type="text",
+                text=json.dumps(result, indent=2)
+            )
+        ]
+
+class GetMailMergeStatusToolHandler(toolhandler.ToolHandler):
+    def __init__(self):
+        super().__init__("get_mail_merge_status")
+
+    def get_tool_description(self) -> Tool:
+        return Tool(
+            name=self.name,
+            description="Shows the progress of a mail merge job, also while it is running: recipients per status and the remaining daily sending budget.",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "__user_id__": self.get_user_id_arg_schema(),
+                    "job_id": {
+                        "type": "string",
+                        "description": "The job_id returned by mail_merge_gmail"
+                    },
+                    "include_results": {
+                        "type": "boolean",
+                        "description": "Include the latest state of every recipient (default: false)",
+                        "default": False
+                    }
+                },
+                "required": ["job_id", toolhandler.USER_ID_ARG]
+            }
+        )
+
+    def run_tool(self, args: dict) -> Sequence[TextContent | ImageContent | EmbeddedResource]:
+        if "job_id" not in args:
+            raise RuntimeError("Missing required argument: job_id")
+
+        user_id = args.get(toolhandler.USER_ID_ARG)
+        if not user_id:
+            raise RuntimeError(f"Missing required argument: {toolhandler.USER_ID_ARG}")
+
+        status = mailmerge.job_status(user_id, args["job_id"], include_results=args.get("include_results", False))
+        if status is None:
+            return [
+                TextContent(
+                    type="text",
+                    text=f"No mail merge job with ID: {args['job_id']}"
+                )
+            ]
+
+        return [
+            TextContent(
+                type="text",
+                text=json.dumps(status, indent=2)
+            )
+        ]
+
 class ListDraftsToolHandler(toolhandler.ToolHandler):
     def __init__(self):
         super().__init__("list_gmail_drafts")
@@ -617,7 +983,8 @@ class ListDraftsToolHandler(toolhandler.ToolHandler):
     def get_tool_description(self) -> Tool:
         return Tool(
             name=self.name,
-            description="List all draft emails in Gmail",
+            description="""List draft emails in Gmail: headers and snippet by default, bodies on request.
+            Returns the drafts and, if there are more, a next_page_token to pass as page_token.""",
             inputSchema={
                 "type": "object",
                 "properties": {
@@ -626,7 +993,11 @@ class ListDraftsToolHandler(toolhandler.ToolHandler):
                         "type": "integer",
                         "description": "Maximum number of drafts to return",
                         "default": 50
-                    }
+                    },
+                    "page_token": PAGE_TOKEN_SCHEMA,
+                    "body_mode": DRAFT_BODY_MODE_SCHEMA,
+                    "max_body_chars": MAX_BODY_CHARS_SCHEMA,
+                    "normalize_body": NORMALIZE_BODY_SCHEMA
                 },
                 "required": [toolhandler.USER_ID_ARG]
             }
@@ -637,9 +1008,13 @@ class ListDraftsToolHandler(toolhandler.ToolHandler):
         if not user_id:
             raise RuntimeError(f"Missing required argument: {toolhandler.USER_ID_ARG}")
         
+        body_mode, max_body_chars = get_body_args(args, default='snippet')
         gmail_service = gmail.GmailService(user_id=user_id)
         max_results = args.get("max_results", 50)
-        drafts = gmail_service.list_drafts(max_results=max_results)
+        drafts = gmail_service.list_drafts(
+            max_results=max_results, page_token=args.get("page_token"), body_mode=body_mode,
+            max_body_chars=max_body_chars, normalize_body=args.get("normalize_body", False)
+        )
 
         return [
             TextContent(
@@ -664,7 +1039,10 @@ class GetUnreadEmailsToolHandler(toolhandler.ToolHandler):
                         "type": "integer",
                         "description": "Maximum number of unread emails to return",
                         "default": 100
-                    }
+                    },
+                    "body_mode": BODY_MODE_SCHEMA,
+                    "max_body_chars": MAX_BODY_CHARS_SCHEMA,
+                    "normalize_body": NORMALIZE_BODY_SCHEMA
                 },
                 "required": [toolhandler.USER_ID_ARG]
             }
@@ -675,9 +1053,13 @@ class GetUnreadEmailsToolHandler(toolhandler.ToolHandler):
         if not user_id:
             raise RuntimeError(f"Missing required argument: {toolhandler.USER_ID_ARG}")
         
+        body_mode, max_body_chars = get_body_args(args)
         gmail_service = gmail.GmailService(user_id=user_id)
         max_results = args.get("max_results", 100)
-        unread_emails = gmail_service.get_unread_emails(max_results=max_results)
+        unread_emails = gmail_service.get_unread_emails(
+            max_results=max_results, body_mode=body_mode, max_body_chars=max_body_chars,
+            normalize_body=args.get("normalize_body", False)
+        )
 
         return [
             TextContent(
@@ -792,6 +1174,44 @@ class ListLabelsToolHandler(toolhandler.ToolHandler):
         
         return [TextContent(type="text", text=json.dumps(labels, indent=2))]
 
+class MailboxStatsToolHandler(toolhandler.ToolHandler):
+    def __init__(self):
+        super().__init__("mailbox_stats")
+
+    def get_tool_description(self) -> Tool:
+        return Tool(
+            name=self.name,
+            description="""Counts messages and threads, total and unread, in every Gmail label (or the given ones) without listing any messages.
+            Use it to answer questions like "how many unread emails are in each label". Counts are cached briefly; age_seconds tells how old they are.""",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "__user_id__": self.get_user_id_arg_schema(),
+                    "labels": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Only report these labels, by ID or name (default: all labels)"
+                    },
+                    "refresh": {
+                        "type": "boolean",
+                        "description": "Fetch the counts again instead of using cached ones (default: false)",
+                        "default": False
+                    }
+                },
+                "required": [toolhandler.USER_ID_ARG]
+            }
+        )
+
+    def run_tool(self, args: dict) -> Sequence[TextContent | ImageContent | EmbeddedResource]:
+        user_id = args.get(toolhandler.USER_ID_ARG)
+        if not user_id:
+            raise RuntimeError(f"Missing required argument: {toolhandler.USER_ID_ARG}")
+
+        gmail_service = gmail.GmailService(user_id=user_id)
+        stats = gmail_service.mailbox_stats(label_filter=args.get("labels"), refresh=args.get("refresh", False))
+
+        return [TextContent(type="text", text=json.dumps(stats, indent=2))]
+
 class CreateLabelToolHandler(toolhandler.ToolHandler):
     def __init__(self):
         super().__init__("create_label")
@@ -838,7 +1258,7 @@ class ApplyLabelToolHandler(toolhandler.ToolHandler):
     def get_tool_description(self) -> Tool:
         return Tool(
             name=self.name,
-            description="Apply a label to a Gmail email",
+            description="Apply a label, given by ID or name, to a Gmail email",
             inputSchema={
                 "type": "object",
                 "properties": {
@@ -850,21 +1270,22 @@ class ApplyLabelToolHandler(toolhandler.ToolHandler):
                     "label_id": {
                         "type": "string",
                         "description": "The ID of the label to apply"
-                    }
+                    },
+                    "label_name": LABEL_NAME_SCHEMA
                 },
-                "required": ["email_id", "label_id", toolhandler.USER_ID_ARG]
+                "required": ["email_id", toolhandler.USER_ID_ARG]
             }
         )
 
     def run_tool(self, args: dict) -> Sequence[TextContent | ImageContent | EmbeddedResource]:
         user_id = args.get(toolhandler.USER_ID_ARG)
         email_id = args.get("email_id")
-        label_id = args.get("label_id")
         
-        if not user_id or not email_id or not label_id:
-            raise RuntimeError("Missing required arguments: __user_id__, email_id, and label_id")
+        if not user_id or not email_id:
+            raise RuntimeError("Missing required arguments: __user_id__ and email_id")
 
         gmail_service = gmail.GmailService(user_id=user_id)
+        label_id = get_label_arg(gmail_service, args)
         success = gmail_service.apply_label(email_id=email_id, label_id=label_id)
         
         result = {
@@ -883,7 +1304,7 @@ class RemoveLabelToolHandler(toolhandler.ToolHandler):
     def get_tool_description(self) -> Tool:
         return Tool(
             name=self.name,
-            description="Remove a label from a Gmail email",
+            description="Remove a label, given by ID or name, from a Gmail email",
             inputSchema={
                 "type": "object",
                 "properties": {
@@ -895,21 +1316,22 @@ class RemoveLabelToolHandler(toolhandler.ToolHandler):
                     "label_id": {
                         "type": "string",
                         "description": "The ID of the label to remove"
-                    }
+                    },
+                    "label_name": LABEL_NAME_SCHEMA
                 },
-                "required": ["email_id", "label_id", toolhandler.USER_ID_ARG]
+                "required": ["email_id", toolhandler.USER_ID_ARG]
             }
         )
 
     def run_tool(self, args: dict) -> Sequence[TextContent | ImageContent | EmbeddedResource]:
         user_id = args.get(toolhandler.USER_ID_ARG)
         email_id = args.get("email_id")
-        label_id = args.get("label_id")
         
-        if not user_id or not email_id or not label_id:
-            raise RuntimeError("Missing required arguments: __user_id__, email_id, and label_id")
+        if not user_id or not email_id:
+            raise RuntimeError("Missing required arguments: __user_id__ and email_id")
 
         gmail_service = gmail.GmailService(user_id=user_id)
+        label_id = get_label_arg(gmail_service, args)
         success = gmail_service.remove_label(email_id=email_id, label_id=label_id)
         
         result = {
@@ -1010,7 +1432,10 @@ class ListArchivedEmailsToolHandler(toolhandler.ToolHandler):
                         "type": "integer",
                         "description": "Maximum number of archived emails to return (default: 100)",
                         "default": 100
-                    }
+                    },
+                    "body_mode": BODY_MODE_SCHEMA,
+                    "max_body_chars": MAX_BODY_CHARS_SCHEMA,
+                    "normalize_body": NORMALIZE_BODY_SCHEMA
                 },
                 "required": [toolhandler.USER_ID_ARG]
             }
@@ -1023,8 +1448,12 @@ class ListArchivedEmailsToolHandler(toolhandler.ToolHandler):
         if not user_id:
             raise RuntimeError("Missing required argument: __user_id__")
 
+        body_mode, max_body_chars = get_body_args(args)
         gmail_service = gmail.GmailService(user_id=user_id)
-        emails = gmail_service.list_archived_emails(max_results=max_results)
+        emails = gmail_service.list_archived_emails(
+            max_results=max_results, body_mode=body_mode, max_body_chars=max_body_chars,
+            normalize_body=args.get("normalize_body", False)
+        )
         
         return [TextContent(type="text", text=json.dumps(emails, indent=2))]
 
@@ -1074,7 +1503,7 @@ class DeleteLabelToolHandler(toolhandler.ToolHandler):
     def get_tool_description(self) -> Tool:
         return Tool(
             name=self.name,
-            description="Delete a Gmail label",
+            description="Delete a Gmail label, given by ID or name",
             inputSchema={
                 "type": "object",
                 "properties": {
@@ -1082,20 +1511,21 @@ class DeleteLabelToolHandler(toolhandler.ToolHandler):
                     "label_id": {
                         "type": "string",
                         "description": "The ID of the label to delete"
-                    }
+                    },
+                    "label_name": LABEL_NAME_SCHEMA
                 },
-                "required": ["label_id", toolhandler.USER_ID_ARG]
+                "required": [toolhandler.USER_ID_ARG]
             }
         )
 
     def run_tool(self, args: dict) -> Sequence[TextContent | ImageContent | EmbeddedResource]:
         user_id = args.get(toolhandler.USER_ID_ARG)
-        label_id = args.get("label_id")
         
-        if not user_id or not label_id:
-            raise RuntimeError("Missing required arguments: __user_id__ and label_id")
+        if not user_id:
+            raise RuntimeError(f"Missing required argument: {toolhandler.USER_ID_ARG}")
 
         gmail_service = gmail.GmailService(user_id=user_id)
+        label_id = get_label_arg(gmail_service, args)
         result = gmail_service.delete_label(label_id)
         
         return [TextContent(type="text", text=json.dumps(result, indent=2))]
@@ -1126,4 +1556,9 @@ TOOL_HANDLERS = {
     "list_archived_emails": ListArchivedEmailsToolHandler,
     "restore_email_to_inbox": RestoreEmailToInboxToolHandler,
     "delete_label": DeleteLabelToolHandler,
+    "get_email_body": GetEmailBodyToolHandler,
+    "get_gmail_thread": GetThreadToolHandler,
+    "mail_merge_gmail": MailMergeToolHandler,
+    "get_mail_merge_status": GetMailMergeStatusToolHandler,
+    "mailbox_stats": MailboxStatsToolHandler,
 }
@@ -0,0 +1,86 @@
+"""MCP Server Operations Tools Module"""
+
+from collections.abc import Sequence
+from mcp.types import (
+    Tool,
+    TextContent,
+    ImageContent,
+    EmbeddedResource,
+)
+from . import ratelimit
+from . import metrics
+import json
+from . import toolhandler
+
+class GetQuotaUsageToolHandler(toolhandler.ToolHandler):
+    def __init__(self):
+        super().__init__("get_quota_usage")
+
+    def get_tool_description(self) -> Tool:
+        return Tool(
+            name=self.name,
+            description="""Reports the Google API quota used by an account since the server started:
+            Gmail quota units and Calendar requests in the last minute and in total, per-method usage,
+            time spent throttled, the configured per-second limits and the Gmail quota cost of each method.
+            Use it to plan bulk operations so they stay within the per-user rate limits.""",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "__user_id__": self.get_user_id_arg_schema(),
+                },
+                "required": [toolhandler.USER_ID_ARG]
+            }
+        )
+
+    def run_tool(self, args: dict) -> Sequence[TextContent | ImageContent | EmbeddedResource]:
+        user_id = args.get(toolhandler.USER_ID_ARG)
+        if not user_id:
+            raise RuntimeError(f"Missing required argument: {toolhandler.USER_ID_ARG}")
+
+        report = ratelimit.get_usage_report(user_id)
+
+        return [TextContent(type="text", text=json.dumps(report, indent=2))]
+
+class ServerMetricsToolHandler(toolhandler.ToolHandler):
+    def __init__(self):
+        super().__init__("server_metrics")
+
+    def get_tool_description(self) -> Tool:
+        return Tool(
+            name=self.name,
+            description="""Reports server metrics since start: per-tool call counts and latency, Google API
+            calls per account and method with error classes, retries, bytes sent/received, requests in flight,
+            time spent waiting for quota, cache hit ratios and identical concurrent reads that were coalesced.
+            Does not need an account.""",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "format": {
+                        "type": "string",
+                        "enum": ["json", "openmetrics"],
+                        "description": "json (default) for a summary with latency percentiles, openmetrics for the raw exposition text",
+                        "default": "json"
+                    }
+                },
+                "required": []
+            }
+        )
+
+    def run_tool(self, args: dict) -> Sequence[TextContent | ImageContent | EmbeddedResource]:
+        if args.get("format") == "openmetrics":
+            return [TextContent(type="text", text=metrics.REGISTRY.render())]
+
+        report = metrics.REGISTRY.snapshot()
+        report["cache_hit_ratios"] = metrics.cache_hit_ratios()
+        report["coalesced_calls"] = metrics.coalesced_calls()
+
+        return [TextContent(type="text", text=json.dumps(report, indent=2))]
+
+# Tools that report on the server itself and do not take an account
+ACCOUNTLESS_TOOLS = {"server_metrics"}
+
+# Tool handlers registry
+TOOL_HANDLERS = {
+    "get_quota_usage": GetQuotaUsageToolHandler,
+    "server_metrics": ServerMetricsToolHandler,
+}
@@ -0,0 +1,233 @@
+import argparse
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+# Span status codes of the OpenTelemetry data model
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+
+def get_trace_file() -> str | None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--trace-file",
+        type=str,
+        default=None,
+        help="Append trace spans to this file as OTLP/JSON span objects, one per line",
+    )
+    args, _ = parser.parse_known_args()
+    return args.trace_file
+
+
+def get_debug_timing() -> bool:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--debug-timing",
+        action="store_true",
+        help="Append a _timing breakdown of every tool call to its result",
+    )
+    args, _ = parser.parse_known_args()
+    return args.debug_timing
+
+
+@functools.lru_cache(maxsize=1)
+def _settings() -> tuple[str | None, bool]:
+    # Spans are created on hot paths, so the command line is only read once.
+    return get_trace_file(), get_debug_timing()
+
+
+def enabled() -> bool:
+    trace_file, debug_timing = _settings()
+    return bool(trace_file) or debug_timing
+
+
+def timing_enabled() -> bool:
+    return _settings()[1]
+
+
+_current: contextvars.ContextVar["Span | None"] = contextvars.ContextVar("mcp_gsuite_span", default=None)
+_export_lock = threading.Lock()
+_export_file = None
+
+
+def _attribute_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class Span():
+    """One timed stage of a tool call. Child spans are collected by the root span of their trace."""
+
+    def __init__(self, name: str, parent: "Span | None", kind: int, attributes: dict):
+        self.name = name
+        self.parent = parent
+        self.root = parent.root if parent is not None else self
+        self.trace_id = parent.trace_id if parent is not None else os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.kind = kind
+        self.attributes = dict(attributes)
+        self.status = STATUS_UNSET
+        self.status_message = ""
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.depth = parent.depth + 1 if parent is not None else 0
+        if parent is None:
+            self.spans: list[Span] = []
+            self._spans_lock = threading.Lock()
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def end(self, error: BaseException | None = None):
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.status = STATUS_ERROR
+            self.status_message = f"{type(error).__name__}: {error}"
+        with self.root._spans_lock:
+            self.root.spans.append(self)
+        _export(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_otlp(self) -> dict:
+        """The span as an OTLP/JSON span object."""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": _attribute_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": self.status},
+        }
+        if self.parent is not None:
+            span["parentSpanId"] = self.parent.span_id
+        if self.status_message:
+            span["status"]["message"] = self.status_message
+        return span
+
+
+def _export(span: Span):
+    global _export_file
+    trace_file = _settings()[0]
+    if not trace_file:
+        return
+    line = json.dumps(span.to_otlp())
+    with _export_lock:
+        try:
+            if _export_file is None:
+                _export_file = open(trace_file, "a", buffering=1)
+            _export_file.write(line + "\n")
+        except Exception as e:
+            logging.warning(f"Could not write trace span to {trace_file}: {e}")
+
+
+class span():
+    """
+    Context manager timing a stage of the current tool call.
+
+    Does nothing unless --trace-file or --debug-timing is set. The span
+    becomes the parent of spans opened inside it, including in threads
+    started with a copy of the current context.
+    """
+
+    def __init__(self, name: str, kind: int = SPAN_KIND_INTERNAL, **attributes):
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.span = None
+
+    def __enter__(self) -> "Span | None":
+        if not enabled():
+            return None
+        self.span = Span(self.name, _current.get(), self.kind, self.attributes)
+        self._token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.span is not None:
+            _current.reset(self._token)
+            self.span.end(exc)
+        return False
+
+
+def traced(name: str):
+    """Decorator running a function inside a span."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def traced_methods(prefix: str):
+    """Class decorator wrapping every public method in a span named '<prefix>.<method>'."""
+    def decorator(cls):
+        for attr, value in list(vars(cls).items()):
+            if callable(value) and not attr.startswith("_"):
+                setattr(cls, attr, traced(f"{prefix}.{attr}")(value))
+        return cls
+    return decorator
+
+
+def current_span() -> Span | None:
+    return _current.get()
+
+
+def timing_report(root: Span) -> dict:
+    """
+    Per-stage breakdown of a finished trace.
+
+    self_ms is the time spent in a span outside of its child spans, e.g.
+    the result serialization of a tool handler.
+    """
+    with root._spans_lock:
+        spans = sorted(root.spans, key=lambda s: (s.start_ns, s.depth))
+    child_ms: dict[str, float] = {}
+    for s in spans:
+        if s.parent is not None:
+            child_ms[s.parent.span_id] = child_ms.get(s.parent.span_id, 0.0) + s.duration_ms
+    return {
+        "trace_id": root.trace_id,
+        "total_ms": round(root.duration_ms, 3),
+        "spans": [
+            {
+                "name": s.name,
+                "depth": s.depth,
+                "start_ms": round((s.start_ns - root.start_ns) / 1e6, 3),
+                "duration_ms": round(s.duration_ms, 3),
+                "self_ms": round(max(0.0, s.duration_ms - child_ms.get(s.span_id, 0.0)), 3),
+                **({"attributes": s.attributes} if s.attributes else {}),
+                **({"error": s.status_message} if s.status == STATUS_ERROR else {}),
+            }
+            for s in spans
+        ],
+    }
+
+
+def close():
+    global _export_file
+    with _export_lock:
+        if _export_file is not None:
+            _export_file.close()
+            _export_file = None
@@ -0,0 +1,222 @@
+import argparse
+import logging
+import threading
+
+import httplib2
+
+from . import metrics
+
+TRANSPORT_HTTPLIB2 = "httplib2"
+TRANSPORT_POOLED = "pooled"
+TRANSPORT_HTTP2 = "http2"
+TRANSPORTS = (TRANSPORT_POOLED, TRANSPORT_HTTP2, TRANSPORT_HTTPLIB2)
+
+DEFAULT_TIMEOUT = 60
+
+
+def get_http_transport() -> str:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--http-transport",
+        type=str,
+        choices=TRANSPORTS,
+        default=TRANSPORT_POOLED,
+        help="HTTP transport used for Google API calls",
+    )
+    args, _ = parser.parse_known_args()
+    return args.http_transport
+
+
+def get_max_connections_per_account() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--max-connections-per-account",
+        type=int,
+        default=10,
+        help="Maximum number of concurrent HTTP connections per Google account",
+    )
+    args, _ = parser.parse_known_args()
+    return max(1, args.max_connections_per_account)
+
+
+def _to_httplib2_response(status: int, reason: str, headers, content: bytes) -> httplib2.Response:
+    """Build the (response, content) shape googleapiclient expects from httplib2."""
+    info = {key.lower(): value for key, value in headers.items()}
+    # The body has already been decompressed, mirror what httplib2 does in that case.
+    if "content-encoding" in info:
+        info["-content-encoding"] = info.pop("content-encoding")
+        info["content-length"] = str(len(content))
+    info["status"] = str(status)
+    response = httplib2.Response(info)
+    response.reason = reason
+    return response
+
+
+class RequestsTransport():
+    """Thread-safe, keep-alive connection pool for one account, backed by requests/urllib3."""
+
+    def __init__(self, max_connections: int, timeout: float = DEFAULT_TIMEOUT):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self._requests = requests
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=max_connections,
+            pool_block=True,
+            max_retries=0,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, uri, method="GET", body=None, headers=None,
+                redirections=httplib2.DEFAULT_MAX_REDIRECTS, connection_type=None):
+        try:
+            response = self.session.request(
+                method,
+                uri,
+                data=body,
+                headers=headers,
+                timeout=self.timeout,
+                allow_redirects=redirections > 0,
+            )
+        except self._requests.exceptions.Timeout as e:
+            raise TimeoutError(str(e)) from e
+        except self._requests.exceptions.ConnectionError as e:
+            raise ConnectionError(str(e)) from e
+        return (
+            _to_httplib2_response(response.status_code, response.reason, response.headers, response.content),
+            response.content,
+        )
+
+    def close(self):
+        self.session.close()
+
+
+class HttpxTransport():
+    """Thread-safe connection pool for one account multiplexing requests over HTTP/2."""
+
+    def __init__(self, max_connections: int, timeout: float = DEFAULT_TIMEOUT):
+        import httpx
+
+        self._httpx = httpx
+        self.client = httpx.Client(
+            http2=True,
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    def request(self, uri, method="GET", body=None, headers=None,
+                redirections=httplib2.DEFAULT_MAX_REDIRECTS, connection_type=None):
+        if hasattr(body, "read"):
+            body = body.read()
+        try:
+            response = self.client.request(
+                method,
+                uri,
+                content=body,
+                headers=headers,
+                follow_redirects=redirections > 0,
+            )
+        except self._httpx.TimeoutException as e:
+            raise TimeoutError(str(e)) from e
+        except self._httpx.TransportError as e:
+            raise ConnectionError(str(e)) from e
+        return (
+            _to_httplib2_response(response.status_code, response.reason_phrase, response.headers, response.content),
+            response.content,
+        )
+
+    def close(self):
+        self.client.close()
+
+
+class AccountHttp():
+    """
+    Per-service view of an account's shared transport.
+
+    oauth2client authorizes an http object by replacing its request method, so
+    each service object gets its own lightweight AccountHttp while the
+    underlying connection pool is shared by every service of the account.
+    Requests are counted in the account's traffic metrics.
+    """
+
+    def __init__(self, transport, user_id: str):
+        self.transport = transport
+        self.user_id = user_id
+
+    def request(self, uri, method="GET", body=None, headers=None,
+                redirections=httplib2.DEFAULT_MAX_REDIRECTS, connection_type=None):
+        if isinstance(body, (bytes, str)):
+            metrics.BYTES_SENT.inc(len(body), account=self.user_id)
+        metrics.API_IN_FLIGHT.inc(account=self.user_id)
+        try:
+            response, content = self.transport.request(uri, method, body, headers, redirections, connection_type)
+        finally:
+            metrics.API_IN_FLIGHT.dec(account=self.user_id)
+        metrics.BYTES_RECEIVED.inc(len(content or b""), account=self.user_id)
+        return response, content
+
+    def close(self):
+        # The pool outlives individual service objects.
+        pass
+
+
+_transports: dict[str, object] = {}
+_transports_lock = threading.Lock()
+
+
+def _create_transport(name: str, max_connections: int):
+    if name == TRANSPORT_HTTP2:
+        try:
+            import h2  # noqa: F401
+            return HttpxTransport(max_connections)
+        except ImportError:
+            logging.warning("HTTP/2 transport requires the 'h2' package (pip install httpx[http2]), "
+                            "falling back to the pooled HTTP/1.1 transport")
+    return RequestsTransport(max_connections)
+
+
+def get_transport(user_id: str):
+    """Return the shared connection pool for an account, creating it on first use."""
+    transport = _transports.get(user_id)
+    if transport is None:
+        with _transports_lock:
+            transport = _transports.get(user_id)
+            if transport is None:
+                transport = _create_transport(get_http_transport(), get_max_connections_per_account())
+                _transports[user_id] = transport
+    return transport
+
+
+def is_thread_safe() -> bool:
+    """Whether a single service object may be used from several threads at once."""
+    return get_http_transport() != TRANSPORT_HTTPLIB2
+
+
+def authorized_http(credentials, user_id: str):
+    """
+    Create an authorized http object for a Google API client.
+
+    Args:
+        credentials: OAuth2 credentials of the account
+        user_id (str): Email of the account, used to select its connection pool
+
+    Returns:
+        An httplib2.Http compatible object that adds the OAuth2 token to every request
+    """
+    if get_http_transport() == TRANSPORT_HTTPLIB2:
+        http = AccountHttp(httplib2.Http(timeout=DEFAULT_TIMEOUT), user_id)
+    else:
+        http = AccountHttp(get_transport(user_id), user_id)
+    return credentials.authorize(http)
+
+
+def close_all():
+    """Close every pooled connection, e.g. on shutdown."""
+    with _transports_lock:
+        for transport in _transports.values():
+            transport.close()
+        _transports.clear()
@@ -0,0 +1,193 @@
+import argparse
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+
+from . import gmail
+from . import labels
+from . import resources
+from . import toolcache
+from . import tracing
+
+# Changes kept per account; a client further behind is told that it missed some
+FEED_MAX_ENTRIES = 1000
+
+
+def get_watch_interval() -> float:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--watch-interval",
+        type=float,
+        default=60.0,
+        help="Seconds between mailbox change checks of each account (one history.list call); 0 disables the watcher",
+    )
+    args, _ = parser.parse_known_args()
+    return max(0.0, args.watch_interval)
+
+
+class ChangeFeed():
+    """Mailbox changes of one account seen by the watcher, numbered by a sequence that clients resume from."""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.history_id: str | None = None
+        self.sequence = 0
+        self.entries: deque[dict] = deque(maxlen=FEED_MAX_ENTRIES)
+        self.last_poll: float | None = None
+        self.last_error: str | None = None
+        self._lock = threading.Lock()
+
+    def add(self, change: dict) -> dict:
+        with self._lock:
+            self.sequence += 1
+            entry = {'sequence': self.sequence, 'time': time.time(), **change}
+            self.entries.append(entry)
+            return entry
+
+    def since(self, sequence: int = 0) -> dict:
+        """
+        The changes after a sequence number.
+
+        Returns:
+            dict: 'changes' after sequence, the current 'sequence' to resume from and whether
+                  older changes were dropped ('truncated'), in which case the client should reload
+        """
+        with self._lock:
+            changes = [entry for entry in self.entries if entry['sequence'] > sequence]
+            oldest = self.entries[0]['sequence'] if self.entries else self.sequence + 1
+            return {
+                'account': self.user_id,
+                'sequence': self.sequence,
+                'history_id': self.history_id,
+                'changes': changes,
+                'truncated': sequence < oldest - 1,
+                'last_poll': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.last_poll))
+                if self.last_poll else None,
+                'last_error': self.last_error,
+            }
+
+
+_feeds: dict[str, ChangeFeed] = {}
+_feeds_lock = threading.Lock()
+
+
+def get_feed(user_id: str) -> ChangeFeed:
+    with _feeds_lock:
+        feed = _feeds.get(user_id)
+        if feed is None:
+            feed = ChangeFeed(user_id)
+            _feeds[user_id] = feed
+        return feed
+
+
+def summarize_history(records: list[dict]) -> tuple[dict, set[str], set[str]]:
+    """
+    Collapse history.list records into one change entry.
+
+    Returns:
+        tuple[dict, set[str], set[str]]: Added and deleted messages and label changes, the IDs of the
+                                         labels involved and of the existing messages that changed
+    """
+    change = {'type': 'changes', 'history_id': records[-1]['id'] if records else None,
+              'messages_added': [], 'messages_deleted': [], 'labels_added': [], 'labels_removed': []}
+    label_ids: set[str] = set()
+    message_ids: set[str] = set()
+    for record in records:
+        for item in record.get('messagesAdded', []):
+            message = item.get('message', {})
+            change['messages_added'].append(
+                {'id': message.get('id'), 'threadId': message.get('threadId'), 'labelIds': message.get('labelIds', [])})
+            label_ids.update(message.get('labelIds', []))
+        for item in record.get('messagesDeleted', []):
+            message = item.get('message', {})
+            change['messages_deleted'].append(message.get('id'))
+            message_ids.add(message.get('id'))
+            label_ids.update(message.get('labelIds', []))
+        for key, target in (('labelsAdded', 'labels_added'), ('labelsRemoved', 'labels_removed')):
+            for item in record.get(key, []):
+                message = item.get('message', {})
+                change[target].append({'id': message.get('id'), 'labelIds': item.get('labelIds', [])})
+                message_ids.add(message.get('id'))
+                label_ids.update(item.get('labelIds', []))
+    return change, label_ids, message_ids
+
+
+class Watcher():
+    """
+    Background poller of the accounts' Gmail history.
+
+    Every interval, each account costs one history.list call (two quota
+    units) when nothing changed. Changes are appended to the account's
+    ChangeFeed, reset the cached mailbox_stats counts and are announced
+    through notify() with the URIs of the changes resource and of every
+    label and existing message involved, so that clients only fetch when
+    something changed. An optional refresh() coroutine runs after every
+    round, e.g. to check resources that history.list does not cover.
+    invalidate_stats() resets an account's counts where they are cached,
+    e.g. in the account's worker process (default: labels.invalidate_stats).
+    """
+
+    def __init__(self, user_ids: list[str], notify, interval: float | None = None, refresh=None,
+                 invalidate_stats=None):
+        self.user_ids = list(user_ids)
+        self.notify = notify
+        self.refresh = refresh
+        self.invalidate_stats = invalidate_stats or labels.invalidate_stats
+        self.interval = get_watch_interval() if interval is None else interval
+
+    def poll(self, user_id: str) -> list[str]:
+        """Check one account for changes. Returns the URIs of the resources that changed."""
+        feed = get_feed(user_id)
+        with tracing.span("watcher.poll", account=user_id):
+            service = gmail.GmailService(user_id=user_id)
+            if feed.history_id is None:
+                feed.history_id = service.get_history_id()
+                feed.last_poll = time.time()
+                return []
+            result = service.list_history(feed.history_id)
+            feed.last_poll = time.time()
+            feed.last_error = None
+            if result is None:
+                # Too far behind for history.list: changes were missed, clients should reload
+                feed.history_id = service.get_history_id()
+                feed.add({'type': 'reset', 'history_id': feed.history_id})
+                self.invalidate_stats(user_id)
+                toolcache.invalidate(user_id, {toolcache.SCOPE_GMAIL_MESSAGES, toolcache.SCOPE_GMAIL_LABELS})
+                return [resources.changes_uri(user_id)]
+            feed.history_id = result['historyId']
+            if not result['history']:
+                return []
+
+        change, label_ids, message_ids = summarize_history(result['history'])
+        feed.add(change)
+        self.invalidate_stats(user_id)
+        # Changes made outside this server, e.g. new mail, are not covered by write-through invalidation
+        toolcache.invalidate(user_id, {toolcache.SCOPE_GMAIL_MESSAGES, toolcache.SCOPE_GMAIL_LABELS})
+        return ([resources.changes_uri(user_id)]
+                + [resources.label_uri(user_id, label_id) for label_id in sorted(label_ids)]
+                + [resources.message_uri(user_id, message_id) for message_id in sorted(message_ids)])
+
+    async def run(self):
+        """Poll every account forever; cancel the task to stop."""
+        logging.info(f"Watching {len(self.user_ids)} accounts for mailbox changes every {self.interval:g}s")
+        while True:
+            for user_id in self.user_ids:
+                try:
+                    uris = await asyncio.to_thread(self.poll, user_id)
+                except Exception as e:
+                    get_feed(user_id).last_error = str(e)
+                    logging.warning(f"Could not check {user_id} for mailbox changes: {str(e)}")
+                    continue
+                if uris:
+                    try:
+                        await self.notify(uris)
+                    except Exception as e:
+                        logging.warning(f"Could not send change notifications for {user_id}: {str(e)}")
+            if self.refresh is not None:
+                try:
+                    await self.refresh()
+                except Exception as e:
+                    logging.warning(f"Could not refresh watched resources: {str(e)}")
+            await asyncio.sleep(self.interval)
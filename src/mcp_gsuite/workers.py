@@ -0,0 +1,219 @@
+import argparse
+import asyncio
+import hashlib
+import itertools
+import logging
+import multiprocessing
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from . import executor
+from . import toolcache
+
+# Tool calls a worker runs at once, like the front-end's worker threads
+WORKER_THREADS = 16
+# Restart delay of a worker that keeps crashing doubles up to this
+MAX_RESTART_DELAY = 30.0
+# A worker running this long since its last start is considered healthy again
+HEALTHY_AFTER_SECONDS = 60.0
+# Control messages to a worker, sent without a call ID and not answered
+CONTROL_INVALIDATE_STATS = "invalidate_stats"
+
+
+def get_worker_count() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Worker processes running account tool calls, sharded by account (0 runs them in the server process)",
+    )
+    args, _ = parser.parse_known_args()
+    return max(0, args.workers)
+
+
+def shard(user_id: str, count: int) -> int:
+    """Index of the worker serving an account; stable across processes and restarts, unlike hash()."""
+    return int.from_bytes(hashlib.sha256(user_id.encode()).digest()[:8], "big") % count
+
+
+def _worker_main(conn, index: int):
+    """
+    Worker process: run the tool calls received on conn and send back their results.
+
+    The process is started with the server's command line, so it reads the
+    same options. Calls run in a thread pool, while control messages are
+    handled in order as they arrive; the worker exits when the front-end
+    closes its end of the pipe.
+    """
+    logging.basicConfig(level=logging.INFO, format=f"%(levelname)s:worker-{index}:%(name)s:%(message)s")
+    from . import adaptive
+    from . import labels
+    from . import server
+
+    send_lock = threading.Lock()
+
+    def run(call_id: int, name: str, arguments: dict):
+        try:
+            with executor.count_call_retries() as retries, toolcache.track_reads() as reads:
+                result = server.TOOL_HANDLERS[name]().run_tool(arguments)
+            reply = (call_id, True, (result, retries.count, reads.failed))
+        except Exception as e:
+            logging.error(traceback.format_exc())
+            reply = (call_id, False, str(e))
+        try:
+            with send_lock:
+                conn.send(reply)
+        except (OSError, ValueError):
+            # The front-end went away
+            pass
+
+    with ThreadPoolExecutor(max_workers=WORKER_THREADS, thread_name_prefix=f"worker-{index}") as pool:
+        while True:
+            try:
+                call_id, name, arguments = conn.recv()
+            except (EOFError, OSError):
+                break
+            if call_id is None:
+                if name == CONTROL_INVALIDATE_STATS:
+                    labels.invalidate_stats(arguments["user_id"])
+                continue
+            pool.submit(run, call_id, name, arguments)
+    adaptive.save()
+
+
+class _Worker():
+    def __init__(self, index: int):
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.started = 0.0
+        self.restarts = 0
+        # Calls sent to the worker and not answered yet, by call ID
+        self.pending: dict[int, asyncio.Future] = {}
+        self.lock = threading.Lock()
+
+
+class WorkerPool():
+    """
+    Worker processes that run account tool calls, each account always on the same worker.
+
+    Sharding by account keeps an account's clients, connections, caches,
+    rate limiter and adaptive batch sizes in one process, while MIME
+    decoding, normalization and result serialization of different accounts
+    run on different cores. A worker that dies is restarted, with growing
+    delays while it keeps crashing; the calls it was running fail and are
+    not repeated, since they may have had effects.
+    """
+
+    def __init__(self, count: int):
+        self.loop = asyncio.get_running_loop()
+        self.context = multiprocessing.get_context("spawn")
+        self.workers = [_Worker(index) for index in range(count)]
+        self.call_ids = itertools.count()
+        self.closed = False
+        for worker in self.workers:
+            self._start(worker)
+        logging.info(f"Started {count} worker processes")
+
+    def _start(self, worker: _Worker):
+        parent_conn, child_conn = self.context.Pipe()
+        process = self.context.Process(
+            target=_worker_main, args=(child_conn, worker.index), name=f"mcp-gsuite-worker-{worker.index}",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        with worker.lock:
+            worker.process = process
+            worker.conn = parent_conn
+            worker.started = time.monotonic()
+        threading.Thread(target=self._receive, args=(worker, parent_conn), daemon=True,
+                         name=f"worker-{worker.index}-results").start()
+
+    def _receive(self, worker: _Worker, conn):
+        """Deliver a worker's results until it exits, then fail its open calls and restart it."""
+        while True:
+            try:
+                call_id, ok, payload = conn.recv()
+            except (EOFError, OSError):
+                break
+            with worker.lock:
+                future = worker.pending.pop(call_id, None)
+            if future is not None:
+                self.loop.call_soon_threadsafe(_resolve, future, ok, payload)
+        if self.closed:
+            return
+
+        worker.process.join(timeout=5)
+        with worker.lock:
+            pending = list(worker.pending.values())
+            worker.pending.clear()
+        logging.error(f"Worker {worker.index} exited with code {worker.process.exitcode}, "
+                      f"failing {len(pending)} running calls")
+        for future in pending:
+            self.loop.call_soon_threadsafe(
+                _resolve, future, False, f"Worker process {worker.index} exited while running the call")
+
+        if time.monotonic() - worker.started > HEALTHY_AFTER_SECONDS:
+            worker.restarts = 0
+        delay = min(MAX_RESTART_DELAY, 2.0 ** worker.restarts - 1)
+        worker.restarts += 1
+        time.sleep(delay)
+        if not self.closed:
+            logging.info(f"Restarting worker {worker.index}")
+            self._start(worker)
+
+    async def call(self, user_id: str, name: str, arguments: dict):
+        """
+        Run a tool call on the account's worker and return its result; raises RuntimeError if it failed.
+
+        The retries the worker made are added to the current tool call's count,
+        and its failed reads are recorded for the tool response cache.
+        """
+        worker = self.workers[shard(user_id, len(self.workers))]
+        future = self.loop.create_future()
+        call_id = next(self.call_ids)
+        with worker.lock:
+            worker.pending[call_id] = future
+            try:
+                worker.conn.send((call_id, name, arguments))
+            except (OSError, ValueError) as e:
+                worker.pending.pop(call_id, None)
+                raise RuntimeError(f"Worker process {worker.index} is not available: {e}")
+        result, retries, failed_read = await future
+        executor.add_call_retries(retries)
+        if failed_read:
+            toolcache.record_failed_read()
+        return result
+
+    def invalidate_stats(self, user_id: str):
+        """Forget the account's cached label counts in its worker, which keeps them, see labels.invalidate_stats()."""
+        worker = self.workers[shard(user_id, len(self.workers))]
+        with worker.lock:
+            try:
+                worker.conn.send((None, CONTROL_INVALIDATE_STATS, {"user_id": user_id}))
+            except (OSError, ValueError):
+                # A restarted worker starts without cached counts
+                pass
+
+    def close(self):
+        self.closed = True
+        for worker in self.workers:
+            with worker.lock:
+                worker.conn.close()
+        for worker in self.workers:
+            worker.process.join(timeout=10)
+            if worker.process.is_alive():
+                worker.process.terminate()
+
+
+def _resolve(future: asyncio.Future, ok: bool, payload):
+    if future.done():
+        return
+    if ok:
+        future.set_result(payload)
+    else:
+        future.set_exception(RuntimeError(payload))
@@ -0,0 +1,26 @@
+import argparse
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Unit tests import the package from the source tree, like the servers started by the end-to-end tests
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import bench_tools  # noqa: E402
+import fake_google  # noqa: E402
+
+
+@pytest.fixture
+def backend_url():
+    """URL of a fake Google backend, see benchmarks/fake_google.py."""
+    parser = argparse.ArgumentParser()
+    fake_google.add_config_arguments(parser)
+    backend, url = bench_tools.start_backend(parser.parse_args(["--latency-ms", "0"]))
+    try:
+        yield url
+    finally:
+        backend.terminate()
+        backend.wait()
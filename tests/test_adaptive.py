@@ -0,0 +1,108 @@
+"""AIMD batch size and parallelism control, and the learned settings kept between runs."""
+
+import json
+import sys
+
+import pytest
+
+from mcp_gsuite import adaptive
+
+
+def make_controller(**overrides) -> adaptive.AimdController:
+    settings = {"batch_size": 20, "max_batch_size": 40, "concurrency": 2, "max_concurrency": 4,
+                "target_latency": 5.0}
+    settings.update(overrides)
+    return adaptive.AimdController(**settings)
+
+
+def test_starting_point_is_clamped_to_the_bounds():
+    controller = make_controller(batch_size=100, concurrency=0)
+    assert controller.settings() == (40, 1)
+    assert make_controller(batch_size=0, min_batch_size=3).settings() == (3, 2)
+
+
+def test_clean_rounds_grow_the_batch_size_by_a_step():
+    controller = make_controller()
+    assert controller.step == 2
+    assert controller.record(throttled=False, latency=1.0) is True
+    assert controller.settings() == (22, 2)
+
+
+def test_parallelism_grows_after_consecutive_clean_rounds():
+    controller = make_controller()
+    for _ in range(adaptive.CONCURRENCY_INCREASE_AFTER - 1):
+        controller.record(throttled=False, latency=1.0)
+    assert controller.settings()[1] == 2
+    controller.record(throttled=False, latency=1.0)
+    assert controller.settings() == (20 + 2 * adaptive.CONCURRENCY_INCREASE_AFTER, 3)
+    assert controller.clean_rounds == 0
+
+
+def test_throttling_halves_batch_size_and_parallelism():
+    controller = make_controller(concurrency=4)
+    controller.record(throttled=False, latency=1.0)
+    assert controller.record(throttled=True, latency=1.0) is True
+    assert controller.settings() == (11, 2)
+    assert controller.throttle_events == 1
+    assert controller.clean_rounds == 0
+
+
+def test_slow_rounds_halve_the_batch_size_only():
+    controller = make_controller(concurrency=4)
+    assert controller.record(throttled=False, latency=6.0) is True
+    assert controller.settings() == (10, 4)
+    assert controller.throttle_events == 0
+
+
+def test_a_slow_round_resets_the_clean_round_count():
+    controller = make_controller()
+    for _ in range(adaptive.CONCURRENCY_INCREASE_AFTER - 1):
+        controller.record(throttled=False, latency=1.0)
+    controller.record(throttled=False, latency=6.0)
+    controller.record(throttled=False, latency=1.0)
+    assert controller.settings()[1] == 2
+
+
+def test_settings_stay_within_the_bounds():
+    controller = make_controller(batch_size=2, concurrency=1, min_batch_size=2)
+    assert controller.record(throttled=True, latency=1.0) is False
+    assert controller.settings() == (2, 1)
+
+    controller = make_controller(batch_size=40, concurrency=4)
+    for _ in range(adaptive.CONCURRENCY_INCREASE_AFTER):
+        controller.record(throttled=False, latency=1.0)
+    assert controller.settings() == (40, 4)
+    assert controller.record(throttled=False, latency=1.0) is False
+
+
+@pytest.fixture
+def state_file(tmp_path, monkeypatch):
+    path = tmp_path / "adaptive.json"
+    monkeypatch.setattr(sys, "argv", ["mcp-gsuite", "--adaptive-state-file", str(path)])
+    monkeypatch.setattr(adaptive, "_controllers", {})
+    monkeypatch.setattr(adaptive, "_saved_state", None)
+    return path
+
+
+def test_learned_settings_are_restored_and_saved(state_file):
+    state_file.write_text(json.dumps({
+        "a@example.com": {adaptive.PATH_MESSAGE_GET: {"batch_size": 7, "concurrency": 1}},
+        "other@example.com": {adaptive.PATH_MESSAGE_GET: {"batch_size": 9, "concurrency": 3}},
+    }))
+    controller = adaptive.get_controller("a@example.com", adaptive.PATH_MESSAGE_GET)
+    assert controller.settings() == (7, 1)
+    assert controller.max_batch_size == adaptive.PATH_DEFAULTS[adaptive.PATH_MESSAGE_GET]["max_batch_size"]
+    assert adaptive.get_controller("a@example.com", adaptive.PATH_MESSAGE_GET) is controller
+
+    controller.record(throttled=True, latency=1.0)
+    adaptive.save()
+    state = json.loads(state_file.read_text())
+    assert state["a@example.com"][adaptive.PATH_MESSAGE_GET] == {"batch_size": 3, "concurrency": 1}
+    # Accounts of other processes sharing the file are kept
+    assert state["other@example.com"][adaptive.PATH_MESSAGE_GET] == {"batch_size": 9, "concurrency": 3}
+
+
+def test_new_accounts_start_from_the_path_defaults(state_file):
+    controller = adaptive.get_controller("new@example.com", adaptive.PATH_MESSAGE_SEND)
+    defaults = adaptive.PATH_DEFAULTS[adaptive.PATH_MESSAGE_SEND]
+    assert controller.settings() == (defaults["batch_size"], defaults["concurrency"])
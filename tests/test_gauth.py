@@ -0,0 +1,174 @@
+"""Locking of the credentials files: each account's token is refreshed once across threads and processes."""
+
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from oauth2client.client import OAuth2Credentials
+
+from mcp_gsuite import gauth
+
+fcntl = pytest.importorskip("fcntl")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER = "user@example.com"
+
+
+class TokenEndpoint():
+    """A token endpoint answering refreshes slowly, so that concurrent refreshes overlap."""
+
+    def __init__(self):
+        self.requests = 0
+        endpoint = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                endpoint.requests += 1
+                time.sleep(0.3)
+                body = json.dumps({"access_token": f"token-{endpoint.requests}", "expires_in": 3600}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/token"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+@pytest.fixture
+def token_endpoint():
+    endpoint = TokenEndpoint()
+    yield endpoint
+    endpoint.server.shutdown()
+
+
+@pytest.fixture
+def credentials_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["mcp-gsuite", "--credentials-dir", str(tmp_path)])
+    return tmp_path
+
+
+def write_expired_credentials(token_uri: str):
+    credentials = OAuth2Credentials(
+        "expired-token", "client", "secret", "refresh-token",
+        datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(hours=1), token_uri, "test",
+    )
+    gauth.store_credentials(credentials, user_id=USER)
+
+
+REFRESH_IN_THREADS = """
+import sys
+import threading
+
+credentials_dir, user_id = sys.argv[1:3]
+sys.argv = ["mcp-gsuite", "--credentials-dir", credentials_dir]
+from mcp_gsuite import gauth
+
+tokens = []
+
+def refresh():
+    credentials = gauth.get_stored_credentials(user_id=user_id)
+    if credentials.access_token_expired:
+        gauth.refresh_credentials(credentials, user_id=user_id)
+    tokens.append(credentials.access_token)
+
+threads = [threading.Thread(target=refresh) for _ in range(4)]
+for thread in threads:
+    thread.start()
+for thread in threads:
+    thread.join()
+print(" ".join(sorted(set(tokens))))
+"""
+
+
+def test_threads_and_processes_refresh_a_token_once(credentials_dir, token_endpoint):
+    write_expired_credentials(token_endpoint.url)
+    processes = [
+        subprocess.Popen([sys.executable, "-c", REFRESH_IN_THREADS, str(credentials_dir), USER],
+                         stdout=subprocess.PIPE, text=True, env={**os.environ, "PYTHONPATH": os.path.join(ROOT, "src")})
+        for _ in range(3)
+    ]
+    outputs = [process.communicate(timeout=60)[0].strip() for process in processes]
+    assert all(process.returncode == 0 for process in processes)
+    assert token_endpoint.requests == 1
+    assert outputs == ["token-1"] * 3
+    assert gauth.get_stored_credentials(user_id=USER).access_token == "token-1"
+    # Only the credentials and their lock file: every write replaced the file at once
+    assert sorted(os.listdir(credentials_dir)) == [f".oauth2.{USER}.json", f".oauth2.{USER}.json.lock"]
+
+
+def test_refresh_is_stored_for_credentials_read_before_it(credentials_dir, token_endpoint):
+    write_expired_credentials(token_endpoint.url)
+    first = gauth.get_stored_credentials(user_id=USER)
+    second = gauth.get_stored_credentials(user_id=USER)
+    gauth.refresh_credentials(first, user_id=USER)
+    # The stale copy takes over the stored token instead of refreshing again
+    gauth.refresh_credentials(second, user_id=USER)
+    assert token_endpoint.requests == 1
+    assert second.access_token == first.access_token == "token-1"
+
+
+TRY_LOCK = """
+import fcntl
+import sys
+
+with open(sys.argv[1], "a") as lock_file:
+    try:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        print("locked")
+    else:
+        print("free")
+"""
+
+
+def _lock_state(path: str) -> str:
+    return subprocess.run([sys.executable, "-c", TRY_LOCK, path], capture_output=True, text=True,
+                          timeout=30).stdout.strip()
+
+
+def test_storage_lock_excludes_other_processes(credentials_dir):
+    storage = gauth.CredentialStorage(user_id=USER)
+    storage.acquire_lock()
+    try:
+        assert _lock_state(f"{storage.path}.lock") == "locked"
+    finally:
+        storage.release_lock()
+    assert _lock_state(f"{storage.path}.lock") == "free"
+
+
+def test_storage_lock_is_shared_by_the_instances_of_an_account(credentials_dir):
+    storage = gauth.CredentialStorage(user_id=USER)
+    other = gauth.CredentialStorage(user_id=USER)
+    acquired = threading.Event()
+
+    def take_other():
+        other.acquire_lock()
+        acquired.set()
+        other.release_lock()
+
+    storage.acquire_lock()
+    thread = threading.Thread(target=take_other)
+    try:
+        thread.start()
+        assert not acquired.wait(0.2)
+        # Another account's credentials are not held up
+        unrelated = gauth.CredentialStorage(user_id="other@example.com")
+        unrelated.acquire_lock()
+        unrelated.release_lock()
+    finally:
+        storage.release_lock()
+    assert acquired.wait(5)
+    thread.join(5)
@@ -0,0 +1,89 @@
+"""Label name lookups and the per-account label and count caches."""
+
+import sys
+
+import pytest
+
+from mcp_gsuite import labels
+
+USER = "user@example.com"
+LABELS = [
+    {"id": "INBOX", "name": "INBOX", "type": "system"},
+    {"id": "Label_1", "name": "Work", "type": "user"},
+    {"id": "Label_2", "name": "Projects/Alpha", "type": "user"},
+    {"id": "Label_3", "name": "Straße", "type": "user"},
+]
+
+
+def test_find_matches_exactly_then_ignoring_case():
+    index = labels.LabelIndex(LABELS)
+    assert index.find("Work") == "Label_1"
+    assert index.find("work") == "Label_1"
+    assert index.find("WORK") == "Label_1"
+    assert index.find("inbox") == "INBOX"
+    assert index.find("projects/ALPHA") == "Label_2"
+    assert index.find("Projects") is None
+    assert index.find("Wor") is None
+
+
+def test_find_folds_case_beyond_ascii():
+    index = labels.LabelIndex(LABELS)
+    assert index.find("STRASSE") == "Label_3"
+    assert index.find("strasse") == "Label_3"
+
+
+def test_exact_match_wins_over_a_folded_one():
+    # Not possible in Gmail, but a stale index may briefly hold both
+    index = labels.LabelIndex([{"id": "a", "name": "News"}, {"id": "b", "name": "NEWS"}])
+    assert index.find("News") == "a"
+    assert index.find("NEWS") == "b"
+
+
+def test_add_and_remove_keep_both_name_maps_in_step():
+    index = labels.LabelIndex(LABELS)
+    index.add({"id": "Label_4", "name": "Receipts", "type": "user"})
+    assert index.find("RECEIPTS") == "Label_4"
+    index.remove("Label_1")
+    assert index.find("Work") is None
+    assert index.find("work") is None
+    assert "Label_1" not in {label["id"] for label in index.labels()}
+    index.remove("missing")
+
+
+@pytest.fixture
+def caches(monkeypatch):
+    monkeypatch.setattr(labels, "_indexes", {})
+    monkeypatch.setattr(labels, "_stats", {})
+    monkeypatch.setattr(sys, "argv", ["mcp-gsuite"])
+
+
+def test_index_cache_writes_changes_through(caches):
+    assert labels.get_index(USER) is None
+    labels.store(USER, LABELS)
+    labels.added(USER, {"id": "Label_4", "name": "Receipts"})
+    labels.removed(USER, "Label_2")
+    index = labels.get_index(USER)
+    assert index.find("receipts") == "Label_4"
+    assert index.find("Projects/Alpha") is None
+    labels.invalidate(USER)
+    assert labels.get_index(USER) is None
+    # Changes to accounts without an index are ignored
+    labels.added(USER, {"id": "Label_5", "name": "Later"})
+    assert labels.get_index(USER) is None
+
+
+def test_index_cache_ttl_zero_disables_it(caches, monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["mcp-gsuite", "--label-cache-ttl", "0"])
+    labels.store(USER, LABELS)
+    assert labels.get_index(USER) is None
+
+
+def test_stats_cache_is_reset_per_account(caches):
+    stats = [{"id": "INBOX", "messagesTotal": 3}]
+    labels.store_stats(USER, stats)
+    labels.store_stats("other@example.com", stats)
+    cached, age = labels.get_stats(USER)
+    assert cached == stats and age >= 0
+    labels.invalidate_stats(USER)
+    assert labels.get_stats(USER) is None
+    assert labels.get_stats("other@example.com") is not None
@@ -0,0 +1,236 @@
+"""Mail merge journals, the daily send ledger, and resuming jobs against the fake backend."""
+
+import asyncio
+import json
+import os
+import sys
+import time
+import urllib.request
+
+import pytest
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+import bench_tools
+from mcp_gsuite import mailmerge
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+USER = "user@example.com"
+DAY = mailmerge.SEND_WINDOW_SECONDS
+
+
+class FakeClock():
+    """Stands in for the time module of mailmerge."""
+
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+@pytest.fixture
+def merge_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["mcp-gsuite", "--mail-merge-dir", str(tmp_path),
+                                      "--gmail-daily-send-limit", "5"])
+    return tmp_path
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(mailmerge, "time", clock)
+    return clock
+
+
+def test_render_fills_fields_and_reports_unusable_recipients():
+    rendered = mailmerge.render("Hi $name", "Dear ${name}, you owe $$5. Sent to $to.", [
+        {"to": "a@example.com", "name": "Ann"},
+        {"to": "b@example.com"},
+        {"name": "Nobody"},
+    ])
+    assert (rendered[0].subject, rendered[0].body) == ("Hi Ann", "Dear Ann, you owe $5. Sent to a@example.com.")
+    assert rendered[1].error == "missing field 'name'"
+    assert rendered[2].error == "recipient has no 'to' address"
+
+
+def test_job_id_depends_on_the_content_only():
+    recipients = [{"to": "a@example.com", "name": "Ann"}]
+    job_id = mailmerge.make_job_id("send", "s", "b", recipients)
+    assert job_id == mailmerge.make_job_id("send", "s", "b", [{"name": "Ann", "to": "a@example.com"}])
+    assert job_id != mailmerge.make_job_id("draft", "s", "b", recipients)
+
+
+def test_journal_keeps_the_latest_state_and_skips_torn_lines(merge_dir):
+    journal = mailmerge.JobJournal(USER, "job1")
+    assert not journal.exists()
+    journal.append([{"index": 0, "to": "a@example.com", "status": mailmerge.STATUS_SUBMITTING},
+                    {"index": 1, "to": "b@example.com", "status": mailmerge.STATUS_SUBMITTING}])
+    journal.append([{"index": 0, "to": "a@example.com", "status": mailmerge.STATUS_SENT}])
+    with open(journal.path, "a") as f:
+        f.write('{"index": 1, "to": "b@exa')
+
+    states = mailmerge.JobJournal(USER, "job1").states()
+    assert {index: entry["status"] for index, entry in states.items()} == {
+        0: mailmerge.STATUS_SENT, 1: mailmerge.STATUS_SUBMITTING}
+    assert mailmerge.summarize(states) == {mailmerge.STATUS_SENT: 1, mailmerge.STATUS_SUBMITTING: 1}
+
+
+def test_ledger_grants_sends_up_to_the_daily_limit(merge_dir, clock):
+    ledger = mailmerge.SendLedger(USER)
+    assert ledger.reserve(3) == 3
+    assert ledger.reserve(3) == 2
+    assert ledger.reserve(1) == 0
+    usage = ledger.usage()
+    assert (usage["used"], usage["remaining"]) == (5, 0)
+    assert usage["next_send_after"] == time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(clock.now + DAY))
+
+
+def test_ledger_release_gives_back_rejected_sends(merge_dir, clock):
+    ledger = mailmerge.SendLedger(USER)
+    assert ledger.reserve(5) == 5
+    ledger.release(2)
+    ledger.release(0)
+    assert ledger.usage()["remaining"] == 2
+    assert ledger.reserve(5) == 2
+
+
+def test_ledger_counts_sends_over_a_rolling_day(merge_dir, clock):
+    ledger = mailmerge.SendLedger(USER)
+    ledger.record(2)
+    clock.now += DAY / 2
+    assert ledger.reserve(5) == 3
+    # The first two sends leave the window, the later three are still in it
+    clock.now += DAY / 2 + 1
+    assert ledger.usage()["used"] == 3
+    assert ledger.reserve(5) == 2
+    clock.now += DAY
+    assert ledger.usage() == {"limit": 5, "used": 0, "remaining": 5}
+
+
+def test_ledger_is_shared_through_its_file(merge_dir, clock):
+    assert mailmerge.SendLedger(USER).reserve(4) == 4
+    # Another process sees the reservation, and a fresh reservation sees its release
+    other = mailmerge.SendLedger(USER)
+    assert other.reserve(4) == 1
+    mailmerge.SendLedger(USER).release(3)
+    assert other.usage()["used"] == 2
+
+    with open(other.path, "w") as f:
+        f.write("not json")
+    assert other.reserve(1) == 1
+
+
+def test_a_job_runs_once_at_a_time(merge_dir):
+    assert mailmerge.start_job(USER, "job1")
+    try:
+        assert not mailmerge.start_job(USER, "job1")
+        assert mailmerge.is_running(USER, "job1")
+        assert mailmerge.start_job(USER, "job2")
+        mailmerge.finish_job(USER, "job2")
+    finally:
+        mailmerge.finish_job(USER, "job1")
+    assert not mailmerge.is_running(USER, "job1")
+    assert mailmerge.start_job(USER, "job1")
+    mailmerge.finish_job(USER, "job1")
+
+
+SUBJECT = "Hello $name"
+BODY = "Dear $name, this is message $n."
+RECIPIENTS = [{"to": f"r{n}@example.com", "name": f"R{n}", "n": n} for n in range(5)]
+
+
+def _sends(url: str) -> int:
+    stats = json.loads(urllib.request.urlopen(url + "_fake/stats").read())
+    return stats["endpoints"].get("gmail.users.messages.send", 0)
+
+
+def _run_server(url: str, tmp_path, calls, send_limit: int = 500):
+    """Run calls(call) against a server using the fake backend; call(tool, **arguments) returns a result as dict."""
+    accounts_file, credentials_dir = bench_tools.write_account(str(tmp_path))
+    params = StdioServerParameters(
+        command=sys.executable,
+        args=["-m", "mcp_gsuite", "--accounts-file", accounts_file, "--credentials-dir", credentials_dir,
+              "--google-api-root-url", url, "--watch-interval", "0", "--mail-merge-dir", str(tmp_path / "merge"),
+              "--gmail-daily-send-limit", str(send_limit)],
+        env={**os.environ, "PYTHONPATH": os.path.join(ROOT, "src")},
+        cwd=str(tmp_path),
+    )
+
+    async def run():
+        async with stdio_client(params) as (read_stream, write_stream):
+            async with ClientSession(read_stream, write_stream) as session:
+                await session.initialize()
+
+                async def call(tool: str, **arguments) -> dict:
+                    result = await session.call_tool(tool, {"__user_id__": bench_tools.ACCOUNT, **arguments})
+                    return json.loads(result.content[0].text)
+
+                return await calls(call)
+
+    return asyncio.run(run())
+
+
+def test_job_resumes_from_its_journal(backend_url, tmp_path):
+    async def calls(call):
+        merge = {"subject_template": SUBJECT, "body_template": BODY, "recipients": RECIPIENTS}
+        first = await call("mail_merge", max_messages=2, **merge)
+        assert (first["status"], first["submitted"], _sends(backend_url)) == ("incomplete", 2, 2)
+        assert [r["to"] for r in first["results"]] == ["r0@example.com", "r1@example.com"]
+
+        second = await call("mail_merge", **merge)
+        assert second["job_id"] == first["job_id"]
+        assert (second["status"], second["already_done"], second["submitted"]) == ("completed", 2, 3)
+        assert _sends(backend_url) == 5
+
+        third = await call("mail_merge", **merge)
+        assert (third["status"], third["submitted"]) == ("completed", 0)
+        assert _sends(backend_url) == 5
+
+        status = await call("get_mail_merge_status", job_id=first["job_id"])
+        assert status["job_counts"] == {mailmerge.STATUS_SENT: 5}
+        assert status["running"] is False
+
+    _run_server(backend_url, tmp_path, calls)
+
+
+def test_an_interrupted_batch_is_not_sent_again(backend_url, tmp_path, monkeypatch):
+    job_id = "interrupted"
+    monkeypatch.setattr(sys, "argv", ["mcp-gsuite", "--mail-merge-dir", str(tmp_path / "merge")])
+    mailmerge.JobJournal(bench_tools.ACCOUNT, job_id).append([
+        {"index": 0, "to": "r0@example.com", "status": mailmerge.STATUS_SENT},
+        {"index": 1, "to": "r1@example.com", "status": mailmerge.STATUS_SUBMITTING},
+    ])
+
+    async def calls(call):
+        result = await call("mail_merge", subject_template=SUBJECT, body_template=BODY, recipients=RECIPIENTS,
+                            job_id=job_id)
+        assert result["status"] == "completed"
+        # The interrupted recipient may have received the message: it is marked unknown instead
+        assert result["already_done"] == 2
+        assert {r["to"]: r["status"] for r in result["results"]} == {
+            "r1@example.com": mailmerge.STATUS_UNKNOWN,
+            **{f"r{n}@example.com": mailmerge.STATUS_SENT for n in range(2, 5)},
+        }
+        assert _sends(backend_url) == 3
+
+        retried = await call("mail_merge", subject_template=SUBJECT, body_template=BODY, recipients=RECIPIENTS,
+                             job_id=job_id, retry_unknown=True)
+        assert [r["to"] for r in retried["results"]] == ["r1@example.com"]
+        assert _sends(backend_url) == 4
+
+    _run_server(backend_url, tmp_path, calls)
+
+
+def test_sends_over_the_daily_limit_are_deferred(backend_url, tmp_path):
+    async def calls(call):
+        merge = {"subject_template": SUBJECT, "body_template": BODY, "recipients": RECIPIENTS}
+        result = await call("mail_merge", **merge)
+        assert (result["status"], result["submitted"], result["deferred"]) == ("incomplete", 3, 2)
+        assert result["send_budget"]["remaining"] == 0
+        assert _sends(backend_url) == 3
+
+    _run_server(backend_url, tmp_path, calls, send_limit=3)
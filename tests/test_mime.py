@@ -0,0 +1,117 @@
+"""Message payload traversal and partial body decoding."""
+
+import base64
+
+import pytest
+
+from mcp_gsuite import mime
+
+
+def encode(text: str, padding: bool = True) -> str:
+    data = base64.urlsafe_b64encode(text.encode('utf-8')).decode('ascii')
+    return data if padding else data.rstrip('=')
+
+
+def text_part(mime_type: str, text: str, part_id: str = '0', **fields) -> dict:
+    return {'partId': part_id, 'mimeType': mime_type, 'body': {'data': encode(text)}, **fields}
+
+
+def attachment_part(part_id: str, filename: str, attachment_id: str) -> dict:
+    return {'partId': part_id, 'mimeType': 'application/pdf', 'filename': filename,
+            'body': {'attachmentId': attachment_id, 'size': 1234}}
+
+
+def test_walk_collects_headers_case_insensitively_last_one_wins():
+    payload = {'headers': [{'name': 'Subject', 'value': 'first'}, {'name': 'SUBJECT', 'value': 'second'},
+                           {'name': 'Message-ID', 'value': '<id@example.com>'}, {'name': 'X-Other', 'value': 'x'}]}
+    result = mime.walk(payload)
+    assert result.headers == {'subject': 'second', 'message_id': '<id@example.com>'}
+
+
+def test_walk_prefers_plain_text_over_a_shallower_html_part():
+    plain = text_part('text/plain', 'plain', '1.0')
+    payload = {'mimeType': 'multipart/mixed', 'parts': [
+        text_part('text/html', '<p>html</p>', '0'),
+        {'partId': '1', 'mimeType': 'multipart/alternative', 'parts': [plain]},
+    ]}
+    assert mime.walk(payload).body_part is plain
+
+
+def test_walk_prefers_the_shallowest_then_the_first_part():
+    first = text_part('text/plain', 'first', '0')
+    payload = {'mimeType': 'multipart/mixed', 'parts': [
+        {'partId': '1', 'mimeType': 'multipart/alternative', 'parts': [text_part('text/plain', 'nested', '1.0')]},
+        first,
+        text_part('text/plain', 'second', '2'),
+    ]}
+    assert mime.walk(payload).body_part is first
+
+
+def test_walk_lists_attachments_at_any_depth_and_never_uses_them_as_body():
+    payload = {'mimeType': 'multipart/mixed', 'parts': [
+        text_part('text/plain', 'notes', '0', filename='notes.txt'),
+        {'partId': '1', 'mimeType': 'multipart/mixed', 'parts': [
+            text_part('text/html', '<p>body</p>', '1.0'),
+            attachment_part('1.1', 'report.pdf', 'att-1'),
+        ]},
+        attachment_part('2', '', 'att-2'),
+    ]}
+    result = mime.walk(payload)
+    assert mime.decode_body(result.body_part) == '<p>body</p>'
+    assert result.attachments == {
+        '1.1': {'filename': 'report.pdf', 'mimeType': 'application/pdf', 'attachmentId': 'att-1', 'partId': '1.1'},
+        '2': {'filename': 'attachment', 'mimeType': 'application/pdf', 'attachmentId': 'att-2', 'partId': '2'},
+    }
+
+
+def test_walk_uses_a_single_part_of_another_type_as_body():
+    payload = text_part('text/calendar', 'BEGIN:VCALENDAR')
+    assert mime.walk(payload).body_part is payload
+
+
+def test_walk_without_parts_only_reads_headers():
+    payload = {'headers': [{'name': 'From', 'value': 'a@example.com'}], 'parts': [text_part('text/plain', 'x')]}
+    result = mime.walk(payload, parse_parts=False)
+    assert result.headers == {'from': 'a@example.com'}
+    assert result.body_part is None
+
+
+def test_walk_handles_deep_nesting_without_recursion():
+    part = text_part('text/plain', 'deep', '0')
+    for _ in range(5000):
+        part = {'mimeType': 'multipart/mixed', 'parts': [part]}
+    assert mime.decode_body(mime.walk(part).body_part) == 'deep'
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    # Several decoding steps even for short bodies
+    monkeypatch.setattr(mime, 'DECODE_CHUNK_CHARS', 8)
+
+
+@pytest.mark.parametrize('text', [
+    'plain ascii text ' * 10,
+    'Grüße aus Köln, 日本語のテキスト, emoji 🙂🙃 and more ' * 5,
+])
+@pytest.mark.parametrize('padding', [True, False])
+def test_decode_body_range_matches_slices_of_the_whole_body(small_chunks, text, padding):
+    part = {'body': {'data': encode(text, padding=padding)}}
+    if padding:
+        assert mime.decode_body_range(part) == (text, False)
+    # Ranges are decoded in steps, which also tolerates a missing final padding
+    for offset in (0, 1, 7, 50):
+        for max_chars in (0, 1, 5, 33, len(text)):
+            expected = text[offset:offset + max_chars]
+            continues = len(text) > offset + max_chars
+            assert mime.decode_body_range(part, offset, max_chars) == (expected, continues), (offset, max_chars)
+
+
+def test_decode_body_range_reports_no_continuation_at_the_exact_end():
+    part = {'body': {'data': encode('exactly')}}
+    assert mime.decode_body_range(part, 0, 7) == ('exactly', False)
+    assert mime.decode_body_range(part, 3, 10) == ('ctly', False)
+
+
+def test_decode_body_range_of_an_empty_part():
+    assert mime.decode_body_range({'body': {}}, 0, 10) == ('', False)
+    assert mime.decode_body({'body': {'size': 0}}) is None
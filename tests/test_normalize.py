@@ -0,0 +1,135 @@
+"""Quoted reply removal and thread quote collapsing of normalized bodies."""
+
+import base64
+
+import pytest
+
+from mcp_gsuite import normalize
+
+
+def test_strip_quoted_drops_quoted_lines_and_their_attribution():
+    text = ("Sounds good, see you then.\n"
+            "\n"
+            "On Mon, 3 Jun 2024 at 10:00, Alice <alice@example.com> wrote:\n"
+            "> Shall we meet at ten?\n"
+            "> Alice")
+    assert normalize.strip_quoted(text).strip() == "Sounds good, see you then."
+
+
+def test_strip_quoted_drops_an_attribution_wrapped_over_two_lines():
+    text = ("Yes.\n"
+            "On Mon, 3 Jun 2024 at 10:00, Alice\n"
+            "<alice@example.com> wrote:\n"
+            "> Coming?")
+    assert normalize.strip_quoted(text).strip() == "Yes."
+
+
+def test_strip_quoted_keeps_replies_between_quotes():
+    text = ("> First question?\n"
+            "First answer.\n"
+            "> Second question?\n"
+            "Second answer.")
+    assert normalize.strip_quoted(text) == "First answer.\nSecond answer."
+
+
+def test_strip_quoted_keeps_an_attribution_like_line_without_a_quote():
+    text = "On Monday the team wrote:\nthe release notes."
+    assert normalize.strip_quoted(text) == text
+
+
+@pytest.mark.parametrize("separator", [
+    "-----Original Message-----",
+    "---------- Forwarded message ---------",
+    "_" * 32,
+])
+def test_strip_quoted_cuts_at_an_original_message_separator(separator):
+    text = f"Please see below.\n{separator}\nFrom: Bob\nOld text"
+    assert normalize.strip_quoted(text).strip() == "Please see below."
+
+
+def test_strip_quoted_cuts_at_an_outlook_header_block():
+    text = ("Agreed.\n"
+            "\n"
+            "From: Bob <bob@example.com>\n"
+            "Sent: Monday, June 3, 2024 10:00 AM\n"
+            "To: Alice <alice@example.com>\n"
+            "Subject: Plan\n"
+            "\n"
+            "Old text")
+    assert normalize.strip_quoted(text).strip() == "Agreed."
+
+
+def test_strip_quoted_keeps_a_single_header_like_line():
+    text = "Subject: the plan for next week\nis attached."
+    assert normalize.strip_quoted(text) == text
+
+
+def test_normalize_text_of_html_drops_quotes_signatures_and_markup():
+    html = ("<html><head><style>p {color: red}</style></head><body>"
+            "<p>Hello&nbsp;<b>Bob</b>,</p><ul><li>one</li><li>two</li></ul>"
+            "<div class=\"gmail_signature\">Alice | Example Corp</div>"
+            "<div class=\"gmail_quote\">On Monday Bob wrote:<blockquote>old</blockquote></div>"
+            "</body></html>")
+    assert normalize.normalize_text(html, html=True) == "Hello Bob,\n- one\n- two"
+
+
+def test_normalize_text_drops_the_signature_and_mobile_footer():
+    text = "Thanks!\n\n\n\n-- \nAlice\nExample Corp"
+    assert normalize.normalize_text(text) == "Thanks!"
+    assert normalize.normalize_text("On my way\n\nSent from my iPhone") == "On my way"
+
+
+LONG_LINE = "The quarterly report is attached, please review the numbers by Friday."
+
+
+def test_collapse_thread_quotes_removes_text_of_earlier_messages():
+    first = f"Hi team,\n{LONG_LINE}\nThanks,\nAlice"
+    second = (f"Looks fine to me.\n"
+              f"\n"
+              f"On Mon, 3 Jun 2024 at 10:00, Alice <alice@example.com> wrote:\n"
+              f"> {LONG_LINE}\n"
+              f">\n"
+              f"> Thanks,")
+    collapsed = normalize.collapse_thread_quotes([first, second])
+    assert collapsed == [first, "Looks fine to me."]
+
+
+def test_collapse_thread_quotes_keeps_short_repeated_lines():
+    first = "Thanks,\nAlice"
+    second = "Done.\nThanks,\nBob"
+    assert normalize.collapse_thread_quotes([first, second]) == [first, second]
+
+
+def test_collapse_thread_quotes_compares_without_markers_case_and_spacing():
+    first = LONG_LINE
+    second = f"Reply.\n>>   {LONG_LINE.upper()}  "
+    assert normalize.collapse_thread_quotes([first, second]) == [first, "Reply."]
+
+
+def test_collapse_thread_quotes_uses_every_earlier_message():
+    first = LONG_LINE
+    second = "A different reply that is long enough to be removed when it is repeated later."
+    third = f"New text.\n> {second}\n>> {LONG_LINE}"
+    assert normalize.collapse_thread_quotes([first, second, third])[2] == "New text."
+
+
+@pytest.fixture
+def empty_cache():
+    normalize.clear_cache()
+    yield
+    normalize.clear_cache()
+
+
+def _part(text: str) -> dict:
+    return {'mimeType': 'text/plain', 'body': {'data': base64.urlsafe_b64encode(text.encode()).decode()}}
+
+
+def test_normalized_body_is_cached_per_account_and_message(empty_cache):
+    assert normalize.normalized_body("a@example.com", "m1", _part("Body of a\n> quote")) == "Body of a"
+    # Cached: the part is not decoded again
+    assert normalize.normalized_body("a@example.com", "m1", {'body': {}}) == "Body of a"
+    # The same message ID in another mailbox is another message
+    assert normalize.normalized_body("b@example.com", "m1", _part("Body of b")) == "Body of b"
+    # Without a message ID nothing is cached
+    assert normalize.normalized_body("a@example.com", None, _part("x")) == "x"
+    assert normalize.normalized_body("a@example.com", None, _part("y")) == "y"
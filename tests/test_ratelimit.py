@@ -0,0 +1,105 @@
+"""Token buckets and per-account quota accounting, on a fake clock."""
+
+import sys
+
+import pytest
+
+from mcp_gsuite import ratelimit
+
+
+class FakeClock():
+    """
+    Stands in for the time module of ratelimit: sleep() advances the clock instead of blocking.
+
+    Rates and costs in these tests are chosen so that waits are exact binary fractions.
+    """
+
+    def __init__(self):
+        self.now = 1024.0
+        self.slept = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.slept.append(seconds)
+        self.now += seconds
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+    def __getattr__(self, name):
+        return getattr(sys.modules["time"], name)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit, "time", clock)
+    return clock
+
+
+def test_bucket_starts_full_and_holds_one_second_of_tokens(clock):
+    bucket = ratelimit.TokenBucket(8)
+    assert bucket.available() == 8
+    clock.advance(5)
+    assert bucket.available() == 8
+
+
+def test_bucket_waits_for_the_refill(clock):
+    bucket = ratelimit.TokenBucket(8)
+    assert bucket.acquire(8) == 0
+    assert bucket.acquire(4) == 0.5
+    assert clock.slept == [0.5]
+    assert bucket.available() == 0
+
+
+def test_bucket_lets_a_large_call_through_and_goes_negative(clock):
+    bucket = ratelimit.TokenBucket(8)
+    # More than the capacity: only waits for a full bucket, then owes the rest
+    assert bucket.acquire(20) == 0
+    assert bucket.available() == -12
+    assert bucket.acquire(4) == 2
+
+
+def test_method_costs():
+    assert ratelimit.get_method_cost("gmail.users.messages.send") == 100
+    assert ratelimit.get_method_cost("gmail.users.messages.get") == 5
+    assert ratelimit.get_method_cost("gmail.users.unknownMethod") == ratelimit.GMAIL_DEFAULT_COST
+    assert ratelimit.get_method_cost("calendar.events.list") == ratelimit.CALENDAR_DEFAULT_COST
+
+
+def test_account_quota_charges_each_api_separately(clock, monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["mcp-gsuite", "--gmail-quota-units-per-second", "80",
+                                      "--calendar-requests-per-second", "2"])
+    quota = ratelimit.AccountQuota("user@example.com")
+    quota.acquire(["gmail.users.messages.get"] * 16 + ["calendar.events.list"])
+    assert clock.slept == []
+
+    # The Gmail bucket is empty now, the calendar bucket still holds a request
+    quota.acquire(["calendar.events.list"])
+    assert clock.slept == []
+    quota.acquire(["gmail.users.messages.get"])
+    assert clock.slept == [0.0625]
+
+    report = quota.report()
+    assert report["limits"] == {"gmail_units_per_second": 80, "calendar_requests_per_second": 2}
+    assert report["methods"]["gmail.users.messages.get"] == {"calls": 17, "units": 85}
+    assert report["units_total"] == {ratelimit.API_GMAIL: 85, ratelimit.API_CALENDAR: 2}
+    assert report["throttled_seconds"] == 0.062
+
+
+def test_account_quota_last_minute_window(clock, monkeypatch):
+    monkeypatch.setattr(sys, "argv", ["mcp-gsuite"])
+    quota = ratelimit.AccountQuota("user@example.com")
+    quota.acquire(["gmail.users.messages.send"])
+    clock.advance(30)
+    quota.acquire(["gmail.users.labels.list"])
+    assert quota.report()["units_last_minute"][ratelimit.API_GMAIL] == 101
+    clock.advance(31)
+    report = quota.report()
+    assert report["units_last_minute"][ratelimit.API_GMAIL] == 1
+    assert report["units_total"][ratelimit.API_GMAIL] == 101
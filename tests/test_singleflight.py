@@ -0,0 +1,155 @@
+"""Coalescing of identical overlapping read calls."""
+
+import threading
+import time
+
+import pytest
+
+from mcp_gsuite import singleflight
+from mcp_gsuite import toolcache
+
+
+class Service():
+    """A service whose list() call blocks until released, counting the upstream calls."""
+
+    def __init__(self, user_id: str = "user@example.com"):
+        self.user_id = user_id
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.calls = 0
+        self.error: Exception | None = None
+        self.fail_read = False
+
+    @singleflight.coalesced("test.list")
+    def list(self, query: str, limit: int = 100) -> dict:
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        if self.fail_read:
+            toolcache.record_failed_read()
+            return {"items": []}
+        return {"query": query, "limit": limit, "items": [1, 2, 3]}
+
+
+def _waiters(service: Service) -> int:
+    with singleflight._in_flight_lock:
+        return sum(call.waiters for key, call in singleflight._in_flight.items() if key[0] == service.user_id)
+
+
+def run_overlapping(service: Service, calls: list, waiters: int | None = None) -> list:
+    """
+    Start calls (tuples of args and kwargs) while the first one is in flight; returns results or exceptions.
+
+    The first call is released once `waiters` calls (default: all others) wait for it.
+    """
+    waiters = len(calls) - 1 if waiters is None else waiters
+    results = [None] * len(calls)
+
+    def run(i, args, kwargs):
+        try:
+            results[i] = service.list(*args, **kwargs)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i, *call)) for i, call in enumerate(calls)]
+    threads[0].start()
+    assert service.started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while _waiters(service) < waiters and time.monotonic() < deadline:
+        time.sleep(0.001)
+    service.release.set()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def test_overlapping_identical_calls_share_one_upstream_call():
+    service = Service()
+    results = run_overlapping(service, [(("is:unread",), {})] * 4)
+    assert service.calls == 1
+    assert all(result == {"query": "is:unread", "limit": 100, "items": [1, 2, 3]} for result in results)
+    # Every caller gets its own copy to change
+    results[0]["items"].append(4)
+    assert results[1]["items"] == [1, 2, 3]
+    assert len({id(result) for result in results}) == 4
+
+
+def test_arguments_are_compared_after_defaults():
+    service = Service()
+    results = run_overlapping(service, [(("q",), {}), (("q", 100), {}), (("q",), {"limit": 100})])
+    assert service.calls == 1
+    assert results[0] == results[1] == results[2]
+
+
+def test_different_arguments_and_accounts_are_not_coalesced():
+    service = Service()
+    other_account = Service("other@example.com")
+    other_account.release.set()
+    service_thread = threading.Thread(target=service.list, args=("q",))
+    service_thread.start()
+    assert service.started.wait(5)
+    assert other_account.list("q") == {"query": "q", "limit": 100, "items": [1, 2, 3]}
+    assert other_account.calls == 1
+
+    other_arguments = Service()
+    results = run_overlapping(other_arguments, [(("a",), {}), (("b",), {})], waiters=0)
+    assert results[0]["query"] == "a" and results[1]["query"] == "b"
+    assert other_arguments.calls == 2
+    service.release.set()
+    service_thread.join(5)
+
+
+def test_calls_that_do_not_overlap_are_not_coalesced():
+    service = Service()
+    service.release.set()
+    service.list("q")
+    service.list("q")
+    assert service.calls == 2
+    assert not singleflight._in_flight
+
+
+def test_waiting_calls_raise_the_error_of_the_shared_call():
+    service = Service()
+    service.error = RuntimeError("backend error")
+    results = run_overlapping(service, [(("q",), {})] * 3)
+    assert service.calls == 1
+    assert all(isinstance(result, RuntimeError) and str(result) == "backend error" for result in results)
+    assert not singleflight._in_flight
+
+
+def test_waiting_calls_record_the_failed_read_of_the_shared_call():
+    service = Service()
+    service.fail_read = True
+    outcomes = []
+
+    def tracked(*args):
+        with toolcache.track_reads() as reads:
+            service.list(*args)
+        outcomes.append(reads.failed)
+
+    leader = threading.Thread(target=tracked, args=("q",))
+    leader.start()
+    assert service.started.wait(5)
+    followers = [threading.Thread(target=tracked, args=("q",)) for _ in range(2)]
+    for follower in followers:
+        follower.start()
+    deadline = time.monotonic() + 5
+    while _waiters(service) < 2 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    service.release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+    assert service.calls == 1
+    assert outcomes == [True, True, True]
+
+
+def test_arguments_that_do_not_bind_are_passed_through():
+    service = Service()
+    service.release.set()
+    with pytest.raises(TypeError):
+        service.list()
+    assert service.calls == 0
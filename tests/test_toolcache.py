@@ -0,0 +1,63 @@
+"""Tool response cache against the fake backend: failed reads must not be cached."""
+
+import asyncio
+import json
+import os
+import sys
+import urllib.request
+
+import pytest
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+import bench_tools
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _api_calls(url: str) -> int:
+    return json.loads(urllib.request.urlopen(url + "_fake/stats").read())["api_calls"]
+
+
+def _fail_next(url: str, count: int):
+    urllib.request.urlopen(urllib.request.Request(url + f"_fake/fail?count={count}", data=b"", method="POST")).read()
+
+
+@pytest.mark.parametrize("tool, arguments", [
+    ("list_labels", {}),
+    ("list_calendars", {}),
+    ("get_calendar_events", {}),
+    ("query_emails", {"query": "is:unread"}),
+])
+@pytest.mark.parametrize("workers", ["0", "1"])
+def test_failed_read_is_not_cached(backend_url, tmp_path, tool, arguments, workers):
+    accounts_file, credentials_dir = bench_tools.write_account(str(tmp_path))
+    params = StdioServerParameters(
+        command=sys.executable,
+        args=["-m", "mcp_gsuite", "--accounts-file", accounts_file, "--credentials-dir", credentials_dir,
+              "--google-api-root-url", backend_url, "--max-retries", "0", "--watch-interval", "0",
+              "--gmail-quota-units-per-second", "1e9", "--calendar-requests-per-second", "1e9", "--workers", workers],
+        env={**os.environ, "PYTHONPATH": os.path.join(ROOT, "src")},
+        cwd=str(tmp_path),
+    )
+    arguments = {"__user_id__": bench_tools.ACCOUNT, **arguments}
+
+    async def run():
+        async with stdio_client(params) as (read_stream, write_stream):
+            async with ClientSession(read_stream, write_stream) as session:
+                await session.initialize()
+
+                _fail_next(backend_url, 1)
+                await session.call_tool(tool, arguments)
+
+                before = _api_calls(backend_url)
+                fetched = await session.call_tool(tool, arguments)
+                assert not fetched.isError
+                assert _api_calls(backend_url) > before, "the failed read was served from the cache"
+
+                before = _api_calls(backend_url)
+                cached = await session.call_tool(tool, arguments)
+                assert cached.content[0].text == fetched.content[0].text
+                assert _api_calls(backend_url) == before
+
+    asyncio.run(run())